@@ -70,6 +70,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'lessons.context_processors.debug_trace_settings',
             ],
         },
     },
@@ -185,6 +186,22 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 OPENROUTER_API_KEY = env('OPENROUTER_API_KEY', default='')
 OPENROUTER_MODEL = env('OPENROUTER_MODEL', default='openai/gpt-4o-mini')
 OPENROUTER_API_URL = 'https://openrouter.ai/api/v1/chat/completions'
+# Сколько тем урока генерируют карточки одновременно (параллельные запросы к OpenRouter)
+OPENROUTER_TOPIC_CONCURRENCY = env.int('OPENROUTER_TOPIC_CONCURRENCY', default=4)
+# Потоковая генерация карточек (SSE): карточки разбираются по мере получения ответа
+AI_STREAM_CARDS = env.bool('AI_STREAM_CARDS', default=False)
+# HTTP-сессия для запросов к AI: размер пула keep-alive соединений на процесс
+AI_HTTP_POOL_SIZE = env.int('AI_HTTP_POOL_SIZE', default=10)
+# Повторы при 429/5xx и обрывах соединения: число повторов и экспоненциальная задержка (секунды)
+AI_HTTP_MAX_RETRIES = env.int('AI_HTTP_MAX_RETRIES', default=3)
+AI_HTTP_BACKOFF_BASE = env.float('AI_HTTP_BACKOFF_BASE', default=1.0)
+AI_HTTP_BACKOFF_MAX = env.float('AI_HTTP_BACKOFF_MAX', default=30.0)
+# Кэш ответов AI (ключ — модель, промпты, max_tokens, temperature); директория — AI_RESPONSE_CACHE_DIRECTORY ниже
+AI_RESPONSE_CACHE_ENABLED = env.bool('AI_RESPONSE_CACHE_ENABLED', default=True)
+AI_RESPONSE_CACHE_MAX_ENTRIES = env.int('AI_RESPONSE_CACHE_MAX_ENTRIES', default=1000)
+AI_RESPONSE_CACHE_MAX_AGE_DAYS = env.int('AI_RESPONSE_CACHE_MAX_AGE_DAYS', default=30)
+# Очистка кэша обходит всю директорию — выполняется раз в AI_RESPONSE_CACHE_PRUNE_EVERY записей
+AI_RESPONSE_CACHE_PRUNE_EVERY = env.int('AI_RESPONSE_CACHE_PRUNE_EVERY', default=50)
 # Использовать двухэтапный процесс (анализ + формирование карточек)
 USE_TWO_STAGE_PROCESS = env.bool('USE_TWO_STAGE_PROCESS', default=True)
 
@@ -194,10 +211,18 @@ if os.path.exists('/tmp'):
     # Сервер (Linux)
     WATCHED_VIDEO_DIRECTORY = env('WATCHED_VIDEO_DIRECTORY', default='/var/www/english_lessons/uploads/videos')
     TEMP_AUDIO_DIRECTORY = env('TEMP_AUDIO_DIRECTORY', default='/tmp/english_lessons_audio')
+    TRANSCRIPT_CACHE_DIRECTORY = env('TRANSCRIPT_CACHE_DIRECTORY', default='/var/www/english_lessons/transcripts')
+    AI_RESPONSE_CACHE_DIRECTORY = env('AI_RESPONSE_CACHE_DIRECTORY', default='/var/www/english_lessons/ai_cache')
+    VIDEO_INDEX_PATH = env('VIDEO_INDEX_PATH', default='/var/www/english_lessons/video_index.json')
+    LOG_STORAGE_PATH = env('LOG_STORAGE_PATH', default='/var/www/english_lessons/interface_logs.sqlite3')
 else:
     # Локальная разработка (Windows)
     WATCHED_VIDEO_DIRECTORY = env('WATCHED_VIDEO_DIRECTORY', default=str(BASE_DIR / 'videos'))
     TEMP_AUDIO_DIRECTORY = env('TEMP_AUDIO_DIRECTORY', default=str(BASE_DIR / 'temp_audio'))
+    TRANSCRIPT_CACHE_DIRECTORY = env('TRANSCRIPT_CACHE_DIRECTORY', default=str(BASE_DIR / 'transcripts'))
+    AI_RESPONSE_CACHE_DIRECTORY = env('AI_RESPONSE_CACHE_DIRECTORY', default=str(BASE_DIR / 'ai_cache'))
+    VIDEO_INDEX_PATH = env('VIDEO_INDEX_PATH', default=str(BASE_DIR / 'video_index.json'))
+    LOG_STORAGE_PATH = env('LOG_STORAGE_PATH', default=str(BASE_DIR / 'interface_logs.sqlite3'))
 
 # Создаем директории, если их нет (с обработкой ошибок прав доступа)
 try:
@@ -215,17 +240,87 @@ except PermissionError:
     logger = logging.getLogger(__name__)
     logger.warning(f'Не удалось создать директорию {TEMP_AUDIO_DIRECTORY}. Создайте её вручную.')
 
+try:
+    os.makedirs(TRANSCRIPT_CACHE_DIRECTORY, exist_ok=True)
+except PermissionError:
+    import logging
+    logger = logging.getLogger(__name__)
+    logger.warning(f'Не удалось создать директорию {TRANSCRIPT_CACHE_DIRECTORY}. Создайте её вручную.')
+
+# Мониторинг папки: файл считается дописанным, если его размер и mtime не менялись столько секунд
+VIDEO_WATCH_SETTLE_SECONDS = env.int('VIDEO_WATCH_SETTLE_SECONDS', default=5)
+# Как часто (секунды) дописанные файлы регистрируются в БД одной вставкой
+VIDEO_WATCH_BATCH_WINDOW = env.int('VIDEO_WATCH_BATCH_WINDOW', default=2)
+
+# Возобновляемая загрузка видео: папка для частично загруженных файлов
+# (по умолчанию WATCHED_VIDEO_DIRECTORY/.uploads — тот же диск, finalize перемещает файл без копирования)
+VIDEO_UPLOAD_DIRECTORY = env('VIDEO_UPLOAD_DIRECTORY', default=None)
+# Размер части, который предлагается клиенту, и максимальный принимаемый диапазон (МБ)
+VIDEO_UPLOAD_CHUNK_MB = env.int('VIDEO_UPLOAD_CHUNK_MB', default=8)
+VIDEO_UPLOAD_MAX_CHUNK_MB = env.int('VIDEO_UPLOAD_MAX_CHUNK_MB', default=64)
+
 # Whisper Model Settings
 WHISPER_MODEL = env('WHISPER_MODEL', default='base')
+# Пул процессов транскрипции (в каждом процессе своя резидентная модель):
+# 0 — без пула, модель загружается в текущем процессе; -1 — по числу ядер CPU
+WHISPER_POOL_WORKERS = env.int('WHISPER_POOL_WORKERS', default=0)
+# Потоков torch на процесс (0 — автоматически: ядра CPU / число процессов)
+WHISPER_TORCH_THREADS = env.int('WHISPER_TORCH_THREADS', default=0)
+# Параллельная транскрипция одного видео в пуле: длина фрагмента в секундах
+# (аудио режется по паузам; 0 — видео транскрибируется целиком в одном процессе)
+WHISPER_CHUNK_SECONDS = env.int('WHISPER_CHUNK_SECONDS', default=0)
+
+# Фоновая обработка видео (manage.py run_video_workers)
+# Как часто воркер опрашивает очередь, если задач нет (секунды)
+VIDEO_WORKER_POLL_INTERVAL = env.int('VIDEO_WORKER_POLL_INTERVAL', default=5)
+# Как часто воркер обновляет heartbeat задачи во время обработки (секунды)
+VIDEO_JOB_HEARTBEAT_INTERVAL = env.int('VIDEO_JOB_HEARTBEAT_INTERVAL', default=30)
+# Через сколько секунд без heartbeat задача считается брошенной и возвращается в очередь
+VIDEO_JOB_STALE_TIMEOUT = env.int('VIDEO_JOB_STALE_TIMEOUT', default=300)
+# Максимальное количество попыток обработки одного видео
+VIDEO_JOB_MAX_ATTEMPTS = env.int('VIDEO_JOB_MAX_ATTEMPTS', default=3)
+# Аренда видео воркером (секунды): продлевается heartbeat; истёкшую аренду может забрать другой воркер
+VIDEO_LEASE_SECONDS = env.int('VIDEO_LEASE_SECONDS', default=300)
+# Сколько секунд отдаётся закэшированный снимок статуса очереди (api/videos/processing_status/)
+VIDEO_STATUS_CACHE_SECONDS = env.int('VIDEO_STATUS_CACHE_SECONDS', default=2)
+# Long-poll api/videos/events/: максимальное ожидание изменений и период проверки статуса (секунды)
+VIDEO_EVENTS_TIMEOUT = env.int('VIDEO_EVENTS_TIMEOUT', default=25)
+VIDEO_EVENTS_CHECK_INTERVAL = env.int('VIDEO_EVENTS_CHECK_INTERVAL', default=1)
+# Конвейерная обработка: этапы (извлечение аудио, транскрипция, генерация урока, сохранение)
+# работают параллельно для разных видео, между этапами — очереди размера VIDEO_PIPELINE_QUEUE_SIZE
+VIDEO_PIPELINE_ENABLED = env.bool('VIDEO_PIPELINE_ENABLED', default=False)
+VIDEO_PIPELINE_QUEUE_SIZE = env.int('VIDEO_PIPELINE_QUEUE_SIZE', default=1)
+# Потоков на этап внутри одного воркера
+VIDEO_PIPELINE_EXTRACT_WORKERS = env.int('VIDEO_PIPELINE_EXTRACT_WORKERS', default=1)
+VIDEO_PIPELINE_TRANSCRIBE_WORKERS = env.int('VIDEO_PIPELINE_TRANSCRIBE_WORKERS', default=1)
+VIDEO_PIPELINE_GENERATE_WORKERS = env.int('VIDEO_PIPELINE_GENERATE_WORKERS', default=2)
+VIDEO_PIPELINE_PERSIST_WORKERS = env.int('VIDEO_PIPELINE_PERSIST_WORKERS', default=1)
 
 # FFmpeg Settings
 # По умолчанию используем 'ffmpeg' из PATH, но можно указать полный путь в .env
 FFMPEG_BINARY = env('FFMPEG_BINARY', default='ffmpeg')
+# Читать аудио из FFmpeg через pipe прямо в память (False — через временный WAV в TEMP_AUDIO_DIRECTORY)
+AUDIO_PIPE_MODE = env.bool('AUDIO_PIPE_MODE', default=True)
 
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Отладочная трассировка (JSON Lines): выключена — точки трассировки ничего не делают
+DEBUG_TRACE_ENABLED = env.bool('DEBUG_TRACE_ENABLED', default=False)
+DEBUG_TRACE_PATH = env('DEBUG_TRACE_PATH', default=str(BASE_DIR / '.cursor' / 'debug.log'))
+# Доля записываемых событий (0..1) и период сброса буфера в файл (секунды)
+DEBUG_TRACE_SAMPLE_RATE = env.float('DEBUG_TRACE_SAMPLE_RATE', default=1.0)
+DEBUG_TRACE_FLUSH_INTERVAL = env.int('DEBUG_TRACE_FLUSH_INTERVAL', default=1)
+
+# Логи для интерфейса: общий SQLite-файл LOG_STORAGE_PATH (пустой — в памяти процесса),
+# хранятся последние LOG_STORAGE_MAX_ENTRIES записей
+LOG_STORAGE_MAX_ENTRIES = env.int('LOG_STORAGE_MAX_ENTRIES', default=1000)
+# Асинхронное логирование: логгеры LOG_ASYNC_LOGGERS только кладут записи в очередь,
+# в консоль и LogStorage их пачками пишет фоновый поток
+LOG_ASYNC = env.bool('LOG_ASYNC', default=True)
+LOG_ASYNC_LOGGERS = ['lessons']
+
 # Logging configuration: выводим логи в консоль во время разработки
 LOGGING = {
     'version': 1,
@@ -247,7 +342,7 @@ LOGGING = {
     },
     'handlers': {
         'console': {
-            'class': 'logging.StreamHandler',
+            'class': 'lessons.services.log_handler.BatchStreamHandler',
             'formatter': 'detailed',
             'stream': 'ext://sys.stdout',
         },
@@ -24,7 +24,7 @@ from lessons.views_api import list_lessons, get_lesson, get_lesson_topics
 from lessons.views_video import (
     list_videos, ProcessVideoView, ProcessNextPendingVideoView,
     get_next_pending_video_info, ProcessAllVideosView, RecreateAllLessonsView,
-    get_processing_status
+    get_processing_status, get_processing_events, get_job_status
 )
 from lessons.views_video_processing import ResetStuckVideosView
 from lessons.views_video_base import get_video_status
@@ -35,6 +35,8 @@ from lessons.views_progress import (
 from lessons.views_lesson import view_lesson, view_lesson_topics, view_card_exercise, get_card_statuses
 from lessons.views_uchi import lesson_topics_uchi, home_uchi
 from lessons.views_teacher import teacher_panel, upload_video
+from lessons.views_upload import init_upload, upload_chunk, finalize_upload_view
+from lessons.views_debug_trace import ingest_trace
 
 urlpatterns = [
     path('', home, name='home'),
@@ -77,11 +79,21 @@ urlpatterns = [
         get_processing_status,
         name='processing_status',
     ),
+    path(
+        'api/videos/events/',
+        get_processing_events,
+        name='processing_events',
+    ),
     path(
         'api/videos/reset_stuck/',
         ResetStuckVideosView.as_view(),
         name='reset_stuck_videos',
     ),
+    path(
+        'api/videos/jobs/<int:job_id>/',
+        get_job_status,
+        name='get_job_status',
+    ),
     path(
         'api/videos/next_pending_info/',
         get_next_pending_video_info,
@@ -95,6 +107,12 @@ urlpatterns = [
     path('api/lessons/<int:lesson_id>/card_statuses/', get_card_statuses, name='get_card_statuses'),
     # Загрузка видео
     path('api/videos/upload/', upload_video, name='upload_video'),
+    # Возобновляемая загрузка по частям
+    path('api/videos/uploads/', init_upload, name='init_upload'),
+    path('api/videos/uploads/<uuid:upload_id>/', upload_chunk, name='upload_chunk'),
+    path('api/videos/uploads/<uuid:upload_id>/finalize/', finalize_upload_view, name='finalize_upload'),
+    # Отладочная трассировка из браузера (DEBUG_TRACE_ENABLED)
+    path('api/debug/trace/', ingest_trace, name='ingest_trace'),
 ]
 
 # Добавляем обработку статических файлов для разработки
@@ -1,16 +1,20 @@
 from django.contrib import admin
+from django.db import transaction
 from lessons.models import (
-    VideoFile, Lesson, ExerciseCard,
+    VideoFile, VideoProcessingJob, VideoUpload, Lesson, ExerciseCard,
     UserProgress, LessonAttempt, CardAttempt, UserAvatar
 )
+from lessons.services.avatar_score import learners_of_lessons, rebuild_avatar_scores
+from lessons.services.lesson_progress import rebuild_lessons_progress
+from lessons.services.lesson_summary import refresh_summaries
 
 
 @admin.register(VideoFile)
 class VideoFileAdmin(admin.ModelAdmin):
-    list_display = ('file_name', 'status', 'created_at', 'processed_at')
+    list_display = ('file_name', 'status', 'lease_owner', 'created_at', 'processed_at')
     list_filter = ('status', 'created_at')
     search_fields = ('file_name', 'file_path')
-    readonly_fields = ('created_at', 'processed_at', 'file_size')
+    readonly_fields = ('created_at', 'processed_at', 'file_size', 'lease_owner', 'lease_expires_at', 'heartbeat_at')
     
     fieldsets = (
         ('Основная информация', {
@@ -19,12 +23,33 @@ class VideoFileAdmin(admin.ModelAdmin):
         ('Статус', {
             'fields': ('status', 'error_message')
         }),
+        ('Аренда обработки', {
+            'fields': ('lease_owner', 'lease_expires_at', 'heartbeat_at')
+        }),
         ('Даты', {
             'fields': ('created_at', 'processed_at')
         }),
     )
 
 
+@admin.register(VideoProcessingJob)
+class VideoProcessingJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'video', 'status', 'force_recreate', 'attempts', 'claimed_by', 'heartbeat_at', 'created_at')
+    list_filter = ('status', 'force_recreate', 'created_at')
+    search_fields = ('video__file_name', 'claimed_by')
+    readonly_fields = ('created_at', 'started_at', 'finished_at', 'heartbeat_at', 'claimed_by', 'attempts')
+    ordering = ('-created_at',)
+
+
+@admin.register(VideoUpload)
+class VideoUploadAdmin(admin.ModelAdmin):
+    list_display = ('upload_id', 'file_name', 'total_size', 'status', 'video', 'created_at', 'updated_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('file_name', 'upload_id')
+    readonly_fields = ('upload_id', 'received_ranges', 'created_at', 'updated_at')
+    ordering = ('-created_at',)
+
+
 @admin.register(Lesson)
 class LessonAdmin(admin.ModelAdmin):
     list_display = ('title', 'language_level', 'video', 'created_at')
@@ -43,6 +68,19 @@ class LessonAdmin(admin.ModelAdmin):
             'fields': ('created_at', 'updated_at')
         }),
     )
+    
+    # Удаление урока каскадом удаляет ответы: средний балл персонажей пересчитывается
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            learners = learners_of_lessons([obj.id])
+            super().delete_model(request, obj)
+            rebuild_avatar_scores(learners)
+    
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            learners = learners_of_lessons(list(queryset.values_list('id', flat=True)))
+            super().delete_queryset(request, queryset)
+            rebuild_avatar_scores(learners)
 
 
 @admin.register(ExerciseCard)
@@ -54,7 +92,7 @@ class ExerciseCardAdmin(admin.ModelAdmin):
     
     fieldsets = (
         ('Основная информация', {
-            'fields': ('lesson', 'card_type', 'order_index')
+            'fields': ('lesson', 'card_type', 'topic', 'order_index')
         }),
         ('Контент карточки', {
             'fields': ('question_text', 'prompt_text', 'correct_answer')
@@ -66,6 +104,37 @@ class ExerciseCardAdmin(admin.ModelAdmin):
             'fields': ('translation_text', 'hint_text')
         }),
     )
+    
+    # Сводка урока (LessonSummary) пересчитывается в той же транзакции, что и правка карточки.
+    # Сводный прогресс пользователей (UserLessonProgress) пересчитывается, когда карточка
+    # удалена или сменила тему или урок: он хранит статусы по id карточек и счётчики по темам.
+    # При удалении карточки каскадом удаляются ответы — пересчитывается и балл персонажей
+    def save_model(self, request, obj, form, change):
+        lesson_ids = {obj.lesson_id}
+        if change and 'lesson' in form.changed_data:
+            lesson_ids.add(form.initial.get('lesson'))
+        with transaction.atomic():
+            super().save_model(request, obj, form, change)
+            refresh_summaries(lesson_ids)
+            if change and {'lesson', 'topic'} & set(form.changed_data):
+                rebuild_lessons_progress(lesson_ids)
+    
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            learners = learners_of_lessons([obj.lesson_id])
+            super().delete_model(request, obj)
+            refresh_summaries([obj.lesson_id])
+            rebuild_lessons_progress([obj.lesson_id])
+            rebuild_avatar_scores(learners)
+    
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            lesson_ids = set(queryset.values_list('lesson_id', flat=True))
+            learners = learners_of_lessons(lesson_ids)
+            super().delete_queryset(request, queryset)
+            refresh_summaries(lesson_ids)
+            rebuild_lessons_progress(lesson_ids)
+            rebuild_avatar_scores(learners)
 
 
 @admin.register(UserProgress)
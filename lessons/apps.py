@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class LessonsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'lessons'
+
+    def ready(self):
+        from django.conf import settings
+        if getattr(settings, 'LOG_ASYNC', True):
+            # Запись логов в консоль и LogStorage — в фоновом потоке
+            from lessons.services.log_handler import install_async_logging
+            install_async_logging(getattr(settings, 'LOG_ASYNC_LOGGERS', ['lessons']))
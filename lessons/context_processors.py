@@ -0,0 +1,9 @@
+"""
+Context processors приложения
+"""
+from lessons.services import debug_trace
+
+
+def debug_trace_settings(request):
+    """Включена ли отладочная трассировка (static/lessons/js/debug-trace.js)"""
+    return {'debug_trace_enabled': debug_trace.enabled()}
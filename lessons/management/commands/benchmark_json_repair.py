@@ -0,0 +1,119 @@
+"""
+Команда для сравнения разбора ответов AI: regex-исправления (json_parser)
+против однопроходного исправления (json_repair) на сохранённых ответах debug_responses
+"""
+import os
+import json
+import time
+import logging
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from lessons.services.json_parser import clean_ai_response, try_fix_json_errors, try_fix_truncated_json
+from lessons.services.json_repair import repair_json
+
+logger = logging.getLogger(__name__)
+
+ORIGINAL_MARKER = '=== ОРИГИНАЛЬНЫЙ ОТВЕТ ===\n'
+CLEANED_MARKER = '\n\n=== ПОСЛЕ ОЧИСТКИ ==='
+
+
+def extract_original_response(text):
+    """Оригинальный ответ модели из файла debug_responses (или весь файл)"""
+    if ORIGINAL_MARKER not in text:
+        return text
+    return text.split(ORIGINAL_MARKER, 1)[1].split(CLEANED_MARKER, 1)[0]
+
+
+def parse_with_regex_fixes(content):
+    """Текущая цепочка: clean_ai_response, try_fix_json_errors, try_fix_truncated_json"""
+    content = clean_ai_response(content)
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError as e:
+        error_pos = getattr(e, 'pos', len(content))
+    try:
+        return json.loads(try_fix_json_errors(content, error_pos))
+    except json.JSONDecodeError:
+        pass
+    return json.loads(try_fix_truncated_json(content, error_pos))
+
+
+def parse_with_repair(content):
+    return json.loads(repair_json(content).text)
+
+
+def count_cards(data):
+    if not isinstance(data, dict):
+        return 0
+    cards = len(data.get('cards') or [])
+    for topic in data.get('topics') or []:
+        if isinstance(topic, dict):
+            cards += len(topic.get('cards') or [])
+    return cards
+
+
+class Command(BaseCommand):
+    help = 'Сравнение скорости и результата разбора сохранённых ответов AI (json_parser против json_repair)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dir',
+            default=None,
+            help='Директория с ответами (по умолчанию: BASE_DIR/debug_responses)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Сколько раз разбирать каждый ответ для замера времени (по умолчанию: 20)',
+        )
+
+    def _measure(self, parse, content, repeat):
+        """Лучшее время разбора (мс) и результат: (время, данные или None, ошибка)"""
+        try:
+            data = parse(content)
+        except (ValueError, TypeError) as e:
+            return None, None, str(e)
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            parse(content)
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best, data, None
+
+    def _describe(self, elapsed, data, error):
+        if error:
+            return f'ошибка ({error[:60]})'
+        return f'{elapsed:8.2f} мс, карточек: {count_cards(data)}'
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or os.path.join(settings.BASE_DIR, 'debug_responses')
+        repeat = max(1, options['repeat'])
+        if not os.path.isdir(directory):
+            raise CommandError(f'Директория не найдена: {directory}')
+        files = sorted(name for name in os.listdir(directory) if name.endswith('.txt'))
+        if not files:
+            self.stdout.write(self.style.WARNING(f'В {directory} нет сохранённых ответов'))
+            return
+
+        totals = {'regex': [0.0, 0], 'repair': [0.0, 0]}
+        for name in files:
+            with open(os.path.join(directory, name), 'r', encoding='utf-8') as f:
+                content = extract_original_response(f.read())
+            self.stdout.write(f'{name} ({len(content)} символов)')
+            for label, parse in (('regex', parse_with_regex_fixes), ('repair', parse_with_repair)):
+                elapsed, data, error = self._measure(parse, content, repeat)
+                if not error:
+                    totals[label][0] += elapsed
+                    totals[label][1] += 1
+                line = f'  {label:<7} {self._describe(elapsed, data, error)}'
+                if label == 'repair':
+                    line += f', исправления: {", ".join(repair_json(content).repairs) or "нет"}'
+                self.stdout.write(line)
+
+        self.stdout.write('')
+        for label, (elapsed, parsed) in totals.items():
+            self.stdout.write(self.style.SUCCESS(
+                f'{label:<7} разобрано {parsed}/{len(files)}, суммарное время {elapsed:.2f} мс'
+            ))
@@ -0,0 +1,24 @@
+"""
+Команда для пересчёта среднего балла персонажей по истории ответов
+"""
+from django.core.management.base import BaseCommand
+from lessons.services.avatar_score import rebuild_avatar_scores
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитать сумму и количество баллов персонажей (UserAvatar) по всем ответам на карточки. '
+        'Нужна для заполнения счётчиков по старым данным или после ручной правки попыток'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Сколько персонажей обновлять одним запросом (по умолчанию: 500)',
+        )
+
+    def handle(self, *args, **options):
+        updated = rebuild_avatar_scores(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Пересчитан средний балл {updated} персонажей'))
@@ -4,7 +4,7 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from datetime import timedelta
-from lessons.models import VideoFile
+from lessons.services.video_lease import expire_stale_leases, stale_videos_queryset
 import os
 import logging
 
@@ -19,7 +19,8 @@ class Command(BaseCommand):
             '--hours',
             type=int,
             default=2,
-            help='Количество часов, после которых видео считается застрявшим (по умолчанию: 2)',
+            help='Через сколько часов видео без аренды считается застрявшим (по умолчанию: 2). '
+                 'Видео с истёкшей арендой сбрасываются всегда',
         )
         parser.add_argument(
             '--dry-run',
@@ -33,49 +34,32 @@ class Command(BaseCommand):
         
         cutoff_time = timezone.now() - timedelta(hours=hours)
         
-        stuck_videos = VideoFile.objects.filter(
-            status='processing',
-            created_at__lt=cutoff_time
-        )
-        
-        count = stuck_videos.count()
-        
-        if count == 0:
-            self.stdout.write(self.style.SUCCESS('Нет застрявших видео'))
-            return
-        
-        self.stdout.write(f'Найдено застрявших видео: {count}')
-        
-        for video in stuck_videos:
-            file_exists = os.path.exists(video.file_path) if video.file_path else False
+        if dry_run:
+            stuck_videos = list(stale_videos_queryset(cutoff_time))
+            if not stuck_videos:
+                self.stdout.write(self.style.SUCCESS('Нет застрявших видео'))
+                return
             
-            if dry_run:
+            self.stdout.write(f'Найдено застрявших видео: {len(stuck_videos)}')
+            for video in stuck_videos:
+                file_exists = os.path.exists(video.file_path) if video.file_path else False
                 self.stdout.write(
                     f'  [DRY RUN] ID {video.id}: {video.file_name} '
                     f'(файл: {"существует" if file_exists else "НЕ НАЙДЕН"}, '
-                    f'обновлено: {video.updated_at})'
-                )
-            else:
-                if not file_exists:
-                    video.status = 'error'
-                    video.processing_status = 'error'
-                    video.error_message = f'Видеофайл не найден: {video.file_path}'
-                    video.processing_message = None
-                else:
-                    video.status = 'pending'
-                    video.processing_status = 'idle'
-                    video.processing_message = None
-                    video.error_message = None
-                
-                video.save()
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f'  ✓ ID {video.id}: {video.file_name} -> {video.status}'
-                    )
+                    f'воркер: {video.lease_owner or "-"}, '
+                    f'последний heartbeat: {video.heartbeat_at or "-"})'
                 )
+            return
+        
+        reset, failed = expire_stale_leases(legacy_cutoff=cutoff_time)
+        
+        if reset + failed == 0:
+            self.stdout.write(self.style.SUCCESS('Нет застрявших видео'))
+            return
         
-        if not dry_run:
-            self.stdout.write(
-                self.style.SUCCESS(f'\nСброшено {count} застрявших видео')
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Сброшено {reset + failed} застрявших видео '
+                f'(в очередь: {reset}, файл не найден: {failed})'
             )
-
+        )
@@ -0,0 +1,91 @@
+"""
+Команда для запуска воркеров фоновой обработки видео
+"""
+import signal
+import logging
+import multiprocessing
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from lessons.services.job_queue import VideoJobWorker, make_worker_id
+
+logger = logging.getLogger(__name__)
+
+
+def _make_worker(worker_id=None, pipeline=False):
+    if pipeline:
+        from lessons.services.video_pipeline import PipelinedVideoJobWorker
+        return PipelinedVideoJobWorker(worker_id=worker_id)
+    return VideoJobWorker(worker_id=worker_id)
+
+
+def _run_worker(index, once, pipeline):
+    """Точка входа дочернего процесса воркера"""
+    import django
+    django.setup()
+    worker = _make_worker(make_worker_id(index), pipeline)
+    signal.signal(signal.SIGTERM, lambda *args: worker.stop())
+    try:
+        worker.run(once=once)
+    except KeyboardInterrupt:
+        worker.stop()
+
+
+class Command(BaseCommand):
+    help = 'Запуск воркеров, обрабатывающих видео из очереди задач'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Количество процессов-воркеров (по умолчанию: 1)',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Обработать текущую очередь и завершиться',
+        )
+        parser.add_argument(
+            '--pipeline',
+            action='store_true',
+            help='Конвейерная обработка: транскрипция следующего видео параллельно с генерацией урока '
+                 '(по умолчанию — VIDEO_PIPELINE_ENABLED)',
+        )
+
+    def handle(self, *args, **options):
+        workers_count = max(1, options['workers'])
+        once = options['once']
+        pipeline = options['pipeline'] or getattr(settings, 'VIDEO_PIPELINE_ENABLED', False)
+
+        if workers_count == 1:
+            self.stdout.write(self.style.SUCCESS('Запуск воркера обработки видео...'))
+            worker = _make_worker(pipeline=pipeline)
+            try:
+                processed = worker.run(once=once)
+            except KeyboardInterrupt:
+                self.stdout.write(self.style.WARNING('\nОстановка воркера...'))
+                return
+            self.stdout.write(self.style.SUCCESS(f'Обработано задач: {processed}'))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f'Запуск {workers_count} воркеров обработки видео...'))
+        # Подключения к БД нельзя разделять между процессами
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(target=_run_worker, args=(index, once, pipeline), name=f'video-worker-{index}')
+            for index in range(workers_count)
+        ]
+        for process in processes:
+            process.start()
+
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('\nОстановка воркеров...'))
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.join()
+        self.stdout.write(self.style.SUCCESS('Воркеры остановлены.'))
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.1 on 2026-10-18 12:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0011_add_stars_to_lesson_attempt'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoProcessingJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'В очереди'), ('running', 'Выполняется'), ('done', 'Выполнено'), ('error', 'Ошибка')], default='queued', max_length=20, verbose_name='Статус')),
+                ('force_recreate', models.BooleanField(default=False, verbose_name='Пересоздать урок')),
+                ('claimed_by', models.CharField(blank=True, help_text='Идентификатор воркера, взявшего задачу (host:pid:n)', max_length=255, null=True, verbose_name='Воркер')),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True, verbose_name='Последний heartbeat')),
+                ('attempts', models.IntegerField(default=0, verbose_name='Количество попыток')),
+                ('error_message', models.TextField(blank=True, null=True, verbose_name='Сообщение об ошибке')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Начато')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершено')),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='lessons.videofile', verbose_name='Видеофайл')),
+            ],
+            options={
+                'verbose_name': 'Задача обработки видео',
+                'verbose_name_plural': 'Задачи обработки видео',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='lessons_vid_status_9706ea_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='videoprocessingjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running'])), fields=('video',), name='unique_active_job_per_video'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.1 on 2026-10-18 12:42
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0012_videoprocessingjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videofile',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True, verbose_name='SHA-256 содержимого'),
+        ),
+        migrations.CreateModel(
+            name='VideoUpload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('upload_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name='Идентификатор')),
+                ('file_name', models.CharField(max_length=255, verbose_name='Имя файла')),
+                ('total_size', models.BigIntegerField(verbose_name='Размер файла (байт)')),
+                ('sha256', models.CharField(blank=True, help_text='Контрольная сумма, заявленная клиентом', max_length=64, null=True, verbose_name='Ожидаемый SHA-256')),
+                ('received_ranges', models.JSONField(default=list, help_text='Отсортированные непересекающиеся [начало, конец) в байтах', verbose_name='Полученные диапазоны')),
+                ('status', models.CharField(choices=[('uploading', 'Загружается'), ('done', 'Завершена')], default='uploading', max_length=20, verbose_name='Статус')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('video', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='uploads', to='lessons.videofile', verbose_name='Видеофайл')),
+            ],
+            options={
+                'verbose_name': 'Загрузка видео',
+                'verbose_name_plural': 'Загрузки видео',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
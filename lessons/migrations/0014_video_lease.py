@@ -0,0 +1,32 @@
+# Generated by Django 5.0.1 on 2026-10-18 12:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0013_video_upload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videofile',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Последний heartbeat'),
+        ),
+        migrations.AddField(
+            model_name='videofile',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Аренда истекает'),
+        ),
+        migrations.AddField(
+            model_name='videofile',
+            name='lease_owner',
+            field=models.CharField(blank=True, help_text='Идентификатор воркера, захватившего видео (host:pid:n)', max_length=255, null=True, verbose_name='Обрабатывающий воркер'),
+        ),
+        migrations.AddIndex(
+            model_name='videofile',
+            index=models.Index(fields=['status', 'lease_expires_at'], name='lessons_vid_status_28d502_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.1 on 2026-10-18 12:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0014_video_lease'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='videofile',
+            index=models.Index(fields=['created_at', 'id'], name='lessons_vid_created_40123b_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.0.1 on 2026-10-18 12:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_summaries(apps, schema_editor):
+    """Сводки для уже созданных уроков (логика как в lessons.services.lesson_summary)"""
+    Lesson = apps.get_model('lessons', 'Lesson')
+    ExerciseCard = apps.get_model('lessons', 'ExerciseCard')
+    LessonSummary = apps.get_model('lessons', 'LessonSummary')
+    summaries = []
+    for lesson_id in Lesson.objects.values_list('id', flat=True).iterator():
+        topic_counts, card_types = {}, {}
+        cards = ExerciseCard.objects.filter(lesson_id=lesson_id).order_by('order_index', 'id')
+        for topic, card_type in cards.values_list('topic', 'card_type'):
+            topic = topic or 'general'
+            topic_counts[topic] = topic_counts.get(topic, 0) + 1
+            card_types[card_type] = card_types.get(card_type, 0) + 1
+        summaries.append(LessonSummary(
+            lesson_id=lesson_id,
+            topics=list(topic_counts),
+            topic_counts=topic_counts,
+            card_types=card_types,
+            cards_total=sum(topic_counts.values()),
+        ))
+    LessonSummary.objects.bulk_create(summaries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0015_video_created_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LessonSummary',
+            fields=[
+                ('lesson', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='lessons.lesson', verbose_name='Урок')),
+                ('topics', models.JSONField(default=list, help_text='Темы в порядке карточек; карточки без темы относятся к general', verbose_name='Темы')),
+                ('topic_counts', models.JSONField(default=dict, verbose_name='Карточек по темам')),
+                ('card_types', models.JSONField(default=dict, verbose_name='Карточек по типам')),
+                ('cards_total', models.IntegerField(default=0, verbose_name='Всего карточек')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Сводка урока',
+                'verbose_name_plural': 'Сводки уроков',
+            },
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
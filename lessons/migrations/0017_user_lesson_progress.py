@@ -0,0 +1,71 @@
+# Generated by Django 5.0.1 on 2026-10-18 13:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_progress(apps, schema_editor):
+    """Сводный прогресс по уже пройденным урокам (логика как в lessons.services.lesson_progress)"""
+    LessonAttempt = apps.get_model('lessons', 'LessonAttempt')
+    CardAttempt = apps.get_model('lessons', 'CardAttempt')
+    UserLessonProgress = apps.get_model('lessons', 'UserLessonProgress')
+    rows = {}
+    attempts = LessonAttempt.objects.order_by('started_at', 'id').values_list(
+        'id', 'user_progress_id', 'lesson_id', 'status', 'stars'
+    )
+    for attempt_id, user_progress_id, lesson_id, status, stars in attempts.iterator():
+        progress = rows.setdefault((user_progress_id, lesson_id), UserLessonProgress(
+            user_progress_id=user_progress_id, lesson_id=lesson_id,
+            card_states={}, topic_completed={}, cards_completed=0, best_stars=0,
+        ))
+        progress.best_stars = max(progress.best_stars, stars or 0)
+        progress.last_attempt_id = attempt_id
+        progress.last_status = status
+    card_attempts = CardAttempt.objects.order_by('lesson_attempt__started_at', 'lesson_attempt_id', 'id').values_list(
+        'lesson_attempt__user_progress_id', 'lesson_attempt__lesson_id', 'card_id', 'card__topic',
+        'card_status', 'attempts_count',
+    )
+    for user_progress_id, lesson_id, card_id, topic, card_status, attempts_count in card_attempts.iterator():
+        progress = rows[(user_progress_id, lesson_id)]
+        topic = topic or 'general'
+        previous = progress.card_states.get(str(card_id))
+        was_completed = bool(previous) and previous[0] > 0
+        progress.card_states[str(card_id)] = [card_status, attempts_count]
+        if was_completed != (card_status > 0):
+            delta = -1 if was_completed else 1
+            progress.cards_completed += delta
+            progress.topic_completed[topic] = progress.topic_completed.get(topic, 0) + delta
+            if progress.topic_completed[topic] <= 0:
+                del progress.topic_completed[topic]
+    UserLessonProgress.objects.bulk_create(rows.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0016_lesson_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserLessonProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('card_states', models.JSONField(default=dict, help_text='{id карточки: [статус, попыток]} по последнему ответу на карточку', verbose_name='Статусы карточек')),
+                ('topic_completed', models.JSONField(default=dict, verbose_name='Пройдено карточек по темам')),
+                ('cards_completed', models.IntegerField(default=0, verbose_name='Пройдено карточек')),
+                ('best_stars', models.IntegerField(default=0, verbose_name='Лучший результат (звёзды)')),
+                ('last_status', models.CharField(choices=[('in_progress', 'В процессе'), ('completed', 'Завершено'), ('abandoned', 'Прервано')], default='in_progress', max_length=20, verbose_name='Статус последней попытки')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('last_attempt', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='lessons.lessonattempt', verbose_name='Последняя попытка')),
+                ('lesson', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='learner_progress', to='lessons.lesson', verbose_name='Урок')),
+                ('user_progress', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lesson_progress', to='lessons.userprogress', verbose_name='Прогресс пользователя')),
+            ],
+            options={
+                'verbose_name': 'Прогресс по уроку',
+                'verbose_name_plural': 'Прогресс по урокам',
+                'unique_together': {('user_progress', 'lesson')},
+            },
+        ),
+        migrations.RunPython(build_progress, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.0.1 on 2026-10-18 13:03
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_score_totals(apps, schema_editor):
+    """Счётчики среднего балла по уже данным ответам (как команда rebuild_avatar_scores)"""
+    CardAttempt = apps.get_model('lessons', 'CardAttempt')
+    UserAvatar = apps.get_model('lessons', 'UserAvatar')
+    totals = {
+        row['lesson_attempt__user_progress_id']: (row['points'], row['cards'])
+        for row in CardAttempt.objects.exclude(card_status=0)
+        .values('lesson_attempt__user_progress_id')
+        .annotate(points=Sum('card_status'), cards=Count('id'))
+        .order_by()
+    }
+    avatars = list(UserAvatar.objects.filter(user_progress_id__in=list(totals)))
+    for avatar in avatars:
+        avatar.score_points, avatar.scored_cards = totals[avatar.user_progress_id]
+        avatar.total_score = avatar.score_points / avatar.scored_cards
+    UserAvatar.objects.bulk_update(avatars, ['score_points', 'scored_cards', 'total_score'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0017_user_lesson_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='useravatar',
+            name='score_points',
+            field=models.IntegerField(default=0, help_text='Сумма статусов карточек с ненулевым статусом', verbose_name='Сумма баллов'),
+        ),
+        migrations.AddField(
+            model_name='useravatar',
+            name='scored_cards',
+            field=models.IntegerField(default=0, help_text='Количество карточек с ненулевым статусом', verbose_name='Карточек с баллом'),
+        ),
+        migrations.RunPython(fill_score_totals, migrations.RunPython.noop),
+    ]
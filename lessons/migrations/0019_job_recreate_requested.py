@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-18 13:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0018_avatar_score_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videoprocessingjob',
+            name='recreate_requested',
+            field=models.BooleanField(default=False, help_text='Пересоздание запрошено во время выполнения: после завершения ставится новая задача', verbose_name='Пересоздание запрошено'),
+        ),
+    ]
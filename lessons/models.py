@@ -1,4 +1,6 @@
+import uuid
 from django.db import models
+from django.db.models.functions import Cast
 from django.utils import timezone
 
 
@@ -25,6 +27,13 @@ class VideoFile(models.Model):
         default=False,
         verbose_name='Транскрипт сохранён',
     )
+    content_hash = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        db_index=True,
+        verbose_name='SHA-256 содержимого',
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
     processed_at = models.DateTimeField(null=True, blank=True, verbose_name='Дата обработки')
     status = models.CharField(
@@ -45,16 +54,149 @@ class VideoFile(models.Model):
         blank=True,
         verbose_name='Сообщение об обработке'
     )
+    lease_owner = models.CharField(
+        max_length=255,
+        null=True,
+        blank=True,
+        verbose_name='Обрабатывающий воркер',
+        help_text='Идентификатор воркера, захватившего видео (host:pid:n)'
+    )
+    lease_expires_at = models.DateTimeField(null=True, blank=True, verbose_name='Аренда истекает')
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name='Последний heartbeat')
     
     class Meta:
         verbose_name = 'Видеофайл'
         verbose_name_plural = 'Видеофайлы'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'lease_expires_at']),
+            # Позиция видео в общей очереди (COUNT по created_at)
+            models.Index(fields=['created_at', 'id']),
+        ]
     
     def __str__(self):
         return f'{self.file_name} ({self.status})'
 
 
+class VideoProcessingJob(models.Model):
+    """Задача фоновой обработки видео (очередь в БД)"""
+
+    STATUS_CHOICES = [
+        ('queued', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('done', 'Выполнено'),
+        ('error', 'Ошибка'),
+    ]
+
+    video = models.ForeignKey(
+        VideoFile,
+        on_delete=models.CASCADE,
+        related_name='jobs',
+        verbose_name='Видеофайл'
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='queued',
+        verbose_name='Статус'
+    )
+    force_recreate = models.BooleanField(default=False, verbose_name='Пересоздать урок')
+    recreate_requested = models.BooleanField(
+        default=False,
+        verbose_name='Пересоздание запрошено',
+        help_text='Пересоздание запрошено во время выполнения: после завершения ставится новая задача'
+    )
+    claimed_by = models.CharField(
+        max_length=255,
+        null=True,
+        blank=True,
+        verbose_name='Воркер',
+        help_text='Идентификатор воркера, взявшего задачу (host:pid:n)'
+    )
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name='Последний heartbeat')
+    attempts = models.IntegerField(default=0, verbose_name='Количество попыток')
+    error_message = models.TextField(null=True, blank=True, verbose_name='Сообщение об ошибке')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='Начато')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Завершено')
+
+    class Meta:
+        verbose_name = 'Задача обработки видео'
+        verbose_name_plural = 'Задачи обработки видео'
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+        constraints = [
+            # Не больше одной активной задачи на видео (защита от двойного клика)
+            models.UniqueConstraint(
+                fields=['video'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='unique_active_job_per_video',
+            ),
+        ]
+
+    def __str__(self):
+        return f'Задача {self.id}: {self.video.file_name} ({self.status})'
+
+
+class VideoUpload(models.Model):
+    """Возобновляемая загрузка видео по частям (диапазонами байт)"""
+
+    STATUS_CHOICES = [
+        ('uploading', 'Загружается'),
+        ('done', 'Завершена'),
+    ]
+
+    upload_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False, verbose_name='Идентификатор')
+    file_name = models.CharField(max_length=255, verbose_name='Имя файла')
+    total_size = models.BigIntegerField(verbose_name='Размер файла (байт)')
+    sha256 = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        verbose_name='Ожидаемый SHA-256',
+        help_text='Контрольная сумма, заявленная клиентом'
+    )
+    received_ranges = models.JSONField(
+        default=list,
+        verbose_name='Полученные диапазоны',
+        help_text='Отсортированные непересекающиеся [начало, конец) в байтах'
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='uploading',
+        verbose_name='Статус'
+    )
+    video = models.ForeignKey(
+        VideoFile,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='uploads',
+        verbose_name='Видеофайл'
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+
+    class Meta:
+        verbose_name = 'Загрузка видео'
+        verbose_name_plural = 'Загрузки видео'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f'Загрузка {self.upload_id}: {self.file_name} ({self.status})'
+
+    @property
+    def received_bytes(self):
+        return sum(end - start for start, end in self.received_ranges)
+
+    @property
+    def is_complete(self):
+        return self.received_ranges == [[0, self.total_size]]
+
+
 class Lesson(models.Model):
     """Модель урока английского языка"""
     
@@ -174,6 +316,39 @@ class ExerciseCard(models.Model):
         return f'{self.lesson.title} - {self.get_card_type_display()} (#{self.order_index})'
 
 
+class LessonSummary(models.Model):
+    """
+    Сводка по карточкам урока
+
+    Пересчитывается при записи карточек (lessons.services.lesson_summary),
+    чтобы список уроков и страницы тем не перебирали карточки при каждом запросе.
+    """
+
+    lesson = models.OneToOneField(
+        Lesson,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='summary',
+        verbose_name='Урок'
+    )
+    topics = models.JSONField(
+        default=list,
+        verbose_name='Темы',
+        help_text='Темы в порядке карточек; карточки без темы относятся к general'
+    )
+    topic_counts = models.JSONField(default=dict, verbose_name='Карточек по темам')
+    card_types = models.JSONField(default=dict, verbose_name='Карточек по типам')
+    cards_total = models.IntegerField(default=0, verbose_name='Всего карточек')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+
+    class Meta:
+        verbose_name = 'Сводка урока'
+        verbose_name_plural = 'Сводки уроков'
+
+    def __str__(self):
+        return f'{self.lesson_id}: {self.cards_total} карточек, {len(self.topics)} тем'
+
+
 class UserProgress(models.Model):
     """Модель для отслеживания общего прогресса пользователя"""
     
@@ -283,6 +458,9 @@ class LessonAttempt(models.Model):
         """Рассчитать количество звёзд: 1★ = 50-69%, 2★ = 70-99%, 3★ = 100%"""
         if not self.score:
             self.calculate_score()
+        if self.score is None:
+            # Урок без карточек: оценки нет
+            return 0
         
         if self.score >= 100:
             return 3
@@ -337,15 +515,73 @@ class CardAttempt(models.Model):
     
     def get_status_color(self):
         """Возвращает цвет статуса"""
-        if self.card_status == 0:
+        return self.status_color(self.card_status)
+    
+    @staticmethod
+    def status_color(card_status):
+        """Цвет статуса карточки: 0 — красный, 3 — жёлтый, 5 — зелёный"""
+        if card_status == 0:
             return 'red'
-        elif self.card_status == 3:
+        elif card_status == 3:
             return 'yellow'
-        elif self.card_status == 5:
+        elif card_status == 5:
             return 'green'
         return 'gray'
 
 
+class UserLessonProgress(models.Model):
+    """
+    Сводный прогресс пользователя по уроку
+
+    Обновляется при каждом ответе на карточку (lessons.services.lesson_progress),
+    чтобы карта уроков и страницы урока не перебирали историю попыток.
+    """
+
+    user_progress = models.ForeignKey(
+        UserProgress,
+        on_delete=models.CASCADE,
+        related_name='lesson_progress',
+        verbose_name='Прогресс пользователя'
+    )
+    lesson = models.ForeignKey(
+        Lesson,
+        on_delete=models.CASCADE,
+        related_name='learner_progress',
+        verbose_name='Урок'
+    )
+    card_states = models.JSONField(
+        default=dict,
+        verbose_name='Статусы карточек',
+        help_text='{id карточки: [статус, попыток]} по последнему ответу на карточку'
+    )
+    topic_completed = models.JSONField(default=dict, verbose_name='Пройдено карточек по темам')
+    cards_completed = models.IntegerField(default=0, verbose_name='Пройдено карточек')
+    best_stars = models.IntegerField(default=0, verbose_name='Лучший результат (звёзды)')
+    last_attempt = models.ForeignKey(
+        LessonAttempt,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Последняя попытка'
+    )
+    last_status = models.CharField(
+        max_length=20,
+        choices=LessonAttempt.STATUS_CHOICES,
+        default='in_progress',
+        verbose_name='Статус последней попытки'
+    )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+    
+    class Meta:
+        verbose_name = 'Прогресс по уроку'
+        verbose_name_plural = 'Прогресс по урокам'
+        unique_together = ['user_progress', 'lesson']
+    
+    def __str__(self):
+        return f'{self.user_progress_id} - {self.lesson_id}: {self.cards_completed} карточек'
+
+
 class UserAvatar(models.Model):
     """Модель персонажа пользователя"""
     
@@ -370,6 +606,17 @@ class UserAvatar(models.Model):
         verbose_name='Средний балл',
         help_text='Средний балл по всем карточкам (0-5)'
     )
+    # Накопительные сумма и количество для total_score: меняются на разницу статусов при ответе
+    score_points = models.IntegerField(
+        default=0,
+        verbose_name='Сумма баллов',
+        help_text='Сумма статусов карточек с ненулевым статусом'
+    )
+    scored_cards = models.IntegerField(
+        default=0,
+        verbose_name='Карточек с баллом',
+        help_text='Количество карточек с ненулевым статусом'
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
     
@@ -381,28 +628,57 @@ class UserAvatar(models.Model):
     def __str__(self):
         return f'{self.avatar_name} ({self.avatar_emoji}) - Балл: {self.total_score:.1f}'
     
+    @staticmethod
+    def score_delta(previous_status, card_status):
+        """Изменение (суммы баллов, количества карточек) при смене статуса карточки"""
+        points = card_status - previous_status
+        cards = (card_status > 0) - (previous_status > 0)
+        return points, cards
+    
+    def apply_card_status(self, previous_status, card_status):
+        """Учесть смену статуса карточки за O(1)
+        
+        Сумма, количество и средний балл меняются одним UPDATE с F-выражениями,
+        поэтому одновременные ответы не теряют изменений друг друга. Значения
+        в объекте сдвигаются на ту же разницу без повторного чтения, поэтому
+        совпадают с базой, только если объект прочитан под select_for_update
+        в той же транзакции (так делает lessons.services.card_answer).
+        """
+        points, cards = self.score_delta(previous_status, card_status)
+        if points or cards:
+            new_points = models.F('score_points') + points
+            new_cards = models.F('scored_cards') + cards
+            UserAvatar.objects.filter(pk=self.pk).update(
+                score_points=new_points,
+                scored_cards=new_cards,
+                total_score=models.Case(
+                    models.When(
+                        scored_cards__gt=-cards,
+                        then=Cast(new_points, models.FloatField()) / Cast(new_cards, models.FloatField()),
+                    ),
+                    default=models.Value(0.0),
+                    output_field=models.FloatField(),
+                ),
+            )
+            self.score_points += points
+            self.scored_cards += cards
+            self.total_score = self.score_points / self.scored_cards if self.scored_cards > 0 else 0.0
+        return self.total_score
+    
     def update_score(self):
-        """Обновляет средний балл на основе всех карточек пользователя
+        """Пересчитывает средний балл по всем карточкам пользователя (полный проход)
         
         Формула: сумма баллов всех карточек с ненулевым статусом / количество таких карточек
-        Красный (0) не учитывается в расчете
+        Красный (0) не учитывается в расчете. При ответе используется apply_card_status.
         """
-        # Получаем все попытки пользователя
-        lesson_attempts = LessonAttempt.objects.filter(user_progress=self.user_progress)
-        
-        # Получаем все карточки с ненулевым статусом (не равные 0)
-        card_attempts = CardAttempt.objects.filter(
-            lesson_attempt__in=lesson_attempts
-        ).exclude(card_status=0)
-        
-        if card_attempts.exists():
-            # Суммируем баллы и делим на количество
-            total_points = sum(ca.card_status for ca in card_attempts)
-            count = card_attempts.count()
-            self.total_score = total_points / count if count > 0 else 0.0
-        else:
-            self.total_score = 0.0
-        
+        totals = CardAttempt.objects.filter(
+            lesson_attempt__user_progress=self.user_progress
+        ).exclude(card_status=0).aggregate(
+            points=models.Sum('card_status'), cards=models.Count('id')
+        )
+        self.score_points = totals['points'] or 0
+        self.scored_cards = totals['cards']
+        self.total_score = self.score_points / self.scored_cards if self.scored_cards else 0.0
         self.save()
         return self.total_score
 
@@ -1,20 +1,24 @@
-import json
 import logging
 import sys
-import requests
 from django.conf import settings
-from lessons.services.json_parser import clean_ai_response, try_fix_json_errors, try_fix_truncated_json
+from lessons.services.ai_response_cache import AIResponseCache
+from lessons.services.card_stream_parser import CardStreamParser
+from lessons.services.http_session import iter_sse_data, post_with_retry
+from lessons.services.json_repair import loads_tolerant
 
 logger = logging.getLogger(__name__)
 
 
 class AIClient:
-    def __init__(self, api_key, model, api_url):
+    def __init__(self, api_key, model, api_url, use_cache=None):
         self.api_key = api_key
         self.model = model
         self.api_url = api_url
         if not self.api_key:
             raise ValueError('OPENROUTER_API_KEY не установлен в настройках')
+        if use_cache is None:
+            use_cache = AIResponseCache.is_enabled()
+        self.cache = AIResponseCache.get_instance() if use_cache else None
     
     def _get_headers(self):
         return {
@@ -24,7 +28,23 @@ class AIClient:
             'X-Title': 'English Lessons App'
         }
     
-    def _make_request(self, messages, max_tokens=16000, temperature=0.7, timeout=120):
+    def _make_request(self, messages, max_tokens=16000, temperature=0.7, timeout=120, deadline=None,
+                      bypass_cache=False, on_delta=None):
+        """
+        Запрос к API (с кэшем ответов)
+        
+        Если передан on_delta, ответ запрашивается потоком (SSE) и каждый
+        фрагмент текста передаётся в on_delta по мере получения.
+        """
+        cache = None if bypass_cache else self.cache
+        if cache is not None:
+            cache_key = cache.make_key(self.model, messages, max_tokens, temperature)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                logger.info(f'✅ Ответ AI взят из кэша ({cache_key[:12]})')
+                if on_delta is not None:
+                    on_delta(cached['choices'][0]['message']['content'])
+                return cached
         headers = self._get_headers()
         payload = {
             'model': self.model,
@@ -32,59 +52,115 @@ class AIClient:
             'temperature': temperature,
             'max_tokens': max_tokens,
         }
-        response = requests.post(self.api_url, headers=headers, json=payload, timeout=timeout)
-        response.raise_for_status()
-        return response.json()
+        if on_delta is not None:
+            result = self._stream_request(headers, payload, on_delta, timeout, deadline)
+        else:
+            response = post_with_retry(self.api_url, headers=headers, json=payload, timeout=timeout, deadline=deadline)
+            result = response.json()
+        if cache is not None and result.get('choices'):
+            cache.put(cache_key, result)
+        return result
     
-    def analyze_transcript(self, system_prompt, user_prompt):
+    def _stream_request(self, headers, payload, on_delta, timeout, deadline):
+        """Потоковый запрос: собирает ответ в формате обычного (choices[0].message.content)"""
+        payload = dict(payload, stream=True)
+        response = post_with_retry(self.api_url, headers=headers, json=payload, timeout=timeout,
+                                   deadline=deadline, stream=True)
+        parts = []
+        finish_reason = None
+        with response:
+            for event in iter_sse_data(response):
+                if event.get('error'):
+                    raise Exception(f'Ошибка OpenRouter в потоке ответа: {event["error"]}')
+                choices = event.get('choices') or [{}]
+                delta = (choices[0].get('delta') or {}).get('content')
+                if delta:
+                    parts.append(delta)
+                    on_delta(delta)
+                finish_reason = choices[0].get('finish_reason') or finish_reason
+        return {'choices': [{'message': {'content': ''.join(parts)}, 'finish_reason': finish_reason}]}
+    
+    def analyze_transcript(self, system_prompt, user_prompt, bypass_cache=False):
         try:
             messages = [
                 {'role': 'system', 'content': system_prompt},
                 {'role': 'user', 'content': user_prompt}
             ]
-            result = self._make_request(messages, max_tokens=4000, timeout=60)
+            result = self._make_request(messages, max_tokens=4000, timeout=60, deadline=180, bypass_cache=bypass_cache)
             content = result['choices'][0]['message']['content']
             finish_reason = result['choices'][0].get('finish_reason', '')
             if finish_reason == 'length':
                 logger.warning('⚠️ Ответ был обрезан! Запрашиваю продолжение...')
-                continuation = self._request_continuation(content, 'analysis')
+                continuation = self._request_continuation(content, 'analysis', bypass_cache)
                 content = content + continuation
-            content = clean_ai_response(content)
-            try:
-                return json.loads(content)
-            except json.JSONDecodeError as e:
-                fixed_content = try_fix_json_errors(content, getattr(e, 'pos', len(content)))
-                return json.loads(fixed_content)
+            analysis_data, _ = loads_tolerant(content)
+            return analysis_data
         except Exception as e:
             logger.error(f'Ошибка анализа транскрипта: {str(e)}', exc_info=True)
             raise
     
-    def generate_cards(self, system_prompt, user_prompt):
+    def generate_cards(self, system_prompt, user_prompt, bypass_cache=False):
         try:
             messages = [
                 {'role': 'system', 'content': system_prompt},
                 {'role': 'user', 'content': user_prompt}
             ]
-            result = self._make_request(messages, max_tokens=6000, timeout=120)
+            result = self._make_request(messages, max_tokens=6000, timeout=120, deadline=300, bypass_cache=bypass_cache)
             content = result['choices'][0]['message']['content']
             finish_reason = result['choices'][0].get('finish_reason', '')
             if finish_reason == 'length':
                 logger.warning('⚠️ Ответ был обрезан! Запрашиваю продолжение...')
-                continuation = self._request_continuation(content, 'cards')
+                continuation = self._request_continuation(content, 'cards', bypass_cache)
                 content = content + continuation
-            content = clean_ai_response(content)
-            try:
-                cards_data = json.loads(content)
-                return cards_data.get('cards', [])
-            except json.JSONDecodeError as e:
-                fixed_content = try_fix_truncated_json(content, getattr(e, 'pos', len(content)))
-                cards_data = json.loads(fixed_content)
-                return cards_data.get('cards', [])
+            return self._parse_cards_content(content)
         except Exception as e:
             logger.error(f'Ошибка генерации карточек: {str(e)}', exc_info=True)
             raise
     
-    def _request_continuation(self, truncated_content, content_type='json'):
+    def generate_cards_stream(self, system_prompt, user_prompt, on_card=None, bypass_cache=False):
+        """
+        Генерация карточек потоком: каждая карточка разбирается, как только
+        закрывается её JSON-объект, и сразу передаётся в on_card
+        
+        Обрезанный по max_tokens ответ не дополняется: незавершённая
+        последняя карточка отбрасывается, готовые остаются.
+        """
+        try:
+            messages = [
+                {'role': 'system', 'content': system_prompt},
+                {'role': 'user', 'content': user_prompt}
+            ]
+            parser = CardStreamParser()
+            
+            def on_delta(text):
+                for card in parser.feed(text):
+                    if on_card is not None:
+                        on_card(card)
+            
+            result = self._make_request(
+                messages, max_tokens=6000, timeout=120, deadline=300,
+                bypass_cache=bypass_cache, on_delta=on_delta,
+            )
+            if result['choices'][0].get('finish_reason') == 'length':
+                logger.warning(f'⚠️ Ответ был обрезан! Сохранено {len(parser.cards)} завершённых карточек')
+            if parser.cards:
+                return parser.cards
+            # Ответ не в ожидаемом формате {"cards": [...]} — разбираем целиком
+            cards = self._parse_cards_content(result['choices'][0]['message']['content'])
+            if on_card is not None:
+                for card in cards:
+                    on_card(card)
+            return cards
+        except Exception as e:
+            logger.error(f'Ошибка потоковой генерации карточек: {str(e)}', exc_info=True)
+            raise
+    
+    @staticmethod
+    def _parse_cards_content(content):
+        cards_data, _ = loads_tolerant(content)
+        return cards_data.get('cards', [])
+    
+    def _request_continuation(self, truncated_content, content_type='json', bypass_cache=False):
         continuation_prompt = f"""Продолжи и заверши этот незавершенный JSON. 
 Важно: верни ТОЛЬКО продолжение, начиная с того места, где текст обрывается.
 Не повторяй уже написанное, только продолжение до закрытия всех скобок и массивов.
@@ -98,12 +174,12 @@ class AIClient:
                 {'role': 'system', 'content': 'Ты помощник, который завершает незавершенный JSON. Возвращай только продолжение текста, без повторения уже написанного.'},
                 {'role': 'user', 'content': continuation_prompt}
             ]
-            result = self._make_request(messages, max_tokens=4000, timeout=60)
+            result = self._make_request(messages, max_tokens=4000, timeout=60, deadline=180, bypass_cache=bypass_cache)
             continuation = result['choices'][0]['message']['content']
             finish_reason = result['choices'][0].get('finish_reason', '')
             if finish_reason == 'length':
                 logger.warning('⚠️ Продолжение тоже обрезано! Запрашиваю еще раз...')
-                continuation += self._request_continuation(truncated_content + continuation, content_type)
+                continuation += self._request_continuation(truncated_content + continuation, content_type, bypass_cache)
             logger.info(f'✅ Получено продолжение, длина: {len(continuation)} символов')
             return continuation
         except Exception as e:
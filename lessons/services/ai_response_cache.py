@@ -0,0 +1,140 @@
+"""
+Кэш ответов AI API
+
+Ключ — хэш модели, системного и пользовательского промптов, max_tokens
+и temperature. Повторная обработка того же транскрипта (пересоздание уроков,
+повтор после ошибки БД) получает ответ из кэша без запроса к OpenRouter.
+Записи старше max_age удаляются при чтении, при превышении max_entries
+удаляются самые старые. Очистка обходит всю директорию, поэтому запускается
+не при каждой записи, а при первой и затем каждой prune_every-й.
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class AIResponseCache:
+    """Файловый кэш ответов: <directory>/<key[:2]>/<key>.json"""
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self, directory=None, max_entries=None, max_age_seconds=None, prune_every=None):
+        self.directory = directory or settings.AI_RESPONSE_CACHE_DIRECTORY
+        self.max_entries = max_entries if max_entries is not None else getattr(
+            settings, 'AI_RESPONSE_CACHE_MAX_ENTRIES', 1000
+        )
+        if max_age_seconds is None:
+            max_age_seconds = getattr(settings, 'AI_RESPONSE_CACHE_MAX_AGE_DAYS', 30) * 24 * 3600
+        self.max_age_seconds = max_age_seconds
+        self.prune_every = max(1, prune_every or getattr(settings, 'AI_RESPONSE_CACHE_PRUNE_EVERY', 50))
+        self.prune_lock = threading.Lock()
+        self._writes = 0
+
+    @classmethod
+    def get_instance(cls):
+        """Singleton pattern"""
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    @classmethod
+    def is_enabled(cls):
+        return getattr(settings, 'AI_RESPONSE_CACHE_ENABLED', True)
+
+    @staticmethod
+    def make_key(model, messages, max_tokens, temperature):
+        system_prompt = ''.join(m['content'] for m in messages if m['role'] == 'system')
+        user_prompt = ''.join(m['content'] for m in messages if m['role'] != 'system')
+        payload = json.dumps({
+            'model': model,
+            'system': system_prompt,
+            'user': user_prompt,
+            'max_tokens': max_tokens,
+            'temperature': temperature,
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def path_for(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}.json')
+
+    def get(self, key):
+        """Ответ API из кэша или None (нет записи, запись устарела или повреждена)"""
+        path = self.path_for(key)
+        try:
+            age = time.time() - os.path.getmtime(path)
+        except OSError:
+            return None
+        if self.max_age_seconds and age > self.max_age_seconds:
+            self._remove(path)
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)['response']
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f'Не удалось прочитать ответ AI из кэша {path}: {e}')
+            self._remove(path)
+            return None
+
+    def put(self, key, response):
+        """Сохранить ответ атомарно; каждая prune_every-я запись удаляет старые записи"""
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'key': key, 'response': response}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        with self.prune_lock:
+            due = self._writes % self.prune_every == 0
+            self._writes += 1
+        if due:
+            self.prune()
+
+    def prune(self):
+        """Удалить устаревшие записи и самые старые сверх max_entries"""
+        with self.prune_lock:
+            entries = []
+            for path in self._iter_entries():
+                try:
+                    entries.append((os.path.getmtime(path), path))
+                except OSError:
+                    continue
+            now = time.time()
+            if self.max_age_seconds:
+                expired = [path for mtime, path in entries if now - mtime > self.max_age_seconds]
+                for path in expired:
+                    self._remove(path)
+                entries = [(mtime, path) for mtime, path in entries if now - mtime <= self.max_age_seconds]
+            if self.max_entries and len(entries) > self.max_entries:
+                entries.sort()
+                for _, path in entries[:len(entries) - self.max_entries]:
+                    self._remove(path)
+
+    def clear(self):
+        for path in list(self._iter_entries()):
+            self._remove(path)
+
+    def _iter_entries(self):
+        if not os.path.isdir(self.directory):
+            return
+        for bucket in os.scandir(self.directory):
+            if not bucket.is_dir():
+                continue
+            for entry in os.scandir(bucket.path):
+                if entry.name.endswith('.json'):
+                    yield entry.path
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
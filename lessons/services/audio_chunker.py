@@ -0,0 +1,157 @@
+"""
+Нарезка аудио на фрагменты по паузам и склейка результатов транскрипции
+
+Длинная запись делится на фрагменты длиной около max_chunk_seconds; разрез
+ставится в самом тихом месте ближе к концу окна. Если пауз нет, фрагменты
+режутся жёстко с перекрытием, а повторы на стыке удаляются при склейке.
+"""
+import re
+import numpy as np
+
+SAMPLE_RATE = 16000
+# Доля медианной энергии, ниже которой участок считается паузой
+SILENCE_RATIO = 0.3
+
+
+def pcm_to_float32(pcm):
+    """Преобразовать 16-битный PCM (bytes или bytearray) в массив float32 [-1, 1]"""
+    return np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def frame_energies(samples, frame_size):
+    """RMS-энергия по кадрам фиксированной длины"""
+    frames_count = len(samples) // frame_size
+    if frames_count == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = samples[:frames_count * frame_size].reshape(frames_count, frame_size)
+    return np.sqrt(np.mean(frames ** 2, axis=1))
+
+
+class StreamChunker:
+    """
+    Потоковая нарезка аудио на фрагменты по паузам
+
+    Аудио подаётся блоками по мере извлечения (feed), готовые фрагменты
+    возвращаются сразу, как только накоплено достаточно данных для разреза.
+    """
+
+    def __init__(self, sample_rate=SAMPLE_RATE, max_chunk_seconds=300, search_seconds=60,
+                 min_silence_seconds=0.5, overlap_seconds=1.0, frame_seconds=0.03):
+        self.frame_size = max(1, int(frame_seconds * sample_rate))
+        self.window = max(1, int(min_silence_seconds / frame_seconds))
+        self.max_chunk = int(max_chunk_seconds * sample_rate)
+        self.search = min(int(search_seconds * sample_rate), self.max_chunk // 2)
+        self.overlap = int(overlap_seconds * sample_rate)
+        # Запас после конца окна поиска, чтобы сглаживание не упиралось в край буфера
+        self.padding = self.window * self.frame_size
+        self.pending = []
+        self.pending_length = 0
+        self.offset = 0
+
+    def feed(self, samples):
+        """
+        Добавить блок аудио
+
+        Returns:
+            list: [(offset_samples, samples), ...] готовые фрагменты
+        """
+        if len(samples):
+            self.pending.append(samples)
+            self.pending_length += len(samples)
+        if self.pending_length <= self.max_chunk + self.padding:
+            return []
+
+        buffer = np.concatenate(self.pending)
+        chunks = []
+        while len(buffer) > self.max_chunk + self.padding:
+            cut, next_start = self._find_cut(buffer)
+            chunks.append((self.offset, buffer[:cut]))
+            buffer = buffer[next_start:]
+            self.offset += next_start
+        self.pending = [buffer]
+        self.pending_length = len(buffer)
+        return chunks
+
+    def finish(self):
+        """Вернуть последний фрагмент"""
+        buffer = np.concatenate(self.pending) if self.pending else np.zeros(0, dtype=np.float32)
+        self.pending = []
+        self.pending_length = 0
+        return [(self.offset, buffer)]
+
+    def _find_cut(self, buffer):
+        """Найти разрез в буфере: (конец фрагмента, начало следующего)"""
+        energies = frame_energies(buffer[:self.max_chunk + self.padding], self.frame_size)
+        smoothed = np.convolve(energies, np.ones(self.window) / self.window, mode='same')
+        silence_level = float(np.median(energies)) * SILENCE_RATIO
+        window_start = (self.max_chunk - self.search) // self.frame_size
+        window_end = min(self.max_chunk // self.frame_size, len(smoothed))
+        if window_end > window_start:
+            quietest = window_start + int(np.argmin(smoothed[window_start:window_end]))
+            if smoothed[quietest] <= silence_level:
+                cut = quietest * self.frame_size + self.frame_size // 2
+                return cut, cut
+        # Пауз нет: режем жёстко, следующий фрагмент начинается с перекрытием
+        return self.max_chunk, self.max_chunk - self.overlap
+
+
+def split_on_silence(samples, sample_rate=SAMPLE_RATE, **kwargs):
+    """
+    Разбить аудио на фрагменты по паузам (параметры как у StreamChunker)
+
+    Returns:
+        list: [(start_sample, end_sample), ...] в порядке следования
+    """
+    chunker = StreamChunker(sample_rate, **kwargs)
+    chunks = chunker.feed(samples) + chunker.finish()
+    return [(offset, offset + len(chunk)) for offset, chunk in chunks]
+
+
+def _words(text):
+    return re.sub(r'[^\w\s\']', '', text.lower()).split()
+
+
+def _drop_repeated_prefix(previous_text, text, max_words=12):
+    """Убрать из начала text слова, которыми заканчивается previous_text"""
+    previous_words = _words(previous_text)
+    words = text.split()
+    normalized = _words(text)
+    if len(normalized) != len(words):
+        return text
+    for size in range(min(max_words, len(previous_words), len(words)), 0, -1):
+        if previous_words[-size:] == normalized[:size]:
+            return ' '.join(words[size:])
+    return text
+
+
+def stitch_segments(chunk_results, tolerance=0.2):
+    """
+    Склеить сегменты фрагментов в общую транскрипцию
+
+    Args:
+        chunk_results: [{'offset': сек, 'segments': [{'start', 'end', 'text'}]}] по порядку
+
+    Returns:
+        tuple: (текст, сегменты с абсолютными таймкодами)
+    """
+    stitched = []
+    for result in chunk_results:
+        offset = result['offset']
+        for segment in result['segments']:
+            text = segment['text'].strip()
+            start = segment['start'] + offset
+            end = segment['end'] + offset
+            if not text:
+                continue
+            if stitched:
+                last = stitched[-1]
+                if end <= last['end'] + tolerance:
+                    # Сегмент целиком в зоне перекрытия — уже распознан предыдущим фрагментом
+                    continue
+                if start < last['end'] - tolerance:
+                    text = _drop_repeated_prefix(last['text'], text)
+                    if not text:
+                        continue
+                    start = last['end']
+            stitched.append({'start': round(start, 3), 'end': round(end, 3), 'text': text})
+    return ' '.join(segment['text'] for segment in stitched), stitched
@@ -0,0 +1,66 @@
+"""
+Пересчёт среднего балла персонажей (UserAvatar) по истории ответов
+
+При ответе счётчики score_points и scored_cards меняются на разницу статусов
+(UserAvatar.apply_card_status). Удаление уроков и карточек каскадом удаляет
+ответы, поэтому после него счётчики затронутых пользователей пересчитываются
+здесь одним агрегирующим запросом.
+"""
+from django.db.models import Count, Sum
+from lessons.models import CardAttempt, LessonAttempt, UserAvatar
+
+
+def learners_of_lessons(lesson_ids=None):
+    """id прогресса пользователей, начинавших уроки (None — любой урок); вызывать до удаления"""
+    attempts = LessonAttempt.objects.all()
+    if lesson_ids is not None:
+        attempts = attempts.filter(lesson_id__in=lesson_ids)
+    return set(attempts.values_list('user_progress_id', flat=True).distinct())
+
+
+def rebuild_avatar_scores(user_progress_ids=None, batch_size=500):
+    """
+    Пересчитать сумму, количество и средний балл персонажей по ответам
+
+    Args:
+        user_progress_ids: Чьих персонажей пересчитать (None — всех)
+        batch_size: Сколько персонажей обновлять одним запросом
+
+    Returns:
+        int: Сколько персонажей обновлено
+    """
+    answers = CardAttempt.objects.exclude(card_status=0)
+    avatars = UserAvatar.objects.only('id', 'user_progress_id').order_by('id')
+    if user_progress_ids is not None:
+        if not user_progress_ids:
+            return 0
+        answers = answers.filter(lesson_attempt__user_progress_id__in=user_progress_ids)
+        avatars = avatars.filter(user_progress_id__in=user_progress_ids)
+
+    # Один агрегирующий запрос на всех пользователей вместо прохода по попыткам каждого
+    totals = {
+        row['lesson_attempt__user_progress_id']: (row['points'], row['cards'])
+        for row in answers.values('lesson_attempt__user_progress_id')
+        .annotate(points=Sum('card_status'), cards=Count('id'))
+        .order_by()
+    }
+
+    updated = 0
+    batch = []
+    for avatar in avatars.iterator(chunk_size=batch_size):
+        points, cards = totals.get(avatar.user_progress_id, (0, 0))
+        avatar.score_points = points
+        avatar.scored_cards = cards
+        avatar.total_score = points / cards if cards else 0.0
+        batch.append(avatar)
+        if len(batch) >= batch_size:
+            updated += _save(batch)
+            batch = []
+    return updated + _save(batch)
+
+
+def _save(batch):
+    if not batch:
+        return 0
+    UserAvatar.objects.bulk_update(batch, ['score_points', 'scored_cards', 'total_score'])
+    return len(batch)
@@ -0,0 +1,156 @@
+"""
+Ответ на карточку урока
+
+Весь ответ записывается в одной транзакции. Попытка урока и прогресс
+пользователя читаются одним запросом под блокировкой строк, поэтому
+повторный клик по кнопке ответа ждёт первый запрос и видит уже записанную
+попытку карточки, а не создаёт вторую. Карточка и предыдущий ответ на неё
+читаются одним запросом с LEFT JOIN. Персонаж читается отдельным запросом
+под блокировкой уже после ожидания: FOR UPDATE OF нельзя применить к
+необязательной стороне LEFT JOIN, а без блокировки ждавший запрос увидел бы
+его старые счётчики. Счётчики меняются UPDATE с F-выражениями, модели
+сохраняются только с изменёнными полями.
+"""
+from django.db import transaction
+from django.db.models import F, FilteredRelation, Q
+from django.utils import timezone
+from lessons.models import CardAttempt, ExerciseCard, LessonAttempt, UserAvatar, UserProgress
+from lessons.services.lesson_progress import record_card_answer
+
+
+def card_result(is_correct, attempts_count, previous_status):
+    """
+    Статус карточки и опыт за ответ
+
+    Статусы: 0 — красный, 3 — жёлтый, 5 — зелёный. Жёлтая карточка,
+    пересданная правильно, становится зелёной.
+
+    Returns:
+        tuple: (статус, опыт); опыт None для неправильного ответа
+    """
+    if not is_correct:
+        return 0, None
+    if attempts_count == 1:
+        # Первая попытка - идеально
+        return 5, 20
+    if previous_status == 3:
+        # Пересдача желтой карточки - меньше опыта, но все равно хорошо
+        return 5, 15
+    # Правильно, но не с первой попытки и не пересдача желтой
+    return 3, 10 if attempts_count == 2 else 5
+
+
+def _locked_attempt(attempt_id):
+    """Попытка урока с прогрессом пользователя; обе строки заблокированы"""
+    return (
+        LessonAttempt.objects.select_for_update(of=('self', 'user_progress'))
+        .select_related('user_progress')
+        .get(id=attempt_id)
+    )
+
+
+def _card_with_answer(card_id, attempt_id):
+    """Карточка и поля предыдущего ответа на неё в этой попытке (None, если ответа не было)"""
+    return (
+        ExerciseCard.objects.filter(id=card_id)
+        .annotate(
+            answer=FilteredRelation('attempts', condition=Q(attempts__lesson_attempt_id=attempt_id)),
+            answer_pk=F('answer__id'),
+            answer_status=F('answer__card_status'),
+            answer_attempts=F('answer__attempts_count'),
+            answer_correct=F('answer__is_correct'),
+            answer_hint=F('answer__hint_shown'),
+            answer_experience=F('answer__experience_gained'),
+        )
+        .only('id', 'topic', 'hint_text', 'translation_text')
+        .order_by('answer__id')
+        .first()
+    )
+
+
+def submit_answer(attempt_id, card_id, user_answer, is_correct):
+    """
+    Записать ответ на карточку
+
+    Raises:
+        LessonAttempt.DoesNotExist, ExerciseCard.DoesNotExist
+
+    Returns:
+        dict: Данные ответа для API
+    """
+    with transaction.atomic():
+        lesson_attempt = _locked_attempt(attempt_id)
+        card = _card_with_answer(card_id, attempt_id)
+        if card is None:
+            raise ExerciseCard.DoesNotExist(f'Карточка {card_id} не найдена')
+        user_progress = lesson_attempt.user_progress
+
+        is_new = card.answer_pk is None
+        previous_status = 0 if is_new else card.answer_status
+        attempts_count = 1 if is_new else card.answer_attempts + 1
+        card_status, experience = card_result(is_correct, attempts_count, previous_status)
+        # Подсказка показывается со второй неправильной попытки и дальше не скрывается
+        hint_shown = (not is_new and card.answer_hint) or (not is_correct and attempts_count >= 2)
+
+        card_attempt = CardAttempt(
+            id=card.answer_pk,
+            lesson_attempt_id=lesson_attempt.id,
+            card_id=card.id,
+            user_answer=user_answer,
+            is_correct=is_correct,
+            attempts_count=attempts_count,
+            hint_shown=hint_shown,
+            experience_gained=experience if is_correct else (card.answer_experience or 0),
+            card_status=card_status,
+        )
+        if is_new:
+            card_attempt.save(force_insert=True)
+        else:
+            card_attempt.save(update_fields=[
+                'user_answer', 'is_correct', 'attempts_count', 'hint_shown', 'experience_gained', 'card_status',
+            ])
+
+        if is_correct:
+            if is_new or not card.answer_correct:
+                LessonAttempt.objects.filter(id=lesson_attempt.id).update(correct_cards=F('correct_cards') + 1)
+            # Уровень считается от прочитанного под блокировкой опыта
+            user_progress.total_experience += experience
+            user_progress.current_level = max(user_progress.current_level, user_progress.calculate_level())
+            UserProgress.objects.filter(id=user_progress.id).update(
+                total_experience=F('total_experience') + experience,
+                current_level=user_progress.current_level,
+                correct_answers_count=F('correct_answers_count') + 1,
+                total_cards_completed=F('total_cards_completed') + 1,
+                updated_at=timezone.now(),
+            )
+        else:
+            UserProgress.objects.filter(id=user_progress.id).update(
+                incorrect_answers_count=F('incorrect_answers_count') + 1,
+                updated_at=timezone.now(),
+            )
+
+        record_card_answer(lesson_attempt, card, card_attempt)
+
+        # Обновляем средний балл персонажа
+        avatar = UserAvatar.objects.select_for_update().filter(user_progress_id=user_progress.id).first()
+        if avatar is None:
+            # Новый персонаж: счётчики заполняются по уже данным ответам
+            avatar, _ = UserAvatar.objects.get_or_create(user_progress=user_progress)
+            avatar.update_score()
+        else:
+            avatar.apply_card_status(previous_status, card_status)
+
+    show_hint = hint_shown and card.hint_text
+    return {
+        'is_correct': is_correct,
+        'attempts_count': attempts_count,
+        'card_status': card_status,
+        'status_color': CardAttempt.status_color(card_status),
+        'experience_gained': experience if is_correct else 0,
+        'show_hint': show_hint,
+        'hint_text': card.hint_text if show_hint else None,
+        'translation_text': card.translation_text if is_correct else None,
+        'total_experience': user_progress.total_experience,
+        'current_level': user_progress.current_level,
+        'avatar_score': avatar.total_score,
+    }
@@ -0,0 +1,96 @@
+"""
+Инкрементальный разбор карточек из потокового ответа AI
+
+Ответ модели приходит кусками ({"cards": [{...}, {...}, ...]}). Парсер
+отслеживает вложенность скобок и строки и отдаёт каждую карточку, как только
+закрывается её объект в массиве "cards". Обрезанный хвост ответа (последняя
+незакрытая карточка) просто не попадает в результат.
+"""
+import json
+import logging
+from lessons.services.json_repair import loads_tolerant
+
+logger = logging.getLogger(__name__)
+
+CARDS_KEY = 'cards'
+
+
+class CardStreamParser:
+    def __init__(self, key=CARDS_KEY):
+        self.key = key
+        self.buffer = []
+        self.position = 0
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+        self.string_start = None
+        self.last_string = None
+        self.after_colon = False
+        self.card_start = None
+        self.cards_depth = None
+        self.cards = []
+
+    def feed(self, text):
+        """
+        Добавить фрагмент ответа
+
+        Returns:
+            list: Карточки, закрывшиеся в этом фрагменте
+        """
+        completed = []
+        for char in text:
+            self.buffer.append(char)
+            self._consume(char, completed)
+            self.position += 1
+        self.cards.extend(completed)
+        return completed
+
+    @property
+    def text(self):
+        return ''.join(self.buffer)
+
+    def _consume(self, char, completed):
+        if self.in_string:
+            if self.escape:
+                self.escape = False
+            elif char == '\\':
+                self.escape = True
+            elif char == '"':
+                self.in_string = False
+                self.last_string = ''.join(self.buffer[self.string_start + 1:self.position])
+            return
+
+        if char == '"':
+            self.in_string = True
+            self.string_start = self.position
+        elif char == ':':
+            self.after_colon = True
+            return
+        elif char in '{[':
+            # Массив "cards" — значение ключа cards; карточки — объекты прямо в нём
+            if char == '[' and self.cards_depth is None and self.after_colon and self.last_string == self.key:
+                self.cards_depth = len(self.stack) + 1
+            elif char == '{' and self.cards_depth is not None and len(self.stack) == self.cards_depth:
+                self.card_start = self.position
+            self.stack.append(char)
+        elif char in '}]':
+            if self.stack:
+                self.stack.pop()
+            if char == '}' and self.card_start is not None and len(self.stack) == self.cards_depth:
+                card = self._parse_card(''.join(self.buffer[self.card_start:self.position + 1]))
+                if card is not None:
+                    completed.append(card)
+                self.card_start = None
+            elif char == ']' and self.cards_depth is not None and len(self.stack) < self.cards_depth:
+                self.cards_depth = None
+        if not char.isspace():
+            self.after_colon = False
+
+    @staticmethod
+    def _parse_card(text):
+        try:
+            card, _ = loads_tolerant(text)
+        except json.JSONDecodeError as e:
+            logger.warning(f'Не удалось разобрать карточку из потока: {e}')
+            return None
+        return card if isinstance(card, dict) else None
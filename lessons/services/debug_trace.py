@@ -0,0 +1,199 @@
+"""
+Отладочная трассировка
+
+События и спаны (start/end с длительностью) пишутся в JSON Lines файл
+DEBUG_TRACE_PATH фоновым потоком пачками: точка трассировки только кладёт
+словарь в очередь. Когда DEBUG_TRACE_ENABLED выключен, trace() и span()
+сразу возвращаются, а дорогие данные для события стоит собирать под
+`if debug_trace.enabled():`. DEBUG_TRACE_SAMPLE_RATE задаёт долю
+записываемых событий (решение принимается один раз на спан).
+"""
+import os
+import json
+import time
+import uuid
+import queue
+import atexit
+import random
+import logging
+import threading
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def enabled():
+    return getattr(settings, 'DEBUG_TRACE_ENABLED', False)
+
+
+def _sampled():
+    rate = getattr(settings, 'DEBUG_TRACE_SAMPLE_RATE', 1.0)
+    return rate >= 1 or random.random() < rate
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def trace(message, location=None, **data):
+    """Записать одиночное событие"""
+    record(message, location, data)
+
+
+def record(message, location=None, data=None, source='server'):
+    """Записать событие с готовым словарём данных (в т.ч. присланное из браузера)"""
+    if not enabled() or not _sampled():
+        return
+    TraceWriter.get_instance().write({
+        'timestamp': _now_ms(),
+        'kind': 'event',
+        'source': source,
+        'location': location,
+        'message': message,
+        'data': data or {},
+    })
+
+
+class Span:
+    """Спан: событие start при входе, end (с длительностью и ошибкой) при выходе"""
+
+    def __init__(self, name, location=None, **data):
+        self.name = name
+        self.location = location
+        self.data = data
+        self.span_id = uuid.uuid4().hex[:16]
+        self.sampled = _sampled()
+        self._started = None
+
+    def _write(self, kind, message, data, **extra):
+        if self.sampled:
+            TraceWriter.get_instance().write({
+                'timestamp': _now_ms(),
+                'kind': kind,
+                'span': self.span_id,
+                'location': self.location,
+                'message': message,
+                'data': data,
+                **extra,
+            })
+
+    def event(self, message, **data):
+        """Событие внутри спана"""
+        self._write('event', message, data)
+
+    def __enter__(self):
+        self._started = time.monotonic()
+        self._write('start', self.name, self.data)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        extra = {'duration_ms': round((time.monotonic() - self._started) * 1000, 3)}
+        if exc is not None:
+            extra['error'] = f'{exc_type.__name__}: {exc}'
+        self._write('end', self.name, {}, **extra)
+        return False
+
+
+class _NullSpan:
+    """Спан при выключенной трассировке: ничего не делает"""
+
+    def event(self, message, **data):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name, location=None, **data):
+    """Контекстный менеджер спана (при выключенной трассировке — общий пустой объект)"""
+    if not enabled():
+        return _NULL_SPAN
+    return Span(name, location=location, **data)
+
+
+class TraceWriter:
+    """Фоновая запись событий в файл пачками"""
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self, path=None, flush_interval=None, batch_size=500):
+        self.path = path or settings.DEBUG_TRACE_PATH
+        self.flush_interval = flush_interval or getattr(settings, 'DEBUG_TRACE_FLUSH_INTERVAL', 1)
+        self.batch_size = batch_size
+        self.queue = queue.SimpleQueue()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    @classmethod
+    def get_instance(cls):
+        """Singleton pattern"""
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+                    atexit.register(cls._instance.stop)
+        return cls._instance
+
+    def write(self, event):
+        self._ensure_started()
+        self.queue.put(event)
+
+    def _ensure_started(self):
+        # После fork потока в дочернем процессе нет — запускаем свой
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self.queue = queue.SimpleQueue()
+                    self._stop_event = threading.Event()
+                    self._thread = threading.Thread(target=self._run, name='debug-trace-writer', daemon=True)
+                    self._thread.start()
+                    self._pid = os.getpid()
+
+    def stop(self):
+        """Дописать накопленные события и остановить поток"""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stop_event.set()
+        self._thread.join(5)
+        self._thread = None
+        self._pid = None
+
+    def flush(self):
+        """Записать всё, что накопилось в очереди"""
+        while True:
+            events = self._drain()
+            if not events:
+                return
+            self._append(events)
+
+    def _drain(self):
+        events = []
+        while len(events) < self.batch_size:
+            try:
+                events.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+    def _append(self, events):
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(''.join(json.dumps(event, ensure_ascii=False, default=str) + '\n' for event in events))
+        except OSError as e:
+            logger.warning(f'Не удалось записать трассировку в {self.path}: {e}')
+
+    def _run(self):
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+        self.flush()
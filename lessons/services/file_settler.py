@@ -0,0 +1,58 @@
+"""
+Ожидание окончания записи файлов
+
+Файл считается дописанным, когда его размер и mtime не менялись дольше
+settle_seconds. Пока файл копируется (SFTP, сетевая папка), каждое событие
+или проверка с новым размером сбрасывает таймер.
+"""
+import os
+import time
+import threading
+
+
+class FileSettler:
+    """Отслеживаемые файлы: {путь: [размер, mtime, время последнего изменения]}"""
+
+    def __init__(self, settle_seconds):
+        self.settle_seconds = settle_seconds
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._files)
+
+    def track(self, path, now=None):
+        """Начать (или продолжить) отслеживание файла; изменение сбрасывает таймер"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._files[path] = [None, None, now]
+
+    def forget(self, path):
+        with self._lock:
+            self._files.pop(path, None)
+
+    def pop_settled(self, now=None):
+        """
+        Проверить отслеживаемые файлы и забрать дописанные
+
+        Returns:
+            list: (путь, размер, ctime) файлов, не менявшихся settle_seconds
+        """
+        now = time.monotonic() if now is None else now
+        settled = []
+        with self._lock:
+            for path, state in list(self._files.items()):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    # Файл удалён или переименован до окончания записи
+                    del self._files[path]
+                    continue
+                if (stat.st_size, stat.st_mtime_ns) != (state[0], state[1]):
+                    state[:] = [stat.st_size, stat.st_mtime_ns, now]
+                    continue
+                if stat.st_size and now - state[2] >= self.settle_seconds:
+                    settled.append((path, stat.st_size, stat.st_ctime))
+                    del self._files[path]
+        return settled
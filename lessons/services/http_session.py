@@ -0,0 +1,153 @@
+"""
+Общая HTTP-сессия для запросов к AI API
+
+Одна сессия requests с пулом keep-alive соединений на процесс: TCP+TLS
+рукопожатие выполняется один раз, а не на каждый запрос. Временные ошибки
+(429, 5xx, обрывы соединения) повторяются с экспоненциальной задержкой
+и случайным разбросом, заголовок Retry-After учитывается. Общее время
+вызова ограничено бюджетом deadline.
+"""
+import os
+import time
+import random
+import logging
+import json as json_module
+import threading
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Статусы, при которых запрос имеет смысл повторить
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_EXCEPTIONS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+# Сессии по PID: после fork дочерний процесс не должен использовать сокеты родителя
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session():
+    """Сессия с пулом соединений для текущего процесса"""
+    pid = os.getpid()
+    session = _sessions.get(pid)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(pid)
+            if session is None:
+                pool_size = getattr(settings, 'AI_HTTP_POOL_SIZE', 10)
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _sessions.clear()
+                _sessions[pid] = session
+    return session
+
+
+def parse_retry_after(value):
+    """Задержка из заголовка Retry-After (секунды или HTTP-дата). None, если не разобрать"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def backoff_delay(attempt, base=None, maximum=None):
+    """Экспоненциальная задержка с полным случайным разбросом (full jitter)"""
+    if base is None:
+        base = getattr(settings, 'AI_HTTP_BACKOFF_BASE', 1.0)
+    if maximum is None:
+        maximum = getattr(settings, 'AI_HTTP_BACKOFF_MAX', 30.0)
+    return random.uniform(0, min(maximum, base * (2 ** attempt)))
+
+
+def post_with_retry(url, headers=None, json=None, timeout=120, deadline=None, max_retries=None, stream=False):
+    """
+    POST через общую сессию с повтором временных ошибок
+
+    Args:
+        timeout: Таймаут одной попытки (секунды)
+        deadline: Бюджет на весь вызов вместе с повторами (секунды, None — timeout)
+        max_retries: Число повторов (None — AI_HTTP_MAX_RETRIES)
+        stream: Не читать тело ответа сразу (для SSE); повторяются только ошибки до начала тела
+
+    Returns:
+        requests.Response: Успешный ответ
+
+    Raises:
+        requests.exceptions.RequestException: Если попытки или бюджет исчерпаны
+    """
+    if max_retries is None:
+        max_retries = getattr(settings, 'AI_HTTP_MAX_RETRIES', 3)
+    budget = deadline if deadline is not None else timeout
+    started = time.monotonic()
+    session = get_session()
+    attempt = 0
+
+    while True:
+        remaining = budget - (time.monotonic() - started)
+        if remaining <= 0:
+            raise requests.exceptions.Timeout(f'Исчерпан бюджет времени запроса ({budget} сек)')
+        retry_after = None
+        try:
+            response = session.post(url, headers=headers, json=json, timeout=min(timeout, remaining), stream=stream)
+        except RETRY_EXCEPTIONS as e:
+            error = e
+            reason = type(e).__name__
+        else:
+            if response.status_code not in RETRY_STATUSES:
+                response.raise_for_status()
+                return response
+            error = None
+            reason = f'HTTP {response.status_code}'
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+
+        delay = retry_after if retry_after is not None else backoff_delay(attempt)
+        remaining = budget - (time.monotonic() - started)
+        if attempt >= max_retries or delay >= remaining:
+            logger.error(f'❌ Запрос к {url} не удался после {attempt + 1} попыток: {reason}')
+            if error is not None:
+                raise error
+            response.raise_for_status()
+
+        if stream and error is None:
+            response.close()
+        attempt += 1
+        logger.warning(f'⚠️ Временная ошибка запроса ({reason}), повтор {attempt}/{max_retries} через {delay:.1f} сек')
+        time.sleep(delay)
+
+
+def iter_sse_data(response):
+    """
+    Данные событий server-sent events из потокового ответа
+
+    Yields:
+        dict: Разобранное поле data каждого события (до data: [DONE])
+    """
+    if response.encoding is None:
+        response.encoding = 'utf-8'
+    for line in response.iter_lines(decode_unicode=True):
+        # Пустые строки разделяют события, строки с ':' — комментарии keep-alive
+        if not line or line.startswith(':') or not line.startswith('data:'):
+            continue
+        data = line[5:].strip()
+        if data == '[DONE]':
+            return
+        try:
+            yield json_module.loads(data)
+        except ValueError:
+            logger.warning(f'Не удалось разобрать событие SSE: {data[:200]}')
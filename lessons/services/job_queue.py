@@ -0,0 +1,289 @@
+"""
+Очередь задач обработки видео в БД
+
+Views только ставят видео в очередь, а обработку выполняют воркеры
+(manage.py run_video_workers), которые забирают задачи с блокировкой строк.
+"""
+import os
+import socket
+import threading
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.utils import timezone
+from lessons.models import VideoFile, VideoProcessingJob
+from lessons.services.video_lease import expire_stale_leases, renew_lease
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+
+def make_worker_id(index=0):
+    """Идентификатор воркера: host:pid:index"""
+    return f'{socket.gethostname()}:{os.getpid()}:{index}'
+
+
+def enqueue_video(video_file, force_recreate=False):
+    """
+    Поставить видео в очередь на обработку
+
+    Если для видео уже есть активная задача (в очереди или выполняется),
+    новая не создаётся. Пересоздание для задачи в очереди включается в неё,
+    а для выполняющейся задачи запоминается (recreate_requested): после её
+    завершения finish_job ставит отдельную задачу с пересозданием.
+
+    Returns:
+        tuple: (VideoProcessingJob, created)
+    """
+    active_job = VideoProcessingJob.objects.filter(
+        video=video_file,
+        status__in=ACTIVE_STATUSES
+    ).first()
+    if active_job:
+        if force_recreate and not active_job.force_recreate:
+            if active_job.status == 'queued':
+                field = 'force_recreate'
+            else:
+                field = 'recreate_requested'
+                logger.info(f'Видео {video_file.id} обрабатывается: пересоздание запущено после задачи {active_job.id}')
+            marked = VideoProcessingJob.objects.filter(id=active_job.id, status=active_job.status).update(
+                **{field: True}
+            )
+            if not marked:
+                # Задачу успели забрать или завершить — повторяем с актуальным состоянием
+                return enqueue_video(video_file, force_recreate)
+            setattr(active_job, field, True)
+        return active_job, False
+
+    try:
+        with transaction.atomic():
+            job = VideoProcessingJob.objects.create(
+                video=video_file,
+                force_recreate=force_recreate
+            )
+    except IntegrityError:
+        # Параллельный запрос успел создать задачу раньше нас
+        active_job = VideoProcessingJob.objects.get(video=video_file, status__in=ACTIVE_STATUSES)
+        return active_job, False
+
+    VideoFile.objects.filter(id=video_file.id).update(
+        status='pending',
+        processing_status='idle',
+        processing_message='В очереди на обработку...',
+        error_message=None,
+    )
+    logger.info(f'Видео {video_file.id} ({video_file.file_name}) поставлено в очередь, задача {job.id}')
+    return job, True
+
+
+def claim_next_job(worker_id):
+    """
+    Забрать следующую задачу из очереди
+
+    На PostgreSQL строка блокируется через SELECT ... FOR UPDATE SKIP LOCKED,
+    поэтому параллельные воркеры не ждут друг друга. Условный UPDATE по статусу
+    дополнительно защищает от двойного захвата на SQLite.
+
+    Returns:
+        VideoProcessingJob или None, если очередь пуста
+    """
+    while True:
+        with transaction.atomic():
+            job = (
+                VideoProcessingJob.objects
+                .select_for_update(skip_locked=True)
+                .filter(status='queued')
+                .order_by('created_at')
+                .first()
+            )
+            if job is None:
+                return None
+
+            now = timezone.now()
+            claimed = VideoProcessingJob.objects.filter(id=job.id, status='queued').update(
+                status='running',
+                claimed_by=worker_id,
+                heartbeat_at=now,
+                started_at=now,
+                finished_at=None,
+                error_message=None,
+                attempts=job.attempts + 1,
+            )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def touch_job(job_id, worker_id):
+    """Обновить heartbeat задачи. Возвращает False, если задача больше не принадлежит воркеру"""
+    return VideoProcessingJob.objects.filter(
+        id=job_id,
+        claimed_by=worker_id,
+        status='running'
+    ).update(heartbeat_at=timezone.now()) > 0
+
+
+def finish_job(job, worker_id, error_message=None):
+    """Завершить задачу успешно или с ошибкой; запрошенное во время выполнения пересоздание ставится в очередь"""
+    with transaction.atomic():
+        finished = VideoProcessingJob.objects.filter(
+            id=job.id,
+            claimed_by=worker_id,
+            status='running'
+        ).update(
+            status='error' if error_message else 'done',
+            error_message=error_message,
+            finished_at=timezone.now(),
+        ) > 0
+        if finished and VideoProcessingJob.objects.filter(id=job.id, recreate_requested=True).exists():
+            enqueue_video(job.video, force_recreate=True)
+    return finished
+
+
+def requeue_stale_jobs(stale_timeout=None, max_attempts=None):
+    """
+    Вернуть в очередь задачи, воркер которых перестал присылать heartbeat
+
+    Задачи, исчерпавшие max_attempts, помечаются ошибкой.
+
+    Returns:
+        tuple: (возвращено в очередь, помечено ошибкой)
+    """
+    stale_timeout = stale_timeout or getattr(settings, 'VIDEO_JOB_STALE_TIMEOUT', 300)
+    max_attempts = max_attempts or getattr(settings, 'VIDEO_JOB_MAX_ATTEMPTS', 3)
+    cutoff = timezone.now() - timedelta(seconds=stale_timeout)
+
+    with transaction.atomic():
+        stale_jobs = VideoProcessingJob.objects.filter(status='running', heartbeat_at__lt=cutoff)
+        retry_jobs = stale_jobs.filter(attempts__lt=max_attempts)
+        failed_jobs = stale_jobs.filter(attempts__gte=max_attempts)
+        retry_video_ids = list(retry_jobs.values_list('video_id', flat=True))
+        failed_video_ids = list(failed_jobs.values_list('video_id', flat=True))
+        if not retry_video_ids and not failed_video_ids:
+            return 0, 0
+
+        error_message = f'Воркер не отвечал более {stale_timeout} сек, попытки исчерпаны'
+        # Пересоздание, запрошенное во время выполнения, выполнится в повторной попытке
+        retry_jobs.filter(recreate_requested=True).update(force_recreate=True, recreate_requested=False)
+        requeued = retry_jobs.update(status='queued', claimed_by=None, heartbeat_at=None)
+        failed = failed_jobs.update(status='error', error_message=error_message, finished_at=timezone.now())
+
+        VideoFile.objects.filter(id__in=retry_video_ids).update(
+            status='pending',
+            processing_status='idle',
+            processing_message='Воркер не отвечает, видео возвращено в очередь',
+            lease_owner=None,
+            lease_expires_at=None,
+        )
+        VideoFile.objects.filter(id__in=failed_video_ids).update(
+            status='error',
+            processing_status='error',
+            processing_message=f'Ошибка: {error_message}',
+            error_message=error_message,
+            lease_owner=None,
+            lease_expires_at=None,
+        )
+
+    if requeued or failed:
+        logger.warning(f'⚠️ Зависшие задачи: возвращено в очередь {requeued}, помечено ошибкой {failed}')
+    return requeued, failed
+
+
+class JobHeartbeat(threading.Thread):
+    """Фоновый поток, периодически обновляющий heartbeat выполняемой задачи"""
+
+    def __init__(self, job_id, worker_id, interval=None, video_id=None):
+        super().__init__(name=f'heartbeat-{job_id}', daemon=True)
+        self.job_id = job_id
+        self.worker_id = worker_id
+        # Вместе с задачей продлевается аренда видео
+        self.video_id = video_id
+        self.interval = interval or getattr(settings, 'VIDEO_JOB_HEARTBEAT_INTERVAL', 30)
+        self._stop_event = threading.Event()
+
+    def run(self):
+        try:
+            while not self._stop_event.wait(self.interval):
+                try:
+                    if not touch_job(self.job_id, self.worker_id):
+                        logger.warning(f'Задача {self.job_id} больше не принадлежит воркеру {self.worker_id}')
+                        return
+                    if self.video_id is not None:
+                        renew_lease(self.video_id, self.worker_id)
+                except Exception as e:
+                    logger.error(f'Ошибка обновления heartbeat задачи {self.job_id}: {e}')
+        finally:
+            # У потока своё подключение к БД — закрываем его
+            connection.close()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class VideoJobWorker:
+    """Воркер, забирающий задачи из очереди и обрабатывающий видео"""
+
+    def __init__(self, worker_id=None, poll_interval=None):
+        self.worker_id = worker_id or make_worker_id()
+        self.poll_interval = poll_interval or getattr(settings, 'VIDEO_WORKER_POLL_INTERVAL', 5)
+        self.processor = None
+        self._stop_event = threading.Event()
+
+    def _get_processor(self):
+        # Модель Whisper загружается один раз на процесс воркера
+        if self.processor is None:
+            from lessons.services.video_processor import VideoProcessor
+            self.processor = VideoProcessor()
+        return self.processor
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self, once=False):
+        """
+        Основной цикл воркера
+
+        Args:
+            once: Завершиться, как только очередь опустеет
+
+        Returns:
+            int: Количество обработанных задач
+        """
+        logger.info(f'Воркер {self.worker_id} запущен')
+        processed = 0
+        while not self._stop_event.is_set():
+            close_old_connections()
+            requeue_stale_jobs()
+            expire_stale_leases()
+            job = claim_next_job(self.worker_id)
+            if job is None:
+                if once:
+                    break
+                self._stop_event.wait(self.poll_interval)
+                continue
+            self.run_job(job)
+            processed += 1
+        logger.info(f'Воркер {self.worker_id} остановлен, обработано задач: {processed}')
+        return processed
+
+    def run_job(self, job):
+        """Обработать одну задачу"""
+        logger.info(f'Воркер {self.worker_id} взял задачу {job.id} (видео {job.video_id}, попытка {job.attempts})')
+        heartbeat = JobHeartbeat(job.id, self.worker_id, video_id=job.video_id)
+        heartbeat.start()
+        try:
+            lesson = self._get_processor().process_video(
+                job.video, force_recreate=job.force_recreate, owner=self.worker_id
+            )
+            if lesson is None:
+                raise ValueError('Урок не создан')
+            finish_job(job, self.worker_id)
+            logger.info(f'✅ Задача {job.id} выполнена, урок {lesson.id}')
+        except Exception as e:
+            logger.error(f'❌ Задача {job.id} завершилась ошибкой: {str(e)}', exc_info=True)
+            finish_job(job, self.worker_id, error_message=str(e))
+        finally:
+            heartbeat.stop()
@@ -0,0 +1,367 @@
+"""
+Толерантный разбор JSON из ответов AI за один проход
+
+Вместо последовательных regex-исправлений (json_parser) ответ проходит через
+один токенизатор, который по пути исправляет типичные ошибки модели:
+markdown-обёртку, комментарии, висячие и пропущенные запятые, переводы строк
+внутри строк, незакрытые строки и обрезанный конец ответа. Корректные
+вложенные объекты и массивы (обычно почти все карточки) разбирает C-декодер
+json, поэтому посимвольно проходятся только места с ошибками. Список
+применённых исправлений возвращается вместе с результатом.
+"""
+import re
+import json
+import logging
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+RepairResult = namedtuple('RepairResult', ['text', 'repairs'])
+
+STRING_RUN = re.compile(r'[^"\\\x00-\x1f]+')
+WHITESPACE = re.compile(r'[ \t\r\n]+')
+# Быстрый путь: корректные токены разбираются одним совпадением регулярного выражения
+TOKEN = re.compile(
+    r'[ \t\r\n]*(?:'
+    r'(?P<string>"(?:[^"\\\x00-\x1f]|\\["\\/bfnrt]|\\u[0-9a-fA-F]{4})*")'
+    r'|(?P<punct>[{}\[\]:,])'
+    r'|(?P<literal>-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?|true|false|null)(?=[\s,\]}])'
+    r')'
+)
+NUMBER = re.compile(r'-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?')
+WORD = re.compile(r'[A-Za-z_]+')
+# После перевода строки внутри строки начинается следующий ключ или закрывающая скобка —
+# значит, модель забыла закрыть строку
+STRING_BREAK = re.compile(r'\s*(?:"[^"\n]*"\s*:|[}\]])')
+WORDS = {
+    'true': 'true', 'false': 'false', 'null': 'null',
+    'True': 'true', 'False': 'false', 'None': 'null',
+}
+ESCAPES = set('"\\/bfnrtu')
+
+
+def _reject_constant(name):
+    raise ValueError(f'Недопустимое значение {name}')
+
+
+# Целые корректные контейнеры разбирает C-декодер json: посимвольный разбор
+# нужен только для фрагментов с ошибками и для обрезанного конца
+_DECODER = json.JSONDecoder(parse_constant=_reject_constant)
+CLOSERS = {'{': '}', '[': ']'}
+
+# Что ожидается следующим токеном
+VALUE, KEY, COLON, AFTER_VALUE = 'value', 'key', 'colon', 'after_value'
+
+
+class _Repairer:
+    def __init__(self, content):
+        self.s = content
+        self.n = len(content)
+        self.out = []
+        self.stack = []
+        self.expect = VALUE
+        self.pending_comma = False
+        self.repairs = []
+        # Точки отката при обрыве для каждого открытого контейнера (число фрагментов out):
+        # после последнего целого элемента массива или последней целой пары объекта
+        self.points = []
+
+    def note(self, repair):
+        if repair not in self.repairs:
+            self.repairs.append(repair)
+
+    def run(self):
+        s = self.s
+        i = self._skip_preamble()
+        token_match = TOKEN.match
+        while i < self.n:
+            match = token_match(s, i)
+            if match and match.lastgroup:
+                i = self._fast_token(match)
+            else:
+                i = self._slow_token(WHITESPACE.match(s, i).end() if s[i] in ' \t\r\n' else i)
+            if not self.stack and self.expect == AFTER_VALUE:
+                # Корневое значение закончилось: остальное — хвост обёртки
+                if s[i:].strip():
+                    self.note('fence' if '```' in s[i:] else 'trailing_text')
+                break
+        if self.stack or self.expect != AFTER_VALUE:
+            self._finish_truncated()
+        return RepairResult(''.join(self.out), self.repairs)
+
+    def _fast_token(self, match):
+        kind = match.lastgroup
+        text = match.group(kind)
+        if kind == 'punct':
+            return self._punct(match.start(kind), text)
+        if self.expect == COLON or (kind == 'literal' and self.expect == KEY):
+            # Нестандартная ситуация — разбираем посимвольно
+            return self._string(match.start(kind)) if kind == 'string' else self._scalar(match.start(kind))
+        self._begin_value()
+        self.out.append(text)
+        if self.expect == KEY:
+            self.expect = COLON
+        else:
+            self._value_done()
+        return match.end()
+
+    def _slow_token(self, i):
+        """Токен, не прошедший быстрый путь: исправляется посимвольно"""
+        if i >= self.n:
+            return i
+        s = self.s
+        c = s[i]
+        if c == '/' and s.startswith(('//', '/*'), i):
+            return self._skip_comment(i)
+        if c == '"':
+            return self._string(i)
+        if c in '{}[]:,':
+            return self._punct(i, c)
+        return self._scalar(i)
+
+    def _punct(self, i, c):
+        if c in '{[':
+            return self._open(i, c)
+        if c in '}]':
+            return self._close(i, c)
+        if c == ':':
+            if self.expect == COLON:
+                self.out.append(':')
+                self.expect = VALUE
+            else:
+                self.note('stray_colon')
+        elif self.expect == AFTER_VALUE:
+            self.pending_comma = True
+            self.expect = KEY if self._in_object() else VALUE
+        else:
+            self.note('extra_comma')
+        return i + 1
+
+    def _skip_preamble(self):
+        starts = [pos for pos in (self.s.find('{'), self.s.find('[')) if pos != -1]
+        start = min(starts) if starts else self.n
+        if self.s[:start].strip():
+            self.note('fence' if '```' in self.s[:start] else 'leading_text')
+        return start
+
+    def _skip_comment(self, i):
+        self.note('comment')
+        if self.s.startswith('//', i):
+            end = self.s.find('\n', i)
+            return self.n if end == -1 else end
+        end = self.s.find('*/', i + 2)
+        return self.n if end == -1 else end + 2
+
+    def _in_object(self):
+        return bool(self.stack) and self.stack[-1] == '{'
+
+    def _begin_value(self):
+        """Начало ключа или значения: вставить отложенную или пропущенную запятую"""
+        if self.expect == AFTER_VALUE:
+            self.note('missing_comma')
+            self.pending_comma = True
+            self.expect = KEY if self._in_object() else VALUE
+        if self.pending_comma:
+            self.out.append(',')
+            self.pending_comma = False
+
+    def _value_done(self):
+        self.expect = AFTER_VALUE
+        if self.points:
+            self.points[-1] = len(self.out)
+
+    def _open(self, i, c):
+        if self.expect in (KEY, COLON):
+            self.note('unexpected_token')
+            return i + 1
+        self._begin_value()
+        end = self._whole_value(i)
+        if end is not None:
+            self.out.append(self.s[i:end])
+            self._value_done()
+            return end
+        self.out.append(c)
+        self.stack.append(c)
+        self.points.append(len(self.out))
+        self.expect = VALUE if c == '[' else KEY
+        return i + 1
+
+    def _whole_value(self, i):
+        """Конец контейнера, начинающегося в i, если он целиком корректен, иначе None"""
+        try:
+            return _DECODER.raw_decode(self.s, i)[1]
+        except ValueError:
+            return None
+
+    def _close(self, i, c):
+        if not self.stack:
+            self.note('unexpected_token')
+            return i + 1
+        if self.pending_comma:
+            self.note('trailing_comma')
+            self.pending_comma = False
+        if self._in_object() and self.expect in (COLON, VALUE):
+            # Ключ без значения
+            self.note('missing_value')
+            if self.expect == COLON:
+                self.out.append(':')
+            self.out.append('null')
+        opener = self.stack.pop()
+        self.points.pop()
+        if CLOSERS[opener] != c:
+            self.note('mismatched_bracket')
+        self.out.append(CLOSERS[opener])
+        self._value_done()
+        return i + 1
+
+    def _string(self, i):
+        s = self.s
+        if self.expect == COLON:
+            self.note('missing_colon')
+            self.out.append(':')
+            self.expect = VALUE
+        self._begin_value()
+        is_key = self.expect == KEY
+        parts = ['"']
+        i += 1
+        while True:
+            match = STRING_RUN.match(s, i)
+            if match:
+                parts.append(match.group())
+                i = match.end()
+            if i >= self.n:
+                # Обрыв внутри строки: строка будет отброшена при откате
+                self.out.append(''.join(parts))
+                return i
+            c = s[i]
+            if c == '"':
+                parts.append('"')
+                i += 1
+                break
+            if c == '\\':
+                nxt = s[i + 1:i + 2]
+                if not nxt:
+                    i += 1
+                    continue
+                if nxt in ESCAPES:
+                    if nxt == 'u' and not re.match(r'[0-9a-fA-F]{4}', s[i + 2:i + 6]):
+                        self.note('invalid_escape')
+                        parts.append('\\\\')
+                        i += 1
+                        continue
+                    parts.append('\\' + nxt)
+                else:
+                    # \' и прочие недопустимые экранирования
+                    self.note('invalid_escape')
+                    parts.append(nxt if nxt != '\n' else '\\n')
+                i += 2
+                continue
+            # Управляющий символ внутри строки
+            if c == '\n' and STRING_BREAK.match(s, i + 1):
+                self.note('unterminated_string')
+                parts.append('"')
+                break
+            self.note('control_character')
+            parts.append(json.dumps(c)[1:-1])
+            i += 1
+        self.out.append(''.join(parts))
+        if is_key:
+            self.expect = COLON
+        else:
+            self._value_done()
+        return i
+
+    def _scalar(self, i):
+        s = self.s
+        match = NUMBER.match(s, i)
+        if match:
+            text = match.group()
+        else:
+            match = WORD.match(s, i)
+            if not match or match.group() not in WORDS:
+                self.note('unexpected_character')
+                return (match.end() if match else i + 1)
+            text = WORDS[match.group()]
+            if text != match.group():
+                self.note('python_literal')
+        if match.end() >= self.n:
+            # Значение упирается в конец ответа — возможно, обрезано (tru, 12.)
+            return self.n
+        if self.expect == COLON:
+            self.note('missing_colon')
+            self.out.append(':')
+            self.expect = VALUE
+        if self.expect == KEY:
+            self.note('unexpected_token')
+            return match.end()
+        self._begin_value()
+        self.out.append(text)
+        self._value_done()
+        return match.end()
+
+    def _finish_truncated(self):
+        """
+        Обрыв ответа: откатиться к последнему целому элементу массива, в котором
+        открыт объект (незавершённая карточка отбрасывается целиком), и закрыть скобки
+        """
+        if not self.stack:
+            return
+        self.note('truncated')
+        depth = self._rollback_depth()
+        out_length = self.points[depth - 1]
+        del self.out[out_length:]
+        del self.stack[depth:]
+        self.pending_comma = False
+        while self.stack:
+            self.out.append(CLOSERS[self.stack.pop()])
+
+    def _rollback_depth(self):
+        """
+        Глубина контейнера, к последнему целому элементу которого откатывается обрыв
+
+        Самый глубокий массив, элементом которого открыт объект: объект (карточка)
+        отбрасывается вместе со всеми вложенными в него массивами, а не остаётся
+        без части полей. Если открытых объектов в массивах нет — самый глубокий
+        массив, если нет и массивов — самый глубокий объект.
+        """
+        stack = self.stack
+        for index in range(len(stack) - 1, 0, -1):
+            if stack[index - 1] == '[' and stack[index] == '{':
+                return index
+        for index in range(len(stack), 0, -1):
+            if stack[index - 1] == '[':
+                return index
+        return len(stack)
+
+
+def repair_json(content):
+    """
+    Исправить JSON из ответа AI за один проход
+
+    Returns:
+        RepairResult: (text — исправленный JSON, repairs — список применённых исправлений)
+    """
+    return _Repairer(content or '').run()
+
+
+def loads_tolerant(content):
+    """
+    Разобрать JSON из ответа AI
+
+    Сначала пробуется обычный json.loads (без исправлений), затем repair_json.
+
+    Returns:
+        tuple: (данные, список исправлений)
+
+    Raises:
+        json.JSONDecodeError: Если ответ не удалось восстановить
+    """
+    try:
+        return json.loads(content), []
+    except (json.JSONDecodeError, TypeError):
+        pass
+    result = repair_json(content)
+    data = json.loads(result.text)
+    if result.repairs:
+        logger.info(f'JSON ответа исправлен: {", ".join(result.repairs)}')
+    return data, result.repairs
@@ -0,0 +1,145 @@
+"""
+Сводный прогресс пользователя по уроку (UserLessonProgress)
+
+Строка на пару (пользователь, урок): статус каждой карточки по последнему
+ответу на неё, число пройденных карточек всего и по темам, лучший результат
+в звёздах и статус последней попытки. Обновляется при ответе на карточку и
+при завершении попытки, поэтому чтение прогресса не зависит от длины
+истории попыток. Для данных без сводки она один раз пересчитывается по
+истории (rebuild_lesson_progress).
+"""
+import logging
+from django.db import transaction
+from django.db.models import Max
+from lessons.models import CardAttempt, LessonAttempt, UserLessonProgress
+from lessons.services.lesson_summary import DEFAULT_TOPIC
+
+logger = logging.getLogger(__name__)
+
+
+def apply_card_state(progress, card_id, topic, card_status, attempts_count):
+    """
+    Записать статус карточки и пересчитать счётчики за O(1)
+
+    Повторный вызов с тем же статусом счётчики не меняет.
+    """
+    key = str(card_id)
+    topic = topic or DEFAULT_TOPIC
+    previous = progress.card_states.get(key)
+    was_completed = bool(previous) and previous[0] > 0
+    is_completed = card_status > 0
+    progress.card_states[key] = [card_status, attempts_count]
+    if was_completed != is_completed:
+        delta = 1 if is_completed else -1
+        progress.cards_completed += delta
+        progress.topic_completed[topic] = progress.topic_completed.get(topic, 0) + delta
+        if progress.topic_completed[topic] <= 0:
+            del progress.topic_completed[topic]
+
+
+def rebuild_lesson_progress(user_progress_id, lesson_id):
+    """Пересчитать сводку по истории попыток (для данных, записанных до появления сводки)"""
+    attempts = LessonAttempt.objects.filter(user_progress_id=user_progress_id, lesson_id=lesson_id)
+    last_attempt = attempts.order_by('-started_at', '-id').only('id', 'status').first()
+    if last_attempt is None:
+        return None
+    progress = UserLessonProgress(
+        user_progress_id=user_progress_id,
+        lesson_id=lesson_id,
+        best_stars=attempts.aggregate(best=Max('stars'))['best'] or 0,
+        last_attempt_id=last_attempt.id,
+        last_status=last_attempt.status,
+    )
+    # Карточки, перенесённые в другой урок, в сводке старого урока не учитываются
+    card_attempts = CardAttempt.objects.filter(lesson_attempt__in=attempts, card__lesson_id=lesson_id).order_by(
+        'lesson_attempt__started_at', 'lesson_attempt_id', 'id'
+    ).values_list('card_id', 'card__topic', 'card_status', 'attempts_count')
+    for card_id, topic, card_status, attempts_count in card_attempts:
+        apply_card_state(progress, card_id, topic, card_status, attempts_count)
+    with transaction.atomic():
+        UserLessonProgress.objects.filter(user_progress_id=user_progress_id, lesson_id=lesson_id).delete()
+        progress.save()
+    logger.debug(f'Сводный прогресс урока {lesson_id} пересчитан по истории попыток')
+    return progress
+
+
+def rebuild_lessons_progress(lesson_ids):
+    """
+    Пересчитать сводки всех пользователей по урокам
+
+    Нужен после удаления карточек, смены их темы или урока: сводка хранит
+    статусы по id карточек и счётчики по темам, которые при этом устаревают.
+    """
+    pairs = list(
+        UserLessonProgress.objects.filter(lesson_id__in=lesson_ids).values_list('user_progress_id', 'lesson_id')
+    )
+    for user_progress_id, lesson_id in pairs:
+        rebuild_lesson_progress(user_progress_id, lesson_id)
+    return len(pairs)
+
+
+def get_lesson_progress(user_progress_id, lesson_id):
+    """Сводный прогресс по уроку или None, если пользователь урок не начинал"""
+    progress = UserLessonProgress.objects.filter(user_progress_id=user_progress_id, lesson_id=lesson_id).first()
+    if progress is None and LessonAttempt.objects.filter(
+        user_progress_id=user_progress_id, lesson_id=lesson_id
+    ).exists():
+        progress = rebuild_lesson_progress(user_progress_id, lesson_id)
+    return progress
+
+
+def _locked_progress(lesson_attempt):
+    """Строка сводки под блокировкой (вызывается внутри транзакции)"""
+    progress = UserLessonProgress.objects.select_for_update().filter(
+        user_progress_id=lesson_attempt.user_progress_id, lesson_id=lesson_attempt.lesson_id
+    ).first()
+    if progress is None:
+        progress = get_lesson_progress(lesson_attempt.user_progress_id, lesson_attempt.lesson_id)
+    return progress
+
+
+def record_card_answer(lesson_attempt, card, card_attempt):
+    """Учесть ответ на карточку в сводке"""
+    # Внутри транзакции ответа точка сохранения не нужна: ошибка откатывает ответ целиком
+    with transaction.atomic(savepoint=False):
+        progress = _locked_progress(lesson_attempt)
+        apply_card_state(progress, card.id, card.topic, card_attempt.card_status, card_attempt.attempts_count)
+        progress.last_attempt_id = lesson_attempt.id
+        progress.last_status = lesson_attempt.status
+        progress.save(update_fields=[
+            'card_states', 'cards_completed', 'topic_completed', 'last_attempt', 'last_status', 'updated_at',
+        ])
+    return progress
+
+
+def record_attempt_finished(lesson_attempt):
+    """Учесть завершение попытки: статус и лучший результат в звёздах"""
+    with transaction.atomic(savepoint=False):
+        progress = _locked_progress(lesson_attempt)
+        progress.best_stars = max(progress.best_stars, lesson_attempt.stars or 0)
+        progress.last_attempt_id = lesson_attempt.id
+        progress.last_status = lesson_attempt.status
+        progress.save(update_fields=['best_stars', 'last_attempt', 'last_status', 'updated_at'])
+    return progress
+
+
+def progress_by_lesson(user_progress_id):
+    """Сводки пользователя по всем урокам одним запросом: {lesson_id: UserLessonProgress}"""
+    rows = UserLessonProgress.objects.filter(user_progress_id=user_progress_id).only(
+        'lesson_id', 'cards_completed', 'topic_completed', 'best_stars'
+    )
+    return {progress.lesson_id: progress for progress in rows}
+
+
+def card_status_map(progress):
+    """Статусы карточек для страницы урока: {card_id: {'status', 'color', 'attempts_count'}}"""
+    if progress is None:
+        return {}
+    return {
+        int(card_id): {
+            'status': status,
+            'color': CardAttempt.status_color(status),
+            'attempts_count': attempts_count,
+        }
+        for card_id, (status, attempts_count) in progress.card_states.items()
+    }
@@ -0,0 +1,74 @@
+"""
+Сводка по карточкам урока (LessonSummary)
+
+Темы, число карточек по темам и типам пересчитываются при записи карточек:
+при создании урока из ответа ИИ и при правке карточек в админке. Страницы
+списка уроков и тем читают одну строку сводки вместо всех карточек урока.
+"""
+import logging
+from lessons.models import ExerciseCard, Lesson, LessonSummary
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOPIC = 'general'
+
+
+def summarize_cards(cards):
+    """
+    Посчитать сводку по карточкам
+
+    Args:
+        cards: Пары (topic, card_type) в порядке карточек
+
+    Returns:
+        dict: Поля LessonSummary (topics, topic_counts, card_types, cards_total)
+    """
+    topic_counts = {}
+    card_types = {}
+    cards_total = 0
+    for topic, card_type in cards:
+        topic = topic or DEFAULT_TOPIC
+        topic_counts[topic] = topic_counts.get(topic, 0) + 1
+        card_types[card_type] = card_types.get(card_type, 0) + 1
+        cards_total += 1
+    return {
+        'topics': list(topic_counts),
+        'topic_counts': topic_counts,
+        'card_types': card_types,
+        'cards_total': cards_total,
+    }
+
+
+def save_summary(lesson_id, cards):
+    """Сохранить сводку урока по уже известным карточкам (без чтения из БД)"""
+    summary, _ = LessonSummary.objects.update_or_create(lesson_id=lesson_id, defaults=summarize_cards(cards))
+    return summary
+
+
+def refresh_summary(lesson_id):
+    """Пересчитать сводку урока по карточкам в БД"""
+    cards = ExerciseCard.objects.filter(lesson_id=lesson_id).order_by('order_index', 'id').values_list(
+        'topic', 'card_type'
+    )
+    return save_summary(lesson_id, cards)
+
+
+def refresh_summaries(lesson_ids):
+    """Пересчитать сводки нескольких уроков (удалённые уроки пропускаются)"""
+    for lesson_id in Lesson.objects.filter(id__in=set(lesson_ids)).values_list('id', flat=True):
+        refresh_summary(lesson_id)
+
+
+def get_summary(lesson):
+    """
+    Сводка урока (одна строка; для урока без сводки — пересчёт и сохранение)
+
+    Args:
+        lesson: Lesson, лучше с select_related('summary')
+    """
+    try:
+        return lesson.summary
+    except LessonSummary.DoesNotExist:
+        logger.info(f'Сводка урока {lesson.id} отсутствует, пересчитываем')
+        return refresh_summary(lesson.id)
+
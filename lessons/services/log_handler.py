@@ -1,17 +1,28 @@
 """
-Кастомный handler для логирования в интерфейс
+Кастомные handlers логирования
+
+Логгеры приложения пишут асинхронно: QueueHandler только кладёт запись в
+очередь, а форматирование и запись в консоль и LogStorage выполняет фоновый
+поток пачками. Логирование не тормозит обработку видео на вводе-выводе.
 """
+import os
+import queue
+import atexit
 import logging
+import threading
+import logging.handlers
 from lessons.services.log_storage import LogStorage
 
+_STOP = None
+
 
 class InterfaceLogHandler(logging.Handler):
     """Handler для сохранения логов в хранилище для отображения в интерфейсе"""
-    
+
     def __init__(self):
         super().__init__()
         self.log_storage = LogStorage.get_instance()
-    
+
     def emit(self, record):
         """Сохранить лог в хранилище"""
         try:
@@ -27,3 +38,142 @@ class InterfaceLogHandler(logging.Handler):
             # Игнорируем ошибки при логировании, чтобы не создавать бесконечный цикл
             pass
 
+    def emit_batch(self, records):
+        """Сохранить пачку логов одной транзакцией"""
+        try:
+            self.log_storage.add_logs([
+                (record.levelname, self.format(record), record.name, record.created) for record in records
+            ])
+        except Exception:
+            pass
+
+
+class BatchStreamHandler(logging.StreamHandler):
+    """StreamHandler, который пишет пачку записей одним вызовом write и flush"""
+
+    def emit_batch(self, records):
+        try:
+            text = ''.join(self.format(record) + self.terminator for record in records)
+        except Exception:
+            for record in records:
+                self.emit(record)
+            return
+        with self.lock:
+            try:
+                self.stream.write(text)
+                self.flush()
+            except Exception:
+                self.handleError(records[-1])
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler без форматирования в вызывающем потоке
+
+    Очередь внутри процесса, записи не сериализуются, поэтому стандартная
+    подготовка (format + очистка args) не нужна — её делают handlers слушателя.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class AsyncLogListener:
+    """Фоновый поток: забирает записи из очереди пачками и передаёт handlers"""
+
+    def __init__(self, log_queue, handlers, batch_size=200):
+        self.queue = log_queue
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='async-log-listener', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """Дописать очередь и остановить поток"""
+        if self._thread is None:
+            return
+        self.queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while True:
+            records = [self.queue.get()]
+            while len(records) < self.batch_size:
+                try:
+                    records.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = _STOP in records
+            records = [record for record in records if record is not _STOP]
+            if records:
+                self._dispatch(records)
+            if stop:
+                return
+
+    def _dispatch(self, records):
+        for handler in self.handlers:
+            accepted = [record for record in records if record.levelno >= handler.level and handler.filter(record)]
+            if not accepted:
+                continue
+            if hasattr(handler, 'emit_batch'):
+                handler.emit_batch(accepted)
+            else:
+                for record in accepted:
+                    handler.handle(record)
+
+
+_listeners = {}
+_listeners_lock = threading.Lock()
+
+
+def install_async_logging(logger_names):
+    """
+    Заменить handlers логгеров на очередь с фоновым слушателем
+
+    Повторный вызов для того же логгера ничего не меняет.
+    """
+    with _listeners_lock:
+        for name in logger_names:
+            logger = logging.getLogger(name)
+            if any(isinstance(handler, DeferredQueueHandler) for handler in logger.handlers):
+                continue
+            handlers = list(logger.handlers)
+            if not handlers:
+                continue
+            log_queue = queue.SimpleQueue()
+            listener = AsyncLogListener(log_queue, handlers)
+            listener.start()
+            logger.handlers = [DeferredQueueHandler(log_queue)]
+            _listeners[name] = listener
+
+
+def stop_async_logging():
+    """Дописать очереди и вернуть логгерам исходные handlers"""
+    with _listeners_lock:
+        for name, listener in list(_listeners.items()):
+            logger = logging.getLogger(name)
+            listener.stop()
+            logger.handlers = listener.handlers
+        _listeners.clear()
+
+
+def _restart_after_fork():
+    """В дочернем процессе потока слушателя нет — запускаем заново с новой очередью"""
+    global _listeners_lock
+    _listeners_lock = threading.Lock()
+    for name, listener in list(_listeners.items()):
+        log_queue = queue.SimpleQueue()
+        listener.queue = log_queue
+        listener.start()
+        for handler in logging.getLogger(name).handlers:
+            if isinstance(handler, DeferredQueueHandler):
+                handler.queue = log_queue
+
+
+atexit.register(stop_async_logging)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_after_fork)
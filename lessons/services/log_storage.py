@@ -1,20 +1,62 @@
 """
 Хранилище логов для отображения в интерфейсе
+
+Логи пишутся в общий SQLite-файл (режим WAL), поэтому панель преподавателя
+видит логи всех процессов: веб-воркеров gunicorn и воркеров обработки видео.
+Номер записи (seq) монотонно растёт и не сбрасывается при очистке; чтение
+от курсора — выборка по первичному ключу, то есть O(новых записей).
+Хранится не больше LOG_STORAGE_MAX_ENTRIES последних записей.
 """
+import os
+import time
+import sqlite3
+import logging
 import threading
 from datetime import datetime
-from collections import deque
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS logs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    level TEXT NOT NULL,
+    message TEXT NOT NULL,
+    source TEXT NOT NULL
+)
+'''
+_COLUMNS = 'seq, timestamp, level, message, source'
+
 
 class LogStorage:
-    """Потокобезопасное хранилище логов в памяти"""
-    
+    """Потокобезопасное хранилище логов, общее для процессов"""
+
     _instance = None
     _lock = threading.Lock()
-    
-    def __init__(self, max_logs=1000):
-        self.logs = deque(maxlen=max_logs)
+
+    def __init__(self, max_logs=None, path=None):
+        """
+        Args:
+            max_logs: Сколько последних записей хранить (LOG_STORAGE_MAX_ENTRIES)
+            path: Файл SQLite (LOG_STORAGE_PATH); пустой — хранить в памяти процесса
+        """
+        self.max_logs = max_logs or getattr(settings, 'LOG_STORAGE_MAX_ENTRIES', 1000)
+        self.path = path if path is not None else getattr(settings, 'LOG_STORAGE_PATH', '')
+        # Как часто проверять записи других процессов при ожидании (секунды)
+        self.poll_interval = getattr(settings, 'LOG_STORAGE_POLL_INTERVAL', 0.5)
+        self.lock = threading.Lock()
+        # Будит ожидающих при записи из этого же процесса
+        self.condition = threading.Condition(self.lock)
+        self._connection = None
+        self._pid = None
+        self._inserts = 0
+
+    def _reset_locks(self):
+        """После fork блокировка могла остаться захваченной потоком родителя"""
         self.lock = threading.Lock()
-    
+        self.condition = threading.Condition(self.lock)
+
     @classmethod
     def get_instance(cls):
         """Singleton pattern"""
@@ -23,29 +65,167 @@ class LogStorage:
                 if cls._instance is None:
                     cls._instance = cls()
         return cls._instance
-    
+
+    def _connect(self):
+        """Подключение процесса (после fork открывается заново). Вызывается под self.lock"""
+        if self._connection is not None and self._pid == os.getpid():
+            return self._connection
+        connection = None
+        if self.path:
+            try:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                connection = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+                connection.execute('PRAGMA journal_mode=WAL')
+                connection.execute('PRAGMA synchronous=NORMAL')
+                connection.execute(_SCHEMA)
+            except (OSError, sqlite3.Error) as e:
+                # Логгер lessons пишет сюда же — сообщаем только в консоль
+                logging.getLogger('django').warning(
+                    f'Не удалось открыть хранилище логов {self.path}: {e}. Логи хранятся в памяти процесса'
+                )
+                connection = None
+        if connection is None:
+            connection = sqlite3.connect(':memory:', check_same_thread=False, isolation_level=None)
+            connection.execute(_SCHEMA)
+        self._connection = connection
+        self._pid = os.getpid()
+        return connection
+
+    @staticmethod
+    def _rows_to_logs(rows):
+        return [
+            {'seq': seq, 'timestamp': timestamp, 'level': level, 'message': message, 'source': source}
+            for seq, timestamp, level, message, source in rows
+        ]
+
     def add_log(self, level, message, source='system'):
         """Добавить лог"""
         with self.lock:
-            log_entry = {
-                'timestamp': datetime.now().isoformat(),
-                'level': level,
-                'message': message,
-                'source': source
-            }
-            self.logs.append(log_entry)
-    
+            connection = self._connect()
+            connection.execute(
+                'INSERT INTO logs (timestamp, level, message, source) VALUES (?, ?, ?, ?)',
+                (datetime.now().isoformat(), level, message, source),
+            )
+            self._inserts += 1
+            self._prune(connection)
+            self.condition.notify_all()
+
+    def add_logs(self, entries):
+        """
+        Добавить пачку логов одной транзакцией
+
+        Args:
+            entries: [(level, message, source, created), ...], created — время записи (time.time())
+        """
+        if not entries:
+            return
+        rows = [
+            (datetime.fromtimestamp(created).isoformat(), level, message, source)
+            for level, message, source, created in entries
+        ]
+        with self.lock:
+            connection = self._connect()
+            connection.execute('BEGIN')
+            try:
+                connection.executemany(
+                    'INSERT INTO logs (timestamp, level, message, source) VALUES (?, ?, ?, ?)',
+                    rows,
+                )
+                connection.execute('COMMIT')
+            except Exception:
+                connection.execute('ROLLBACK')
+                raise
+            self._inserts += len(entries)
+            self._prune(connection)
+            self.condition.notify_all()
+
+    def _prune(self, connection):
+        """Старые записи удаляются пачкой, а не при каждой вставке"""
+        if self._inserts >= max(1, self.max_logs // 10):
+            self._inserts = 0
+            connection.execute(
+                'DELETE FROM logs WHERE seq <= (SELECT MAX(seq) FROM logs) - ?', (self.max_logs,)
+            )
+
+    @property
+    def last_seq(self):
+        """Номер последней записи (с учётом очищенных)"""
+        with self.lock:
+            return self._last_seq()
+
+    def _last_seq(self):
+        row = self._connect().execute("SELECT seq FROM sqlite_sequence WHERE name = 'logs'").fetchone()
+        return row[0] if row else 0
+
     def get_logs(self, limit=100, since=None):
-        """Получить логи"""
+        """Получить последние логи (since — ISO-время, логи новее него)"""
         with self.lock:
-            logs_list = list(self.logs)
+            connection = self._connect()
             if since:
-                # Фильтруем по времени (если нужно)
-                logs_list = [log for log in logs_list if log['timestamp'] > since]
-            return logs_list[-limit:]
-    
+                rows = connection.execute(
+                    f'SELECT {_COLUMNS} FROM logs WHERE timestamp > ? ORDER BY seq DESC LIMIT ?', (since, limit)
+                ).fetchall()
+            else:
+                rows = connection.execute(
+                    f'SELECT {_COLUMNS} FROM logs ORDER BY seq DESC LIMIT ?', (limit,)
+                ).fetchall()
+        return self._rows_to_logs(reversed(rows))
+
+    def get_logs_since(self, cursor=None, limit=200):
+        """
+        Логи с номером больше cursor
+
+        Args:
+            cursor: Номер последнего полученного лога (None — последние limit логов)
+            limit: Максимум логов за раз (остальные придут со следующим запросом)
+
+        Returns:
+            tuple: (логи, новый cursor)
+        """
+        with self.lock:
+            last_seq = self._last_seq()
+            if cursor is None or cursor > last_seq:
+                # Первый запрос или хранилище пересоздано — отдаём хвост
+                logs_list = self._rows_to_logs(reversed(self._connect().execute(
+                    f'SELECT {_COLUMNS} FROM logs ORDER BY seq DESC LIMIT ?', (limit,)
+                ).fetchall()))
+            else:
+                logs_list = self._rows_to_logs(self._connect().execute(
+                    f'SELECT {_COLUMNS} FROM logs WHERE seq > ? ORDER BY seq LIMIT ?', (cursor, limit)
+                ).fetchall())
+            if logs_list:
+                return logs_list, logs_list[-1]['seq']
+            return logs_list, last_seq if cursor is None else min(cursor, last_seq)
+
+    def wait_for_logs(self, cursor, timeout):
+        """
+        Дождаться лога с номером больше cursor. Возвращает True, если он появился
+
+        Записи этого процесса будят ожидание сразу, записи других процессов
+        замечаются не позже чем через poll_interval.
+        """
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while True:
+                if self._last_seq() > cursor:
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.condition.wait(min(remaining, self.poll_interval))
+
     def clear(self):
         """Очистить логи"""
         with self.lock:
-            self.logs.clear()
+            self._connect().execute('DELETE FROM logs')
+
+
+def _reset_after_fork():
+    if LogStorage._instance is not None:
+        LogStorage._instance._reset_locks()
+
 
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -1,9 +1,9 @@
 import json
 import logging
 import re
-import sys
 import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
 from lessons.services.prompts import (
     get_system_prompt,
@@ -14,7 +14,8 @@ from lessons.services.prompts import (
     get_card_generation_user_prompt
 )
 from lessons.services.ai_client import AIClient
-from lessons.services.json_parser import clean_ai_response, try_fix_json_errors, try_fix_truncated_json
+from lessons.services.http_session import post_with_retry
+from lessons.services.json_repair import loads_tolerant, repair_json
 
 logger = logging.getLogger(__name__)
 
@@ -26,7 +27,7 @@ class OpenRouterService:
         self.api_url = settings.OPENROUTER_API_URL
         self.client = AIClient(self.api_key, self.model, self.api_url)
     
-    def analyze_lesson_two_stage(self, transcript_text, previous_lessons_info=None):
+    def analyze_lesson_two_stage(self, transcript_text, previous_lessons_info=None, on_card=None):
         """
         Двухэтапный анализ урока через OpenRouter AI
         
@@ -36,6 +37,9 @@ class OpenRouterService:
         Args:
             transcript_text: Транскрибированный текст урока
             previous_lessons_info: Информация о предыдущих уроках
+            on_card: Вызывается для каждой карточки (с заполненным topic) по мере
+                получения; при AI_STREAM_CARDS — до завершения ответа модели.
+                Вызов идёт из потоков генерации тем
             
         Returns:
             dict: Структурированные данные урока с карточками
@@ -44,7 +48,6 @@ class OpenRouterService:
         logger.info('=' * 80)
         logger.info('🚀 ДВУХЭТАПНЫЙ ПРОЦЕСС ОБРАБОТКИ УРОКА')
         logger.info('=' * 80)
-        sys.stdout.flush()
         
         # ============================================================
         # ЭТАП 1: АНАЛИЗ ТРАНСКРИПТА И ПЛАНИРОВАНИЕ
@@ -53,17 +56,14 @@ class OpenRouterService:
         logger.info('📋 ЭТАП 1: АНАЛИЗ ТРАНСКРИПТА И ПЛАНИРОВАНИЕ КАРТОЧЕК')
         logger.info('─' * 80)
         logger.info('⏳ Отправка запроса в первую модель для анализа...')
-        sys.stdout.flush()
         
         try:
             analysis_result = self._analyze_transcript(transcript_text, previous_lessons_info)
             logger.info('✅ Анализ завершён успешно!')
             logger.info(f'   Название урока: {analysis_result.get("lessonTitle")}')
             logger.info(f'   Найдено тем: {len(analysis_result.get("topics", []))}')
-            sys.stdout.flush()
         except Exception as e:
             logger.error(f'❌ ОШИБКА на этапе анализа: {str(e)}', exc_info=True)
-            sys.stdout.flush()
             raise
         
         # ============================================================
@@ -73,39 +73,29 @@ class OpenRouterService:
         logger.info('🎴 ЭТАП 2: ФОРМИРОВАНИЕ КАРТОЧЕК ПО ПЛАНУ')
         logger.info('─' * 80)
         
+        topics = analysis_result.get('topics', [])
+        results = self._generate_cards_for_topics(topics, transcript_text, on_card)
+        
         all_cards = []
         topics_data = []
         
-        for topic_info in analysis_result.get('topics', []):
+        # Собираем результаты в порядке тем из анализа
+        for topic_info, topic_cards in zip(topics, results):
+            if topic_cards is None:
+                continue
             topic_id = topic_info.get('topic')
-            topic_name = topic_info.get('topicName', topic_id)
             
-            logger.info(f'⏳ Создание карточек для темы "{topic_name}" ({topic_id})...')
-            sys.stdout.flush()
+            # Добавляем topic к каждой карточке
+            for card in topic_cards:
+                card['topic'] = topic_id
             
-            try:
-                topic_cards = self._generate_cards_for_topic(topic_info, transcript_text)
-                
-                # Добавляем topic к каждой карточке
-                for card in topic_cards:
-                    card['topic'] = topic_id
-                
-                all_cards.extend(topic_cards)
-                
-                topics_data.append({
-                    'topic': topic_id,
-                    'topicName': topic_name,
-                    'cards': topic_cards
-                })
-                
-                logger.info(f'✅ Создано {len(topic_cards)} карточек для темы "{topic_name}"')
-                sys.stdout.flush()
-                
-            except Exception as e:
-                logger.error(f'❌ ОШИБКА создания карточек для темы "{topic_name}": {str(e)}', exc_info=True)
-                sys.stdout.flush()
-                # Продолжаем с другими темами
-                continue
+            all_cards.extend(topic_cards)
+            
+            topics_data.append({
+                'topic': topic_id,
+                'topicName': topic_info.get('topicName', topic_id),
+                'cards': topic_cards
+            })
         
         if not all_cards:
             raise ValueError('Не удалось создать ни одной карточки для урока')
@@ -128,7 +118,6 @@ class OpenRouterService:
         logger.info(f'   Тем: {len(topics_data)}')
         logger.info(f'   Всего карточек: {len(all_cards)}')
         logger.info('=' * 80)
-        sys.stdout.flush()
         
         return lesson_data
     
@@ -137,17 +126,58 @@ class OpenRouterService:
         user_prompt = get_analysis_user_prompt(transcript_text, previous_lessons_info)
         analysis_data = self.client.analyze_transcript(system_prompt, user_prompt)
         logger.info(f'Анализ распарсен: {len(analysis_data.get("topics", []))} тем')
-        sys.stdout.flush()
         return analysis_data
     
-    def _generate_cards_for_topic(self, topic_info, transcript_text):
+    def _generate_cards_for_topics(self, topics, transcript_text, on_card=None):
+        """
+        Сформировать карточки для всех тем параллельно
+        
+        Запросы по темам независимы, поэтому выполняются в пуле потоков
+        (не больше OPENROUTER_TOPIC_CONCURRENCY одновременно).
+        
+        Returns:
+            list: Карточки по каждой теме в порядке topics (None — тема с ошибкой)
+        """
+        if not topics:
+            return []
+        concurrency = max(1, min(getattr(settings, 'OPENROUTER_TOPIC_CONCURRENCY', 4), len(topics)))
+        logger.info(f'⏳ Создание карточек для {len(topics)} тем (параллельно до {concurrency} запросов)...')
+        
+        def generate(topic_info):
+            topic_name = topic_info.get('topicName', topic_info.get('topic'))
+            try:
+                topic_cards = self._generate_cards_for_topic(topic_info, transcript_text, on_card)
+            except Exception as e:
+                logger.error(f'❌ ОШИБКА создания карточек для темы "{topic_name}": {str(e)}', exc_info=True)
+                # Продолжаем с другими темами
+                return None
+            logger.info(f'✅ Создано {len(topic_cards)} карточек для темы "{topic_name}"')
+            return topic_cards
+        
+        if concurrency == 1:
+            return [generate(topic_info) for topic_info in topics]
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='topic-cards') as executor:
+            return list(executor.map(generate, topics))
+    
+    def _generate_cards_for_topic(self, topic_info, transcript_text, on_card=None):
         system_prompt = get_card_generation_system_prompt()
         user_prompt = get_card_generation_user_prompt(topic_info, transcript_text)
-        cards = self.client.generate_cards(system_prompt, user_prompt)
+        topic_id = topic_info.get('topic')
+        
+        def handle_card(card):
+            card['topic'] = topic_id
+            if on_card is not None:
+                on_card(card)
+        
+        if getattr(settings, 'AI_STREAM_CARDS', False):
+            cards = self.client.generate_cards_stream(system_prompt, user_prompt, on_card=handle_card)
+        else:
+            cards = self.client.generate_cards(system_prompt, user_prompt)
+            for card in cards:
+                handle_card(card)
         expected_count = sum(topic_info.get('cardPlan', {}).values())
         if len(cards) < expected_count:
             logger.warning(f'Создано {len(cards)} карточек вместо {expected_count} для темы "{topic_info.get("topic")}"')
-            sys.stdout.flush()
         return cards
     
     def analyze_lesson(self, transcript_text, previous_lessons_info=None):
@@ -186,12 +216,10 @@ class OpenRouterService:
         
         try:
             logger.info('Отправка запроса к OpenRouter AI...')
-            sys.stdout.flush()
             
-            # Увеличиваем timeout для больших ответов
+            # Увеличиваем timeout для больших ответов; временные ошибки повторяются в пределах deadline
             try:
-                response = requests.post(self.api_url, headers=headers, json=payload, timeout=180)
-                response.raise_for_status()
+                response = post_with_retry(self.api_url, headers=headers, json=payload, timeout=180, deadline=420)
             except requests.exceptions.Timeout:
                 logger.error('❌ Таймаут запроса к OpenRouter AI (180 сек)')
                 raise Exception('Таймаут запроса к OpenRouter AI. Попробуйте позже.')
@@ -210,49 +238,25 @@ class OpenRouterService:
             if finish_reason == 'length':
                 logger.warning('⚠️ ВНИМАНИЕ: Ответ от ИИ был обрезан из-за превышения max_tokens!')
                 logger.warning('   Запрашиваю продолжение ответа...')
-                sys.stdout.flush()
                 continuation = self.client._request_continuation(original_content, 'lesson')
                 original_content = original_content + continuation
                 logger.info(f'✅ Получено продолжение, общая длина: {len(original_content)} символов')
-                sys.stdout.flush()
             
             logger.info('✅ Получен ответ от OpenRouter AI, длина: %s символов', len(original_content))
             logger.info('   Первые 200 символов: %s', original_content[:200])
             logger.info('   Finish reason: %s', finish_reason)
-            sys.stdout.flush()
             
             # Сохраняем оригинальный ответ для отладки
             content = original_content
             
-            logger.info('⏳ Очистка ответа от markdown и комментариев...')
-            sys.stdout.flush()
-            content = clean_ai_response(content)
-            logger.info('✅ Ответ очищен, длина после очистки: %s символов', len(content))
-            sys.stdout.flush()
-            
-            # Парсим JSON с детальной обработкой ошибок
+            # Парсим JSON за один проход с исправлением типичных ошибок модели
             logger.info('⏳ Парсинг JSON ответа...')
-            sys.stdout.flush()
             
-            try:
-                lesson_data = json.loads(content)
+            lesson_data, repairs = loads_tolerant(content)
+            if repairs:
+                logger.warning(f'⚠️ JSON исправлен и распарсен (исправления: {", ".join(repairs)})')
+            else:
                 logger.info('✅ JSON успешно распарсен')
-                sys.stdout.flush()
-            except json.JSONDecodeError as json_error:
-                # Пытаемся найти и исправить распространённые проблемы
-                logger.warning(f'⚠️ Первая попытка парсинга не удалась: {json_error}. Пытаюсь исправить...')
-                sys.stdout.flush()
-                
-                error_pos = getattr(json_error, 'pos', len(content))
-                fixed_content = try_fix_json_errors(content, error_pos)
-                try:
-                    lesson_data = json.loads(fixed_content)
-                    logger.info('✅ JSON успешно исправлен и распарсен')
-                    sys.stdout.flush()
-                except json.JSONDecodeError:
-                    logger.error('❌ Не удалось исправить JSON')
-                    sys.stdout.flush()
-                    raise json_error
 
             # Если модель вернула только sections, но не cards — разворачиваем все карточки в общий список
             if 'cards' not in lesson_data and 'sections' in lesson_data:
@@ -272,7 +276,6 @@ class OpenRouterService:
                 logger.error('❌ В ответе от ИИ отсутствует lessonTitle')
                 logger.error(f'   Ключи в ответе: {list(lesson_data.keys())}')
                 logger.error(f'   Первые 500 символов ответа: {content[:500]}')
-                sys.stdout.flush()
                 raise ValueError('Неверная структура ответа от ИИ модели: отсутствует lessonTitle')
             
             # Проверяем наличие карточек
@@ -284,7 +287,6 @@ class OpenRouterService:
                 logger.error(f'   lesson_data keys: {list(lesson_data.keys())}')
                 logger.error(f'   lessonTitle: {lesson_data.get("lessonTitle")}')
                 logger.error(f'   Полный lesson_data: {lesson_data}')
-                sys.stdout.flush()
                 raise ValueError('Неверная структура ответа от ИИ модели: нет карточек и нет тем')
             
             # Если есть topics, но нет cards на верхнем уровне - это нормально, мы соберём их из topics
@@ -304,7 +306,6 @@ class OpenRouterService:
                         if not first_card.get('questionText'):
                             logger.error(f'❌ Первая карточка темы "{topic.get("topic")}" не имеет questionText!')
                             logger.error(f'   Данные карточки: {first_card}')
-                sys.stdout.flush()
             else:
                 logger.info(f'✅ Найдено {cards_count} карточек на верхнем уровне')
                 
@@ -314,7 +315,6 @@ class OpenRouterService:
                     if not first_card.get('questionText'):
                         logger.error(f'❌ Первая карточка не имеет questionText!')
                         logger.error(f'   Данные карточки: {first_card}')
-                        sys.stdout.flush()
 
             # Сохраняем сырой ответ
             lesson_data['_raw_content'] = content
@@ -336,14 +336,16 @@ class OpenRouterService:
             error_pos = getattr(e, 'pos', None)
             error_line = getattr(e, 'lineno', None)
             error_col = getattr(e, 'colno', None)
+            # Позиция ошибки относится к исправленному тексту
+            repaired = repair_json(content).text
             
             logger.error(f'Ошибка парсинга JSON от OpenRouter AI: {str(e)}', exc_info=True)
             
             # Показываем контекст вокруг ошибки
             if error_pos is not None:
                 start = max(0, error_pos - 200)
-                end = min(len(content), error_pos + 200)
-                context = content[start:end]
+                end = min(len(repaired), error_pos + 200)
+                context = repaired[start:end]
                 logger.error(f'Контекст ошибки (позиция {error_pos}, строка {error_line}, колонка {error_col}):\n{context}')
             
             # Сохраняем полный ответ в файл для отладки
@@ -356,7 +358,7 @@ class OpenRouterService:
                     f.write('=== ОРИГИНАЛЬНЫЙ ОТВЕТ ===\n')
                     f.write(original_content)
                     f.write('\n\n=== ПОСЛЕ ОЧИСТКИ ===\n')
-                    f.write(content)
+                    f.write(repaired)
                     f.write(f'\n\n=== ОШИБКА ===\n')
                     f.write(str(e))
                     if error_pos is not None:
@@ -369,25 +371,6 @@ class OpenRouterService:
             logger.error(f'Начало ответа (первые 1000 символов):\n{content[:1000]}')
             logger.error(f'Конец ответа (последние 1000 символов):\n{content[-1000:]}')
             
-            # Пытаемся найти и исправить проблему вокруг ошибки
-            if error_pos is not None:
-                start = max(0, error_pos - 100)
-                end = min(len(content), error_pos + 100)
-                error_context = content[start:end]
-                logger.error(f'Контекст вокруг ошибки (позиция {error_pos}):\n{error_context}')
-                
-                logger.info('🔄 Попытка автоматического исправления JSON...')
-                sys.stdout.flush()
-                fixed_content = try_fix_json_errors(content, error_pos)
-                try:
-                    lesson_data = json.loads(fixed_content)
-                    logger.info('✅ JSON успешно исправлен автоматически!')
-                    sys.stdout.flush()
-                    return lesson_data
-                except Exception as fix_error:
-                    logger.error(f'❌ Автоматическое исправление не помогло: {fix_error}')
-                    sys.stdout.flush()
-            
             raise Exception(f'Ошибка парсинга JSON от OpenRouter AI: {str(e)}. Позиция ошибки: строка {error_line}, колонка {error_col}')
         except Exception as e:
             logger.error(f'Неожиданная ошибка при работе с OpenRouter AI: {str(e)}', exc_info=True)
@@ -0,0 +1,79 @@
+"""
+Хранилище транскриптов с адресацией по содержимому
+
+Ключ записи — хэш PCM-аудио (16 кГц, моно), имени модели Whisper и опций
+транскрипции. Запись хранит текст и сегменты с таймкодами, поэтому повторная
+обработка того же аудио (пересоздание уроков) не запускает Whisper.
+"""
+import os
+import json
+import hashlib
+import logging
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class TranscriptStore:
+    """Файловое хранилище транскриптов: <directory>/<key[:2]>/<key>.json"""
+
+    def __init__(self, directory=None):
+        self.directory = directory or settings.TRANSCRIPT_CACHE_DIRECTORY
+
+    @staticmethod
+    def make_key(audio_hash, model_name, options):
+        payload = json.dumps({
+            'audio': audio_hash,
+            'model': model_name,
+            'options': options,
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def path_for(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}.json')
+
+    def load(self, path):
+        """Прочитать запись по пути. Возвращает None, если записи нет или она повреждена"""
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f'Не удалось прочитать транскрипт {path}: {e}')
+            return None
+        record['path'] = path
+        return record
+
+    def get(self, key):
+        return self.load(self.path_for(key))
+
+    def put(self, key, audio_hash, model_name, options, text, segments=None, language=None):
+        """Сохранить запись атомарно (через временный файл). Возвращает запись с путём"""
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        record = {
+            'key': key,
+            'audio_hash': audio_hash,
+            'model': model_name,
+            'options': options,
+            'language': language,
+            'text': text,
+            'segments': [
+                {'start': s['start'], 'end': s['end'], 'text': s['text']}
+                for s in (segments or [])
+            ],
+            'created_at': timezone.now().isoformat(),
+        }
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        record['path'] = path
+        return record
+
+    @staticmethod
+    def matches(record, model_name, options):
+        """Подходит ли запись для текущей модели и опций"""
+        return record.get('model') == model_name and record.get('options') == options
@@ -0,0 +1,219 @@
+"""
+Пул процессов для транскрипции
+
+Каждый процесс пула один раз загружает модель Whisper и затем берёт задачи
+из общей очереди. Число процессов и потоков torch на процесс задаются
+в настройках (WHISPER_POOL_WORKERS, WHISPER_TORCH_THREADS).
+"""
+import os
+import time
+import hashlib
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from lessons.services.audio_chunker import SAMPLE_RATE, StreamChunker, pcm_to_float32, stitch_segments
+from lessons.services.transcript_store import TranscriptStore
+
+logger = logging.getLogger(__name__)
+
+# Потоков torch на процесс, если ни число процессов, ни число потоков не заданы
+DEFAULT_TORCH_THREADS = 4
+
+# Сервис транскрипции внутри процесса пула (модель загружается один раз)
+_worker_service = None
+
+
+def resolve_pool_size(workers=None, torch_threads=None):
+    """
+    Определить число процессов пула и потоков torch на процесс
+
+    Args:
+        workers: Число процессов (0 — пул выключен, -1 — по числу ядер)
+        torch_threads: Потоков torch на процесс (0 — автоматически)
+
+    Returns:
+        tuple: (workers, torch_threads)
+    """
+    if workers is None:
+        workers = getattr(settings, 'WHISPER_POOL_WORKERS', 0)
+    if torch_threads is None:
+        torch_threads = getattr(settings, 'WHISPER_TORCH_THREADS', 0)
+    cpu_count = os.cpu_count() or 1
+
+    if workers == 0:
+        return 0, torch_threads
+    if workers < 0:
+        torch_threads = torch_threads or min(DEFAULT_TORCH_THREADS, cpu_count)
+        workers = max(1, cpu_count // torch_threads)
+    elif not torch_threads:
+        torch_threads = max(1, cpu_count // workers)
+    return workers, torch_threads
+
+
+def _init_worker(model_name, torch_threads):
+    """Инициализация процесса пула: ограничение потоков и загрузка модели"""
+    global _worker_service
+    # Ограничиваем OpenMP/MKL до импорта torch, чтобы процессы не конкурировали за ядра
+    os.environ['OMP_NUM_THREADS'] = str(torch_threads)
+    os.environ['MKL_NUM_THREADS'] = str(torch_threads)
+
+    import django
+    django.setup()
+    import torch
+    torch.set_num_threads(torch_threads)
+
+    from lessons.services.transcription_service import TranscriptionService
+    _worker_service = TranscriptionService(model_name)
+    logger.info(f'Процесс транскрипции {os.getpid()} готов (модель {model_name}, потоков torch: {torch_threads})')
+
+
+def _transcribe_in_worker(video_path):
+    return _worker_service.transcribe_to_record(video_path)
+
+
+def _transcribe_chunk_in_worker(samples, offset):
+    result = _worker_service.transcribe_samples(samples)
+    result['offset'] = offset
+    return result
+
+
+class TranscriptionPool:
+    """Пул процессов с резидентной моделью Whisper в каждом процессе"""
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self, workers=None, torch_threads=None, model_name=None):
+        self.workers, self.torch_threads = resolve_pool_size(workers, torch_threads)
+        self.workers = max(1, self.workers)
+        self.model_name = model_name or settings.WHISPER_MODEL
+        # Длина фрагмента при параллельной транскрипции одного видео (0 — видео целиком)
+        self.chunk_seconds = getattr(settings, 'WHISPER_CHUNK_SECONDS', 0)
+        self.transcript_store = TranscriptStore()
+        self.executor = None
+        self.executor_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls):
+        """Singleton pattern"""
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    @classmethod
+    def is_enabled(cls):
+        """Включён ли пул в настройках"""
+        workers, _ = resolve_pool_size()
+        return workers > 0
+
+    def _get_executor(self):
+        with self.executor_lock:
+            if self.executor is None:
+                logger.info(
+                    f'Запуск пула транскрипции: процессов {self.workers}, '
+                    f'потоков torch на процесс {self.torch_threads}'
+                )
+                # spawn: fork процесса с уже загруженным torch может зависнуть в OpenMP
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(self.model_name, self.torch_threads),
+                )
+            return self.executor
+
+    def submit(self, video_path):
+        """Поставить видео в очередь пула. Возвращает Future с записью транскрипта"""
+        return self._get_executor().submit(_transcribe_in_worker, video_path)
+
+    def transcribe_to_record(self, video_path):
+        """Транскрибировать видео в пуле процессов (интерфейс как у TranscriptionService)"""
+        try:
+            if self.chunk_seconds > 0:
+                return self._transcribe_chunked(video_path)
+            return self.submit(video_path).result()
+        except BrokenProcessPool as e:
+            logger.error(f'Процесс пула транскрипции аварийно завершился: {e}')
+            self.shutdown(wait=False)
+            raise Exception(f'Ошибка транскрипции: процесс пула аварийно завершился ({e})')
+
+    def transcribe(self, video_path):
+        return self.transcribe_to_record(video_path)['text']
+
+    def _transcribe_chunked(self, video_path):
+        """
+        Транскрибировать одно видео параллельно во всех процессах пула
+
+        Аудио читается из FFmpeg потоком и режется по паузам на фрагменты
+        не длиннее chunk_seconds; каждый готовый фрагмент сразу отправляется
+        в пул, не дожидаясь конца извлечения. Сегменты склеиваются с учётом смещения.
+        """
+        from lessons.services.transcription_service import TranscriptionService
+        if not os.path.exists(video_path):
+            raise FileNotFoundError(f'Видеофайл не найден: {video_path}')
+        options = TranscriptionService.TRANSCRIBE_OPTIONS
+        executor = self._get_executor()
+        chunker = StreamChunker(SAMPLE_RATE, max_chunk_seconds=self.chunk_seconds)
+        digest = hashlib.sha256()
+        futures = []
+        total_samples = 0
+        start_time = time.time()
+
+        def submit_chunks(chunks):
+            for offset, samples in chunks:
+                futures.append(executor.submit(_transcribe_chunk_in_worker, samples, offset / SAMPLE_RATE))
+
+        try:
+            for block in TranscriptionService.iter_pcm_blocks(video_path):
+                digest.update(block)
+                samples = pcm_to_float32(block)
+                total_samples += len(samples)
+                submit_chunks(chunker.feed(samples))
+            submit_chunks(chunker.finish())
+
+            # Хэш известен только после чтения всего аудио: при попадании в хранилище
+            # уже отправленные фрагменты отменяются
+            audio_hash = digest.hexdigest()
+            cache_key = self.transcript_store.make_key(audio_hash, self.model_name, options)
+            record = self.transcript_store.get(cache_key)
+            if record:
+                logger.info('Транскрипт найден в хранилище (аудио %s), Whisper не запускается', audio_hash[:12])
+                return record
+
+            logger.info(
+                f'Аудио {total_samples / SAMPLE_RATE / 60:.1f} мин разбито на {len(futures)} фрагментов, '
+                f'процессов транскрипции: {self.workers}'
+            )
+            chunk_results = [future.result() for future in futures]
+        finally:
+            for future in futures:
+                future.cancel()
+
+        text, segments = stitch_segments(chunk_results)
+        logger.info(f'Параллельная транскрипция завершена за {time.time() - start_time:.2f} секунд')
+
+        return self.transcript_store.put(
+            cache_key,
+            audio_hash,
+            self.model_name,
+            options,
+            text=text,
+            segments=segments,
+            language=chunk_results[0].get('language') if chunk_results else None,
+        )
+
+    def transcribe_many(self, video_paths):
+        """Транскрибировать несколько видео параллельно. Возвращает список текстов в порядке путей"""
+        futures = [self.submit(path) for path in video_paths]
+        return [future.result()['text'] for future in futures]
+
+    def shutdown(self, wait=True):
+        with self.executor_lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=wait, cancel_futures=not wait)
+                self.executor = None
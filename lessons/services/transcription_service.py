@@ -1,36 +1,51 @@
 import os
+import wave
+import hashlib
 import logging
+import threading
+from collections import namedtuple
 import whisper
 import ffmpeg
 from django.conf import settings
+from lessons.services import debug_trace
+from lessons.services.audio_chunker import SAMPLE_RATE, pcm_to_float32
+from lessons.services.transcript_store import TranscriptStore
 
 logger = logging.getLogger(__name__)
 
+# Результат prepare_audio: record — найденный в хранилище транскрипт (тогда samples=None)
+PreparedAudio = namedtuple('PreparedAudio', ['samples', 'audio_hash', 'cache_key', 'record'])
+
 
 class TranscriptionService:
+    # Опции Whisper, влияющие на результат (входят в ключ хранилища транскриптов)
+    TRANSCRIBE_OPTIONS = {'language': None, 'task': 'transcribe'}
+    # Загруженные модели Whisper на процесс: {model_name: (model, device)}
+    _models = {}
+    _models_lock = threading.Lock()
+    # Размер блока при чтении PCM из FFmpeg (байт, кратно 2 — 16-битные сэмплы)
+    PCM_BLOCK_SIZE = 1024 * 1024
+
     def __init__(self, model_name=None):
         self.model_name = model_name or settings.WHISPER_MODEL
+        self.transcript_store = TranscriptStore()
         self.model = None
         self.device = None
-        self._load_model()
+        with self._models_lock:
+            cached = self._models.get(self.model_name)
+            if cached:
+                self.model, self.device = cached
+            else:
+                self._load_model()
+                self._models[self.model_name] = (self.model, self.device)
     
     def _load_model(self):
         try:
             import torch
-            # #region agent log
-            import json
-            log_data = {
-                'sessionId': 'debug-session',
-                'runId': 'run1',
-                'hypothesisId': 'GPU_DETECTION',
-                'location': 'transcription_service.py:17',
-                'message': 'Проверка доступности GPU',
-                'data': {'torch_available': True},
-                'timestamp': int(__import__('time').time() * 1000)
-            }
-            with open(r'c:\Users\wangr\PycharmProjects\pythonProject94\.cursor\debug.log', 'a', encoding='utf-8') as f:
-                f.write(json.dumps(log_data, ensure_ascii=False) + '\n')
-            # #endregion
+            torch_threads = getattr(settings, 'WHISPER_TORCH_THREADS', 0)
+            if torch_threads > 0:
+                torch.set_num_threads(torch_threads)
+            debug_trace.trace('Проверка доступности GPU', location='TranscriptionService._load_model', torch_available=True)
             
             # Автоматическое определение GPU/CPU с детальной проверкой
             use_gpu = False
@@ -43,49 +58,23 @@ class TranscriptionService:
                     # Проверяем, достаточно ли памяти на GPU (минимум 2GB)
                     if gpu_memory >= 2.0:
                         use_gpu = True
-                        # #region agent log
-                        log_data = {
-                            'sessionId': 'debug-session',
-                            'runId': 'run1',
-                            'hypothesisId': 'GPU_DETECTION',
-                            'location': 'transcription_service.py:35',
-                            'message': 'GPU доступен и имеет достаточно памяти',
-                            'data': {'gpu_name': gpu_name, 'gpu_memory_gb': round(gpu_memory, 2)},
-                            'timestamp': int(__import__('time').time() * 1000)
-                        }
-                        with open(r'c:\Users\wangr\PycharmProjects\pythonProject94\.cursor\debug.log', 'a', encoding='utf-8') as f:
-                            f.write(json.dumps(log_data, ensure_ascii=False) + '\n')
-                        # #endregion
+                        debug_trace.trace(
+                            'GPU доступен и имеет достаточно памяти',
+                            location='TranscriptionService._load_model',
+                            gpu_name=gpu_name,
+                            gpu_memory_gb=round(gpu_memory, 2),
+                        )
                     else:
                         logger.warning(f'GPU доступен, но памяти недостаточно ({gpu_memory:.2f} GB). Используется CPU.')
-                        # #region agent log
-                        log_data = {
-                            'sessionId': 'debug-session',
-                            'runId': 'run1',
-                            'hypothesisId': 'GPU_DETECTION',
-                            'location': 'transcription_service.py:45',
-                            'message': 'GPU доступен, но памяти недостаточно',
-                            'data': {'gpu_memory_gb': round(gpu_memory, 2), 'min_required_gb': 2.0},
-                            'timestamp': int(__import__('time').time() * 1000)
-                        }
-                        with open(r'c:\Users\wangr\PycharmProjects\pythonProject94\.cursor\debug.log', 'a', encoding='utf-8') as f:
-                            f.write(json.dumps(log_data, ensure_ascii=False) + '\n')
-                        # #endregion
+                        debug_trace.trace(
+                            'GPU доступен, но памяти недостаточно',
+                            location='TranscriptionService._load_model',
+                            gpu_memory_gb=round(gpu_memory, 2),
+                            min_required_gb=2.0,
+                        )
                 except Exception as gpu_error:
                     logger.warning(f'Ошибка при проверке GPU: {gpu_error}. Используется CPU.')
-                    # #region agent log
-                    log_data = {
-                        'sessionId': 'debug-session',
-                        'runId': 'run1',
-                        'hypothesisId': 'GPU_DETECTION',
-                        'location': 'transcription_service.py:55',
-                        'message': 'Ошибка при проверке GPU',
-                        'data': {'error': str(gpu_error)},
-                        'timestamp': int(__import__('time').time() * 1000)
-                    }
-                    with open(r'c:\Users\wangr\PycharmProjects\pythonProject94\.cursor\debug.log', 'a', encoding='utf-8') as f:
-                        f.write(json.dumps(log_data, ensure_ascii=False) + '\n')
-                    # #endregion
+                    debug_trace.trace('Ошибка при проверке GPU', location='TranscriptionService._load_model', error=str(gpu_error))
             
             self.device = 'cuda' if use_gpu else 'cpu'
             
@@ -94,54 +83,26 @@ class TranscriptionService:
             else:
                 logger.info('ℹ️ Используется CPU для транскрипции')
             
-            # #region agent log
-            log_data = {
-                'sessionId': 'debug-session',
-                'runId': 'run1',
-                'hypothesisId': 'GPU_DETECTION',
-                'location': 'transcription_service.py:70',
-                'message': 'Загрузка модели Whisper',
-                'data': {'device': self.device, 'model_name': self.model_name},
-                'timestamp': int(__import__('time').time() * 1000)
-            }
-            with open(r'c:\Users\wangr\PycharmProjects\pythonProject94\.cursor\debug.log', 'a', encoding='utf-8') as f:
-                f.write(json.dumps(log_data, ensure_ascii=False) + '\n')
-            # #endregion
+            debug_trace.trace('Загрузка модели Whisper', location='TranscriptionService._load_model', device=self.device, model_name=self.model_name)
             
             self.model = whisper.load_model(self.model_name, device=self.device)
             logger.info(f'Модель Whisper "{self.model_name}" загружена на устройство: {self.device}')
             
-            # #region agent log
-            log_data = {
-                'sessionId': 'debug-session',
-                'runId': 'run1',
-                'hypothesisId': 'GPU_DETECTION',
-                'location': 'transcription_service.py:80',
-                'message': 'Модель успешно загружена',
-                'data': {'device': self.device, 'model_name': self.model_name},
-                'timestamp': int(__import__('time').time() * 1000)
-            }
-            with open(r'c:\Users\wangr\PycharmProjects\pythonProject94\.cursor\debug.log', 'a', encoding='utf-8') as f:
-                f.write(json.dumps(log_data, ensure_ascii=False) + '\n')
-            # #endregion
+            debug_trace.trace('Модель успешно загружена', location='TranscriptionService._load_model', device=self.device, model_name=self.model_name)
         except Exception as e:
             logger.error(f'Ошибка загрузки модели Whisper: {str(e)}', exc_info=True)
-            # #region agent log
-            log_data = {
-                'sessionId': 'debug-session',
-                'runId': 'run1',
-                'hypothesisId': 'GPU_DETECTION',
-                'location': 'transcription_service.py:90',
-                'message': 'Ошибка загрузки модели',
-                'data': {'error': str(e)},
-                'timestamp': int(__import__('time').time() * 1000)
-            }
-            with open(r'c:\Users\wangr\PycharmProjects\pythonProject94\.cursor\debug.log', 'a', encoding='utf-8') as f:
-                f.write(json.dumps(log_data, ensure_ascii=False) + '\n')
-            # #endregion
+            debug_trace.trace('Ошибка загрузки модели', location='TranscriptionService._load_model', error=str(e))
             raise Exception(f'Ошибка загрузки модели Whisper: {str(e)}')
     
-    def extract_audio_from_video(self, video_path, output_audio_path):
+    @staticmethod
+    def temp_audio_path(video_path):
+        temp_audio_dir = settings.TEMP_AUDIO_DIRECTORY
+        os.makedirs(temp_audio_dir, exist_ok=True)
+        video_name = os.path.splitext(os.path.basename(video_path))[0]
+        return os.path.join(temp_audio_dir, f'{video_name}.wav')
+    
+    @staticmethod
+    def extract_audio_from_video(video_path, output_audio_path):
         try:
             file_size = os.path.getsize(video_path) if os.path.exists(video_path) else 0
             file_size_mb = file_size / (1024 * 1024)
@@ -163,24 +124,134 @@ class TranscriptionService:
             raise Exception(f'Ошибка извлечения аудио: {str(e)}')
     
     def transcribe(self, video_path):
+        return self.transcribe_to_record(video_path)['text']
+    
+    @classmethod
+    def iter_pcm_blocks(cls, video_path, block_size=None):
+        """
+        Извлечь аудио из видео и отдавать его блоками PCM (s16le, 16 кГц, моно)
+
+        По умолчанию FFmpeg пишет аудио в pipe и временный WAV не создаётся.
+        При AUDIO_PIPE_MODE=False используется прежний путь через временный файл.
+        """
+        block_size = block_size or cls.PCM_BLOCK_SIZE
+        if not getattr(settings, 'AUDIO_PIPE_MODE', True):
+            yield from cls._iter_wav_blocks(video_path, block_size)
+            return
+
+        ffmpeg_binary = getattr(settings, 'FFMPEG_BINARY', 'ffmpeg')
+        logger.info('Запуск FFmpeg для извлечения аудио в pipe...')
+        try:
+            process = (
+                ffmpeg
+                .input(video_path)
+                .output('pipe:', format='s16le', acodec='pcm_s16le', ac=1, ar='16k')
+                .global_args('-loglevel', 'error', '-nostdin')
+                .run_async(cmd=ffmpeg_binary, pipe_stdout=True, pipe_stderr=True)
+            )
+        except Exception as e:
+            logger.error('Ошибка запуска FFmpeg: %s', str(e), exc_info=True)
+            raise Exception(f'Ошибка извлечения аудио: {str(e)}')
+
+        finished = False
+        try:
+            remainder = b''
+            while True:
+                data = process.stdout.read(block_size)
+                if not data:
+                    break
+                data = remainder + data
+                # Блок может оборваться посередине сэмпла
+                if len(data) % 2:
+                    remainder, data = data[-1:], data[:-1]
+                else:
+                    remainder = b''
+                yield data
+            stderr = process.stderr.read()
+            if process.wait() != 0:
+                message = stderr.decode('utf-8', errors='replace').strip()
+                raise Exception(f'Ошибка извлечения аудио: FFmpeg завершился с кодом {process.returncode}: {message}')
+            finished = True
+        finally:
+            if not finished and process.poll() is None:
+                # Потребитель прервал чтение (ошибка или транскрипт найден в хранилище)
+                process.kill()
+                process.wait()
+            process.stdout.close()
+            process.stderr.close()
+
+    @classmethod
+    def _iter_wav_blocks(cls, video_path, block_size):
+        audio_path = cls.temp_audio_path(video_path)
+        try:
+            cls.extract_audio_from_video(video_path, audio_path)
+            with wave.open(audio_path, 'rb') as wav_file:
+                frames_per_block = block_size // wav_file.getsampwidth()
+                while True:
+                    data = wav_file.readframes(frames_per_block)
+                    if not data:
+                        break
+                    yield data
+        finally:
+            if os.path.exists(audio_path):
+                os.remove(audio_path)
+
+    @classmethod
+    def load_audio(cls, video_path):
+        """
+        Извлечь аудио в память
+
+        Returns:
+            tuple: (сэмплы float32 16 кГц, SHA-256 от PCM-данных)
+        """
+        digest = hashlib.sha256()
+        pcm = bytearray()
+        for block in cls.iter_pcm_blocks(video_path):
+            digest.update(block)
+            pcm += block
+        # frombuffer читает bytearray напрямую, без промежуточной копии в bytes
+        return pcm_to_float32(pcm), digest.hexdigest()
+
+    def prepare_audio(self, video_path):
+        """
+        Извлечь аудио и проверить хранилище транскриптов (без запуска Whisper)
+        
+        Returns:
+            PreparedAudio: сэмплы, хэш аудио, ключ хранилища и найденная запись (или None)
+        """
         if not os.path.exists(video_path):
             raise FileNotFoundError(f'Видеофайл не найден: {video_path}')
-        temp_audio_dir = settings.TEMP_AUDIO_DIRECTORY
-        os.makedirs(temp_audio_dir, exist_ok=True)
-        video_name = os.path.splitext(os.path.basename(video_path))[0]
-        audio_path = os.path.join(temp_audio_dir, f'{video_name}.wav')
         try:
-            logger.info('Извлечение аудио из видео: %s', video_path)
-            self.extract_audio_from_video(video_path, audio_path)
-            logger.info('Аудио извлечено: %s', audio_path)
+            file_size_mb = os.path.getsize(video_path) / (1024 * 1024)
+            logger.info('Извлечение аудио из видео: %s (размер: %.2f MB)', video_path, file_size_mb)
+            samples, audio_hash = self.load_audio(video_path)
+            cache_key = self.transcript_store.make_key(audio_hash, self.model_name, self.TRANSCRIBE_OPTIONS)
+            record = self.transcript_store.get(cache_key)
+            if record:
+                logger.info('Транскрипт найден в хранилище (аудио %s), Whisper не запускается', audio_hash[:12])
+                samples = None
+            return PreparedAudio(samples, audio_hash, cache_key, record)
+        except Exception as e:
+            raise Exception(f'Ошибка извлечения аудио: {str(e)}')
+    
+    def transcribe_prepared(self, audio):
+        """
+        Транскрибировать подготовленное аудио (prepare_audio) и сохранить запись
+        
+        Returns:
+            dict: Запись TranscriptStore (text, segments, path, ...)
+        """
+        if audio.record:
+            return audio.record
+        try:
             import time
-            audio_size = os.path.getsize(audio_path) if os.path.exists(audio_path) else 0
-            audio_size_mb = audio_size / (1024 * 1024)
-            logger.info('Начало транскрипции аудио: %s (размер: %.2f MB)', audio_path, audio_size_mb)
-            if audio_size_mb > 100:
-                logger.warning('ВНИМАНИЕ: Аудиофайл очень большой (%.2f MB). Транскрипция может занять много времени (10-30+ минут на CPU).', audio_size_mb)
-            elif audio_size_mb > 50:
-                logger.warning('Аудиофайл большой (%.2f MB). Транскрипция может занять несколько минут.', audio_size_mb)
+            samples = audio.samples
+            duration_minutes = len(samples) / SAMPLE_RATE / 60
+            logger.info('Начало транскрипции аудио (длительность: %.1f мин)', duration_minutes)
+            if duration_minutes > 50:
+                logger.warning('ВНИМАНИЕ: Аудио очень длинное (%.1f мин). Транскрипция может занять много времени (10-30+ минут на CPU).', duration_minutes)
+            elif duration_minutes > 25:
+                logger.warning('Аудио длинное (%.1f мин). Транскрипция может занять несколько минут.', duration_minutes)
             start_time = time.time()
             logger.info('Запуск модели Whisper для транскрипции...')
             import torch
@@ -189,11 +260,10 @@ class TranscriptionService:
             else:
                 logger.info('Используется CPU - транскрипция может занять много времени. Пожалуйста, подождите...')
             result = self.model.transcribe(
-                audio_path,
-                language=None,
-                task='transcribe',
+                samples,
                 verbose=True,
-                fp16=torch.cuda.is_available()
+                fp16=torch.cuda.is_available(),
+                **self.TRANSCRIBE_OPTIONS
             )
             elapsed_time = time.time() - start_time
             logger.info('Транскрипция завершена за %.2f секунд (%.2f минут)', elapsed_time, elapsed_time / 60)
@@ -201,11 +271,45 @@ class TranscriptionService:
                 logger.warning('Транскрипция заняла %.2f минут - это нормально для больших файлов на CPU', elapsed_time / 60)
             elif self.device == 'cuda':
                 logger.info('Транскрипция выполнена на GPU - скорость значительно выше, чем на CPU')
-            transcript_text = result['text'].strip()
-            if os.path.exists(audio_path):
-                os.remove(audio_path)
-            return transcript_text
+            return self.transcript_store.put(
+                audio.cache_key,
+                audio.audio_hash,
+                self.model_name,
+                self.TRANSCRIBE_OPTIONS,
+                text=result['text'].strip(),
+                segments=result.get('segments'),
+                language=result.get('language'),
+            )
         except Exception as e:
-            if os.path.exists(audio_path):
-                os.remove(audio_path)
             raise Exception(f'Ошибка транскрипции: {str(e)}')
+    
+    def transcribe_to_record(self, video_path):
+        """
+        Транскрибировать видео с использованием хранилища транскриптов
+        
+        Returns:
+            dict: Запись TranscriptStore (text, segments, path, ...)
+        """
+        return self.transcribe_prepared(self.prepare_audio(video_path))
+    
+    def transcribe_samples(self, samples):
+        """
+        Транскрибировать фрагмент аудио (float32, 16 кГц) без записи на диск
+        
+        Returns:
+            dict: {'language', 'segments': [{'start', 'end', 'text'}]}
+        """
+        import torch
+        result = self.model.transcribe(
+            samples,
+            verbose=False,
+            fp16=torch.cuda.is_available(),
+            **self.TRANSCRIBE_OPTIONS
+        )
+        return {
+            'language': result.get('language'),
+            'segments': [
+                {'start': s['start'], 'end': s['end'], 'text': s['text']}
+                for s in result.get('segments', [])
+            ],
+        }
@@ -0,0 +1,145 @@
+"""
+Инкрементальный индекс папки с видео
+
+Индекс хранит для каждой подпапки её mtime, список подпапок и видеофайлы
+(размер, mtime, ctime). mtime папки меняется при добавлении, удалении и
+переименовании файлов в ней, поэтому неизменённые папки не перечитываются:
+повторный обход неизменённого дерева стоит один stat на папку.
+Индекс сохраняется в JSON-файл (VIDEO_INDEX_PATH) атомарно.
+"""
+import os
+import json
+import time
+import logging
+from collections import namedtuple
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+IndexedFile = namedtuple('IndexedFile', ['path', 'size', 'mtime', 'ctime'])
+
+INDEX_VERSION = 1
+# Папке, изменённой только что, не доверяем: в тот же тик mtime в неё ещё могут
+# добавиться файлы, и следующий обход не заметит изменения
+RECENT_MTIME_SECONDS = 2
+
+
+class VideoDirectoryIndex:
+    """Индекс видеофайлов папки: {папка: {mtime, subdirs, files}}"""
+
+    def __init__(self, directory, extensions, path=None):
+        self.directory = os.path.normpath(directory)
+        self.extensions = extensions
+        self.path = path or settings.VIDEO_INDEX_PATH
+        self.dirs = {}
+        # Состояние таблицы VideoFile на момент последней сверки (count, max id)
+        self.db_state = None
+
+    def load(self):
+        """Прочитать индекс; повреждённый или чужой индекс игнорируется"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return self
+        except (OSError, ValueError) as e:
+            logger.warning(f'Не удалось прочитать индекс видео {self.path}: {e}')
+            return self
+        if data.get('version') != INDEX_VERSION or data.get('root') != self.directory:
+            return self
+        self.dirs = data.get('dirs') or {}
+        db_state = data.get('db_state')
+        self.db_state = tuple(db_state) if db_state else None
+        return self
+
+    def save(self):
+        """Сохранить индекс атомарно (через временный файл)"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': INDEX_VERSION,
+                'root': self.directory,
+                'db_state': list(self.db_state) if self.db_state else None,
+                'dirs': self.dirs,
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def scan(self):
+        """
+        Обновить индекс по файловой системе
+
+        Returns:
+            bool: Изменилось ли дерево с прошлого обхода
+        """
+        changed = False
+        now = time.time()
+        dirs = {}
+        stack = [self.directory]
+        while stack:
+            path = stack.pop()
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            entry = self.dirs.get(path)
+            if entry is None or entry['mtime'] != mtime:
+                entry = self._read_dir(path, mtime, now)
+                changed = True
+            elif self._refresh_empty_files(path, entry):
+                changed = True
+            dirs[path] = entry
+            stack.extend(os.path.join(path, name) for name in entry['subdirs'])
+        if dirs.keys() != self.dirs.keys():
+            changed = True
+        self.dirs = dirs
+        return changed
+
+    def files(self):
+        """Все проиндексированные видеофайлы"""
+        for directory, entry in self.dirs.items():
+            for name, (size, mtime, ctime) in entry['files'].items():
+                yield IndexedFile(os.path.join(directory, name), size, mtime, ctime)
+
+    def _read_dir(self, path, mtime, now):
+        subdirs = []
+        files = {}
+        try:
+            with os.scandir(path) as entries:
+                for item in entries:
+                    try:
+                        if item.is_dir(follow_symlinks=False):
+                            # Скрытые папки (в т.ч. .uploads с незавершёнными загрузками) пропускаются
+                            if not item.name.startswith('.'):
+                                subdirs.append(item.name)
+                        elif os.path.splitext(item.name)[1].lower() in self.extensions:
+                            stat = item.stat()
+                            files[item.name] = [stat.st_size, stat.st_mtime_ns, stat.st_ctime]
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.warning(f'Не удалось прочитать папку {path}: {e}')
+        if now - mtime / 1e9 < RECENT_MTIME_SECONDS:
+            mtime = None
+        return {'mtime': mtime, 'subdirs': subdirs, 'files': files}
+
+    @staticmethod
+    def _refresh_empty_files(path, entry):
+        """
+        Пустые файлы (ещё не записанные) перепроверяются при каждом обходе:
+        запись содержимого не меняет mtime папки
+        """
+        changed = False
+        for name, info in entry['files'].items():
+            if info[0]:
+                continue
+            try:
+                stat = os.stat(os.path.join(path, name))
+            except OSError:
+                continue
+            if stat.st_size:
+                entry['files'][name] = [stat.st_size, stat.st_mtime_ns, stat.st_ctime]
+                changed = True
+        return changed
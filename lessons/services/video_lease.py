@@ -0,0 +1,125 @@
+"""
+Аренда (lease) видео на время обработки
+
+Видео захватывается условным UPDATE: строка меняется, только если она
+свободна, её аренда истекла или уже принадлежит этому воркеру. Воркер
+продлевает аренду вместе с heartbeat задачи; если воркер или машина упали,
+аренда истекает сама, и видео может захватить другой воркер. Поэтому
+несколько воркеров на разных машинах с одной базой не обработают одно видео
+дважды.
+"""
+import os
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from lessons.models import VideoFile
+
+logger = logging.getLogger(__name__)
+
+
+def lease_duration():
+    return timedelta(seconds=getattr(settings, 'VIDEO_LEASE_SECONDS', 300))
+
+
+def _claimable(owner, now):
+    return Q(lease_owner__isnull=True) | Q(lease_expires_at__lt=now) | Q(lease_owner=owner)
+
+
+def claim_video(video_id, owner, force_recreate=False):
+    """
+    Захватить видео для обработки
+
+    Готовое видео (status='done') захватывается только при force_recreate.
+
+    Returns:
+        bool: Захвачено ли видео этим воркером
+    """
+    now = timezone.now()
+    videos = VideoFile.objects.filter(_claimable(owner, now), id=video_id)
+    if not force_recreate:
+        videos = videos.exclude(status='done')
+    return videos.update(
+        status='processing',
+        processing_status='transcribing',
+        processing_message='Транскрипция видео...',
+        error_message=None,
+        lease_owner=owner,
+        lease_expires_at=now + lease_duration(),
+        heartbeat_at=now,
+    ) > 0
+
+
+def renew_lease(video_id, owner):
+    """Продлить аренду. Возвращает False, если видео больше не принадлежит воркеру"""
+    now = timezone.now()
+    return VideoFile.objects.filter(id=video_id, lease_owner=owner).update(
+        lease_expires_at=now + lease_duration(),
+        heartbeat_at=now,
+    ) > 0
+
+
+def update_leased(video_id, owner, **fields):
+    """Обновить поля видео, только пока аренда принадлежит воркеру"""
+    updated = VideoFile.objects.filter(id=video_id, lease_owner=owner).update(**fields) > 0
+    if not updated:
+        logger.warning(f'Видео {video_id} больше не принадлежит воркеру {owner}, статус не обновлён')
+    return updated
+
+
+def release_video(video_id, owner, **fields):
+    """Освободить видео, записав итоговый статус"""
+    return update_leased(video_id, owner, lease_owner=None, lease_expires_at=None, **fields)
+
+
+def stale_videos_queryset(legacy_cutoff=None):
+    """Видео в статусе processing с истёкшей арендой (и без аренды — старше legacy_cutoff)"""
+    stale = Q(lease_owner__isnull=False, lease_expires_at__lt=timezone.now())
+    if legacy_cutoff is not None:
+        stale |= Q(lease_owner__isnull=True) & (
+            Q(heartbeat_at__lt=legacy_cutoff) | Q(heartbeat_at__isnull=True, created_at__lt=legacy_cutoff)
+        )
+    return VideoFile.objects.filter(stale, status='processing')
+
+
+def expire_stale_leases(legacy_cutoff=None):
+    """
+    Сбросить видео в статусе processing, аренда которых истекла
+
+    Видео без аренды (остались от версий до аренды) считаются зависшими,
+    если heartbeat (или создание записи) были раньше legacy_cutoff. Видео с пропавшим файлом
+    помечаются ошибкой, остальные возвращаются в pending.
+
+    Returns:
+        tuple: (возвращено в pending, помечено ошибкой)
+    """
+    stale_videos = list(stale_videos_queryset(legacy_cutoff).values_list('id', 'file_path'))
+    reset_ids, missing_ids = [], []
+    for video_id, file_path in stale_videos:
+        (reset_ids if file_path and os.path.exists(file_path) else missing_ids).append(video_id)
+
+    # Условие повторяется в UPDATE: видео, которое успели захватить заново, не сбрасывается
+    still_stale = stale_videos_queryset(legacy_cutoff)
+    reset = still_stale.filter(id__in=reset_ids).update(
+        status='pending',
+        processing_status='idle',
+        processing_message=None,
+        error_message=None,
+        lease_owner=None,
+        lease_expires_at=None,
+    )
+    failed = 0
+    for video_id, file_path in stale_videos:
+        if video_id in missing_ids:
+            failed += still_stale.filter(id=video_id).update(
+                status='error',
+                processing_status='error',
+                processing_message=None,
+                error_message=f'Видеофайл не найден: {file_path}',
+                lease_owner=None,
+                lease_expires_at=None,
+            )
+    if reset or failed:
+        logger.warning(f'⚠️ Истекла аренда видео: возвращено в очередь {reset}, помечено ошибкой {failed}')
+    return reset, failed
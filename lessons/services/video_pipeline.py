@@ -0,0 +1,217 @@
+"""
+Конвейерная обработка видео
+
+Этапы (извлечение аудио → транскрипция → генерация урока → сохранение)
+работают в своих потоках и связаны ограниченными очередями. Пока ИИ генерирует
+урок для видео N (сеть), Whisper уже транскрибирует видео N+1 (CPU/GPU),
+поэтому пропускная способность на пачке видео определяется самым медленным
+этапом, а не суммой всех этапов. Ограниченные очереди не дают воркеру набрать
+больше задач (и аудио в памяти), чем успевают обработать следующие этапы.
+"""
+import queue
+import logging
+import threading
+from django.conf import settings
+from django.db import close_old_connections, connection
+from lessons.services import debug_trace
+from lessons.services.job_queue import (
+    JobHeartbeat, VideoJobWorker, claim_next_job, finish_job, requeue_stale_jobs
+)
+from lessons.services.video_lease import expire_stale_leases
+from lessons.services.video_processor import VideoTask
+
+logger = logging.getLogger(__name__)
+
+# (этап, метод VideoProcessor, настройка числа потоков, по умолчанию)
+STAGES = (
+    ('extract', 'extract_stage', 'VIDEO_PIPELINE_EXTRACT_WORKERS', 1),
+    # Модель Whisper в процессе одна — транскрипция по умолчанию в один поток
+    ('transcribe', 'transcribe_stage', 'VIDEO_PIPELINE_TRANSCRIBE_WORKERS', 1),
+    ('generate', 'generate_stage', 'VIDEO_PIPELINE_GENERATE_WORKERS', 2),
+    ('persist', 'persist_stage', 'VIDEO_PIPELINE_PERSIST_WORKERS', 1),
+)
+
+_STOP = object()
+
+
+class VideoPipeline:
+    """Этапы обработки в потоках с ограниченными очередями между ними"""
+
+    def __init__(self, processor, on_finish, queue_size=None, concurrency=None):
+        """
+        Args:
+            processor: VideoProcessor (методы этапов принимают VideoTask)
+            on_finish: Вызывается с (task, error) после последнего этапа или ошибки
+            queue_size: Размер очереди перед каждым этапом
+            concurrency: {этап: число потоков} поверх настроек
+        """
+        self.processor = processor
+        self.on_finish = on_finish
+        queue_size = queue_size or getattr(settings, 'VIDEO_PIPELINE_QUEUE_SIZE', 1)
+        concurrency = concurrency or {}
+        self.stages = []
+        for name, method, setting_name, default in STAGES:
+            workers = concurrency.get(name) or getattr(settings, setting_name, default)
+            self.stages.append({
+                'name': name,
+                'method': method,
+                'workers': max(1, workers),
+                'queue': queue.Queue(maxsize=queue_size),
+                'remaining': max(1, workers),
+            })
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        for index, stage in enumerate(self.stages):
+            for number in range(stage['workers']):
+                thread = threading.Thread(
+                    target=self._run_stage,
+                    args=(index,),
+                    name=f'pipeline-{stage["name"]}-{number}',
+                    daemon=True,
+                )
+                thread.start()
+                self._threads.append(thread)
+        logger.info('Конвейер обработки запущен: ' + ', '.join(
+            f'{stage["name"]}×{stage["workers"]}' for stage in self.stages
+        ))
+
+    def submit(self, task):
+        """Передать задачу на первый этап (блокируется, пока очередь заполнена)"""
+        self.stages[0]['queue'].put(task)
+
+    def close(self):
+        """Дождаться обработки всех переданных задач и остановить потоки"""
+        for _ in range(self.stages[0]['workers']):
+            self.stages[0]['queue'].put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _run_stage(self, index):
+        stage = self.stages[index]
+        next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+        stage_method = getattr(self.processor, stage['method'])
+        try:
+            while True:
+                task = stage['queue'].get()
+                if task is _STOP:
+                    break
+                close_old_connections()
+                try:
+                    with debug_trace.span(stage['method'], location='VideoPipeline', video_id=task.video_file.id):
+                        stage_method(task)
+                except Exception as e:
+                    self._finish(task, e)
+                    continue
+                if next_stage:
+                    next_stage['queue'].put(task)
+                else:
+                    self._finish(task, None)
+        finally:
+            with self._lock:
+                stage['remaining'] -= 1
+                last = stage['remaining'] == 0
+            # Последний поток этапа передаёт остановку следующему этапу
+            if last and next_stage:
+                for _ in range(next_stage['workers']):
+                    next_stage['queue'].put(_STOP)
+            # У потока своё подключение к БД — закрываем его
+            connection.close()
+
+    def _finish(self, task, error):
+        if error is not None:
+            try:
+                self.processor.fail_task(task, error)
+            except Exception as e:
+                logger.error(f'Ошибка сохранения статуса видео {task.video_file.id}: {e}', exc_info=True)
+        try:
+            self.on_finish(task, error)
+        except Exception as e:
+            logger.error(f'Ошибка завершения задачи видео {task.video_file.id}: {e}', exc_info=True)
+
+
+class PipelinedVideoJobWorker(VideoJobWorker):
+    """Воркер, обрабатывающий несколько задач очереди одновременно на разных этапах"""
+
+    def __init__(self, worker_id=None, poll_interval=None, queue_size=None, concurrency=None):
+        super().__init__(worker_id=worker_id, poll_interval=poll_interval)
+        self.queue_size = queue_size
+        self.concurrency = concurrency
+        self.processed = 0
+        self._heartbeats = {}
+        self._heartbeats_lock = threading.Lock()
+
+    def run(self, once=False):
+        """
+        Забирать задачи из очереди и передавать их в конвейер
+
+        Args:
+            once: Завершиться, как только очередь опустеет (переданные задачи дорабатываются)
+
+        Returns:
+            int: Количество обработанных задач
+        """
+        logger.info(f'Конвейерный воркер {self.worker_id} запущен')
+        pipeline = VideoPipeline(
+            self._get_processor(), self._finish_task,
+            queue_size=self.queue_size, concurrency=self.concurrency,
+        )
+        pipeline.start()
+        try:
+            while not self._stop_event.is_set():
+                close_old_connections()
+                requeue_stale_jobs()
+                expire_stale_leases()
+                job = claim_next_job(self.worker_id)
+                if job is None:
+                    if once:
+                        break
+                    self._stop_event.wait(self.poll_interval)
+                    continue
+                task = self._start_task(job)
+                if task is not None:
+                    # Блокируется, пока первый этап занят: лишние задачи остаются в очереди БД
+                    pipeline.submit(task)
+        finally:
+            pipeline.close()
+        logger.info(f'Конвейерный воркер {self.worker_id} остановлен, обработано задач: {self.processed}')
+        return self.processed
+
+    def _start_task(self, job):
+        """Подготовить задачу к конвейеру; уже обработанное видео завершается сразу"""
+        logger.info(f'Воркер {self.worker_id} взял задачу {job.id} (видео {job.video_id}, попытка {job.attempts})')
+        heartbeat = JobHeartbeat(job.id, self.worker_id, video_id=job.video_id)
+        heartbeat.start()
+        with self._heartbeats_lock:
+            self._heartbeats[job.id] = heartbeat
+        task = VideoTask(job.video, job.force_recreate, job=job, owner=self.worker_id)
+        processor = self._get_processor()
+        try:
+            skip, lesson = processor.check_existing(task.video_file, job.force_recreate)
+            if not skip and not processor.start_task(task):
+                skip, lesson = True, None
+            if skip:
+                task.lesson = lesson
+                self._finish_task(task, None if lesson else ValueError('Урок не создан'))
+                return None
+        except Exception as e:
+            self._finish_task(task, e)
+            return None
+        return task
+
+    def _finish_task(self, task, error):
+        job = task.job
+        with self._heartbeats_lock:
+            heartbeat = self._heartbeats.pop(job.id, None)
+        if heartbeat:
+            heartbeat.stop()
+        if error is None:
+            finish_job(job, self.worker_id)
+            logger.info(f'✅ Задача {job.id} выполнена, урок {task.lesson.id}')
+        else:
+            logger.error(f'❌ Задача {job.id} завершилась ошибкой: {str(error)}')
+            finish_job(job, self.worker_id, error_message=str(error))
+        with self._heartbeats_lock:
+            self.processed += 1
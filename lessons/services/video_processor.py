@@ -1,130 +1,253 @@
 import os
-import sys
-import json
 import logging
+import threading
 from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
-from lessons.models import VideoFile, Lesson
+from lessons.models import VideoFile, Lesson, ExerciseCard
 from lessons.services.transcription_service import TranscriptionService
+from lessons.services.transcription_pool import TranscriptionPool
+from lessons.services.transcript_store import TranscriptStore
 from lessons.services.openrouter_service import OpenRouterService
 from lessons.services.repetition_service import RepetitionService
 from lessons.services.card_cleaner import clean_card_data
 from lessons.services.card_creator import prepare_spelling_card, prepare_repeat_card, create_card
+from lessons.services import debug_trace
+from lessons.services.avatar_score import learners_of_lessons, rebuild_avatar_scores
+from lessons.services.lesson_summary import save_summary
+from lessons.services.job_queue import make_worker_id
+from lessons.services.video_lease import claim_video, release_video, update_leased
 
 logger = logging.getLogger(__name__)
 
 
+class VideoTask:
+    """Видео в процессе обработки: результаты этапов передаются между ними"""
+
+    def __init__(self, video_file, force_recreate=False, job=None, owner=None):
+        self.video_file = video_file
+        self.force_recreate = force_recreate
+        self.job = job
+        # Владелец аренды видео (идентификатор воркера)
+        self.owner = owner or make_worker_id()
+        self.audio = None
+        self.transcript_text = None
+        self.lesson_data = None
+        # {id(card_data): (card_data, ExerciseCard)} — карточки, подготовленные во время генерации
+        self.prepared_cards = {}
+        self.lesson = None
+
+
 class VideoProcessor:
     def __init__(self):
-        self.transcription_service = TranscriptionService()
+        if TranscriptionPool.is_enabled():
+            self.transcription_service = TranscriptionPool.get_instance()
+        else:
+            self.transcription_service = TranscriptionService()
         self.openrouter_service = OpenRouterService()
         self.repetition_service = RepetitionService()
+        self.transcript_store = TranscriptStore()
     
-    def process_video(self, video_file, force_recreate=False):
-        if video_file.status == 'processing' and not force_recreate:
-            logger.warning(f'Видео {video_file.id} уже обрабатывается')
-            try:
-                existing_lesson = Lesson.objects.get(video=video_file)
-                return existing_lesson
-            except Lesson.DoesNotExist:
-                return None
+    def process_video(self, video_file, force_recreate=False, owner=None):
+        """
+        Обработать видео последовательно всеми этапами
+        
+        Args:
+            owner: Идентификатор воркера — владельца аренды; аренду продлевает
+                JobHeartbeat воркера (без него аренда истекает через VIDEO_LEASE_SECONDS)
+        """
+        skip, existing_lesson = self.check_existing(video_file, force_recreate)
+        if skip:
+            return existing_lesson
+        task = VideoTask(video_file, force_recreate, owner=owner)
+        if not self.start_task(task):
+            return None
+        try:
+            for stage in (self.extract_stage, self.transcribe_stage, self.generate_stage, self.persist_stage):
+                with debug_trace.span(stage.__name__, location='VideoProcessor', video_id=video_file.id):
+                    stage(task)
+            return task.lesson
+        except Exception as e:
+            self.fail_task(task, e)
+            raise
+    
+    def check_existing(self, video_file, force_recreate=False):
+        """
+        Нужно ли обрабатывать видео
+        
+        Видео, которое сейчас обрабатывает другой воркер, отсекает аренда в start_task.
+        
+        Returns:
+            tuple: (пропустить, существующий урок или None)
+        """
         if video_file.status == 'done' and hasattr(video_file, 'lesson') and not force_recreate:
             logger.warning(f'Урок для видео {video_file.id} уже существует')
-            return video_file.lesson
-        logger.info('=' * 80)
-        logger.info(f'НАЧАЛО ОБРАБОТКИ ВИДЕО: {video_file.file_name} (ID: {video_file.id})')
-        logger.info('=' * 80)
-        sys.stdout.flush()
+            return True, video_file.lesson
+        return False, None
+    
+    def start_task(self, task):
+        """
+        Захватить видео (условный UPDATE с арендой)
+        
+        Returns:
+            bool: False, если видео обрабатывает другой воркер
+        """
+        video_file = task.video_file
+        if not claim_video(video_file.id, task.owner, task.force_recreate):
+            logger.warning(f'Видео {video_file.id} уже обрабатывается другим воркером')
+            return False
         video_file.status = 'processing'
         video_file.processing_status = 'transcribing'
         video_file.processing_message = 'Транскрипция видео...'
-        video_file.save()
-        try:
-            # #region agent log
-            log_path = os.path.join(settings.BASE_DIR, '.cursor', 'debug.log')
-            os.makedirs(os.path.dirname(log_path), exist_ok=True)
-            with open(log_path, 'a', encoding='utf-8') as f:
-                f.write(json.dumps({
-                    'location': 'video_processor.py:42',
-                    'message': 'Starting video processing',
-                    'data': {
-                        'video_id': video_file.id,
-                        'file_path': video_file.file_path,
-                        'file_path_exists': os.path.exists(video_file.file_path),
-                        'WATCHED_VIDEO_DIRECTORY': settings.WATCHED_VIDEO_DIRECTORY
-                    },
-                    'timestamp': int(timezone.now().timestamp() * 1000),
-                    'sessionId': 'debug-session',
-                    'runId': 'run1',
-                    'hypothesisId': 'G'
-                }, ensure_ascii=False) + '\n')
-            # #endregion
-            transcript_text = self.transcription_service.transcribe(video_file.file_path)
-            if not transcript_text or len(transcript_text.strip()) < 50:
-                raise ValueError(f'Транскрипт слишком короткий или пустой: {len(transcript_text) if transcript_text else 0} символов')
-            video_file.has_transcript = True
-            video_file.processing_status = 'generating_lesson'
-            video_file.processing_message = 'Генерация урока с помощью ИИ...'
-            video_file.save()
-            logger.info('')
-            logger.info('=' * 80)
-            logger.info('ГЕНЕРАЦИЯ УРОКА С ПОМОЩЬЮ ИИ')
-            logger.info('=' * 80)
-            logger.info(f'Длина транскрипта: {len(transcript_text)} символов')
-            sys.stdout.flush()
-            previous_lessons_info = self._get_previous_lessons_info()
-            use_two_stage = getattr(settings, 'USE_TWO_STAGE_PROCESS', True)
-            if use_two_stage:
-                logger.info('Используется двухэтапный процесс генерации урока')
-                sys.stdout.flush()
-                lesson_data = self.openrouter_service.analyze_lesson_two_stage(transcript_text, previous_lessons_info)
+        video_file.error_message = None
+        video_file.lease_owner = task.owner
+        logger.info('=' * 80)
+        logger.info(f'НАЧАЛО ОБРАБОТКИ ВИДЕО: {video_file.file_name} (ID: {video_file.id})')
+        logger.info('=' * 80)
+        return True
+    
+    def extract_stage(self, task):
+        """Этап 1: извлечение аудио (пропускается, если транскрипт уже сохранён)"""
+        video_file = task.video_file
+        if debug_trace.enabled():
+            debug_trace.trace(
+                'Starting video processing',
+                location='video_processor.extract_stage',
+                video_id=video_file.id,
+                file_path=video_file.file_path,
+                file_path_exists=os.path.exists(video_file.file_path),
+                watched_video_directory=settings.WATCHED_VIDEO_DIRECTORY,
+            )
+        model_name = self.transcription_service.model_name
+        options = TranscriptionService.TRANSCRIBE_OPTIONS
+        record = self.transcript_store.load(video_file.transcript_path)
+        if record and TranscriptStore.matches(record, model_name, options):
+            logger.info(f'Используется сохранённый транскрипт: {video_file.transcript_path}')
+            task.transcript_text = record['text']
+            return
+        # Пул процессов сам совмещает извлечение аудио с транскрипцией
+        if isinstance(self.transcription_service, TranscriptionService):
+            task.audio = self.transcription_service.prepare_audio(video_file.file_path)
+    
+    def transcribe_stage(self, task):
+        """Этап 2: транскрипция Whisper"""
+        video_file = task.video_file
+        if task.transcript_text is None:
+            if task.audio is not None:
+                record = self.transcription_service.transcribe_prepared(task.audio)
             else:
-                logger.info('Используется одноэтапный процесс генерации урока')
-                sys.stdout.flush()
-                try:
-                    lesson_data = self.openrouter_service.analyze_lesson_two_stage(transcript_text, previous_lessons_info)
-                except Exception as e:
-                    logger.warning(f'Двухэтапный процесс не удался: {e}. Пробуем одноэтапный...')
-                    sys.stdout.flush()
-                    lesson_data = self.openrouter_service.analyze_lesson(transcript_text, previous_lessons_info)
-            filtered_text = self._filter_transcript(transcript_text)
-            lesson = self._create_lesson_from_ai_response(video_file, filtered_text, lesson_data, force_recreate)
-            video_file.status = 'done'
-            video_file.processing_status = 'done'
-            video_file.processing_message = f'Урок создан: {lesson.title}'
-            video_file.processed_at = timezone.now()
-            video_file.save()
-            
-            # Удаляем видеофайл после успешной обработки для экономии места
+                record = self.transcription_service.transcribe_to_record(video_file.file_path)
+            # Сэмплы больше не нужны — освобождаем память до следующих этапов
+            task.audio = None
+            video_file.transcript_path = record['path']
+            video_file.has_transcript = True
+            task.transcript_text = record['text']
+        transcript_text = task.transcript_text
+        if not transcript_text or len(transcript_text.strip()) < 50:
+            raise ValueError(f'Транскрипт слишком короткий или пустой: {len(transcript_text) if transcript_text else 0} символов')
+        self._update_video(
+            task,
+            transcript_path=video_file.transcript_path,
+            has_transcript=video_file.has_transcript,
+            processing_status='generating_lesson',
+            processing_message='Генерация урока с помощью ИИ...',
+        )
+    
+    def generate_stage(self, task):
+        """Этап 3: генерация урока с помощью ИИ"""
+        transcript_text = task.transcript_text
+        logger.info('')
+        logger.info('=' * 80)
+        logger.info('ГЕНЕРАЦИЯ УРОКА С ПОМОЩЬЮ ИИ')
+        logger.info('=' * 80)
+        logger.info(f'Длина транскрипта: {len(transcript_text)} символов')
+        previous_lessons_info = self._get_previous_lessons_info()
+        use_two_stage = getattr(settings, 'USE_TWO_STAGE_PROCESS', True)
+        # Карточки готовятся к сохранению по мере поступления от ИИ (в потоках генерации тем)
+        prepared_cards = task.prepared_cards
+        prepared_lock = threading.Lock()
+        
+        def on_card(card_data):
+            card_obj = self._build_card(card_data, len(prepared_cards))
+            with prepared_lock:
+                prepared_cards[id(card_data)] = (card_data, card_obj)
+        
+        if use_two_stage:
+            logger.info('Используется двухэтапный процесс генерации урока')
+            lesson_data = self.openrouter_service.analyze_lesson_two_stage(
+                transcript_text, previous_lessons_info, on_card=on_card
+            )
+        else:
+            logger.info('Используется одноэтапный процесс генерации урока')
             try:
-                if os.path.exists(video_file.file_path):
-                    file_size_mb = os.path.getsize(video_file.file_path) / (1024 * 1024)
-                    os.remove(video_file.file_path)
-                    logger.info(f'✅ Видеофайл удален: {video_file.file_path} ({file_size_mb:.2f} MB)')
-                else:
-                    logger.warning(f'⚠️ Видеофайл не найден для удаления: {video_file.file_path}')
+                lesson_data = self.openrouter_service.analyze_lesson_two_stage(
+                    transcript_text, previous_lessons_info, on_card=on_card
+                )
             except Exception as e:
-                logger.error(f'❌ Ошибка при удалении видеофайла {video_file.file_path}: {str(e)}')
-                # Не прерываем выполнение, так как урок уже создан
-            
-            logger.info('')
-            logger.info('=' * 80)
-            logger.info('ОБРАБОТКА ВИДЕО ЗАВЕРШЕНА УСПЕШНО!')
-            logger.info(f'Урок ID: {lesson.id}')
-            logger.info(f'Название: {lesson.title}')
-            logger.info(f'Карточек: {lesson.cards.count()}')
-            logger.info('=' * 80)
-            logger.info('')
-            sys.stdout.flush()
-            return lesson
+                logger.warning(f'Двухэтапный процесс не удался: {e}. Пробуем одноэтапный...')
+                lesson_data = self.openrouter_service.analyze_lesson(transcript_text, previous_lessons_info)
+        task.lesson_data = lesson_data
+    
+    def persist_stage(self, task):
+        """Этап 4: сохранение урока и карточек, удаление видеофайла"""
+        video_file = task.video_file
+        filtered_text = self._filter_transcript(task.transcript_text)
+        lesson = self._create_lesson_from_ai_response(
+            video_file, filtered_text, task.lesson_data, task.force_recreate, task.prepared_cards
+        )
+        self._update_video(
+            task,
+            release=True,
+            status='done',
+            processing_status='done',
+            processing_message=f'Урок создан: {lesson.title}',
+            processed_at=timezone.now(),
+        )
+        
+        # Удаляем видеофайл после успешной обработки для экономии места
+        try:
+            if os.path.exists(video_file.file_path):
+                file_size_mb = os.path.getsize(video_file.file_path) / (1024 * 1024)
+                os.remove(video_file.file_path)
+                logger.info(f'✅ Видеофайл удален: {video_file.file_path} ({file_size_mb:.2f} MB)')
+            else:
+                logger.warning(f'⚠️ Видеофайл не найден для удаления: {video_file.file_path}')
         except Exception as e:
-            logger.error(f'Ошибка обработки видео {video_file.id}: {str(e)}', exc_info=True)
-            video_file.status = 'error'
-            video_file.processing_status = 'error'
-            video_file.processing_message = f'Ошибка: {str(e)}'
-            video_file.error_message = str(e)
-            video_file.save()
-            raise
+            logger.error(f'❌ Ошибка при удалении видеофайла {video_file.file_path}: {str(e)}')
+            # Не прерываем выполнение, так как урок уже создан
+        
+        logger.info('')
+        logger.info('=' * 80)
+        logger.info('ОБРАБОТКА ВИДЕО ЗАВЕРШЕНА УСПЕШНО!')
+        logger.info(f'Урок ID: {lesson.id}')
+        logger.info(f'Название: {lesson.title}')
+        logger.info(f'Карточек: {lesson.cards.count()}')
+        logger.info('=' * 80)
+        logger.info('')
+        task.lesson = lesson
+    
+    def fail_task(self, task, error):
+        video_file = task.video_file
+        logger.error(f'Ошибка обработки видео {video_file.id}: {str(error)}', exc_info=error)
+        self._update_video(
+            task,
+            release=True,
+            status='error',
+            processing_status='error',
+            processing_message=f'Ошибка: {str(error)}',
+            error_message=str(error),
+        )
+    
+    def _update_video(self, task, release=False, **fields):
+        """Записать поля видео условным UPDATE по аренде (release — освободить видео)"""
+        video_file = task.video_file
+        for name, value in fields.items():
+            setattr(video_file, name, value)
+        if release:
+            video_file.lease_owner = None
+            video_file.lease_expires_at = None
+            return release_video(video_file.id, task.owner, **fields)
+        return update_leased(video_file.id, task.owner, **fields)
     
     def _filter_transcript(self, text):
         import re
@@ -150,11 +273,17 @@ class VideoProcessor:
             })
         return lessons_info
     
-    def _create_lesson_from_ai_response(self, video_file, transcript_text, lesson_data, force_recreate=False):
+    @transaction.atomic
+    def _create_lesson_from_ai_response(self, video_file, transcript_text, lesson_data, force_recreate=False,
+                                        prepared_cards=None):
+        """Создать урок, карточки и сводку урока одной транзакцией"""
         if force_recreate and hasattr(video_file, 'lesson'):
             old_lesson = video_file.lesson
             logger.info(f'Удаление старого урока {old_lesson.id} для пересоздания')
+            learners = learners_of_lessons([old_lesson.id])
             old_lesson.delete()
+            # Ответы на карточки старого урока удалены каскадом
+            rebuild_avatar_scores(learners)
         if not force_recreate and hasattr(video_file, 'lesson'):
             logger.warning(f'Урок для видео {video_file.id} уже существует')
             return video_file.lesson
@@ -183,60 +312,26 @@ class VideoProcessor:
             logger.error(f'topics_data: {topics_data}')
             logger.error(f'cards_data (из lesson_data): {lesson_data.get("cards", [])}')
             logger.error(f'lessonTitle: {lesson_data.get("lessonTitle")}')
-            sys.stdout.flush()
             raise ValueError(f'Нет карточек для создания урока. Модель должна возвращать карточки согласно промпту.')
         logger.info(f'Создание {len(cards_data)} карточек для урока {lesson.id}...')
         logger.info(f'Урок: {lesson.title}')
         logger.info(f'Видео: {video_file.file_name}')
-        sys.stdout.flush()
         
         # Оптимизация: подготавливаем все карточки для bulk создания
         cards_to_create = []
         skipped_cards_count = 0
         
         for index, card_data in enumerate(cards_data):
-            if not isinstance(card_data, dict):
-                logger.warning(f'Карточка {index} не является словарём: {type(card_data)}')
-                skipped_cards_count += 1
-                continue
-            
-            card_type = card_data.get('cardType', 'repeat')
-            cleaned_data = clean_card_data(card_data)
-            question_text = cleaned_data.get('question_text', '') or ''
-            prompt_text = cleaned_data.get('prompt_text', '') or ''
-            correct_answer = cleaned_data.get('correct_answer', '') or ''
-            has_content = (question_text and question_text.strip()) or (prompt_text and prompt_text.strip()) or (correct_answer and correct_answer.strip())
-            
-            if not has_content:
-                logger.warning(f'Карточка {index} (тип: {card_type}) не имеет контента, пропускаем')
+            prepared = prepared_cards.get(id(card_data)) if prepared_cards else None
+            if prepared is not None and prepared[0] is card_data:
+                card_obj = prepared[1]
+            else:
+                card_obj = self._build_card(card_data, index)
+            if card_obj is None:
                 skipped_cards_count += 1
                 continue
-            
-            if not question_text or not question_text.strip():
-                question_text = prompt_text or correct_answer or 'Exercise'
-                cleaned_data['question_text'] = question_text
-            
-            extra_data = card_data.get('extraData') or {}
-            extra_data = prepare_spelling_card(card_data, extra_data)
-            extra_data = prepare_repeat_card(card_data, extra_data, question_text)
-            
-            # Подготавливаем объект карточки для bulk создания
-            from lessons.models import ExerciseCard
-            card_obj = ExerciseCard(
-                lesson=lesson,
-                card_type=card_data.get('cardType', 'repeat'),
-                question_text=cleaned_data['question_text'],
-                prompt_text=cleaned_data['prompt_text'],
-                correct_answer=cleaned_data['correct_answer'],
-                options=card_data.get('options'),
-                extra_data=extra_data if extra_data else None,
-                icon_name=card_data.get('iconName'),
-                translation_text=cleaned_data['translation_text'],
-                hint_text=cleaned_data['hint_text'],
-                topic=card_data.get('topic'),
-                order_index=card_data.get('orderIndex', index),
-                is_repetition_card=card_data.get('isReview', False)
-            )
+            card_obj.lesson = lesson
+            card_obj.order_index = card_data.get('orderIndex', index)
             cards_to_create.append(card_obj)
         
         # Оптимизация: bulk создание всех карточек одним запросом
@@ -251,7 +346,50 @@ class VideoProcessor:
         if created_cards_count == 0:
             logger.error(f'КРИТИЧЕСКАЯ ОШИБКА: Не создано ни одной карточки для урока {lesson.id}!')
             logger.error(f'Это означает, что все карточки были пропущены из-за ошибок')
-            sys.stdout.flush()
             raise ValueError(f'Не удалось создать ни одной карточки для урока. Все {len(cards_data)} карточек были пропущены.')
-        sys.stdout.flush()
+        save_summary(lesson.id, [(card.topic, card.card_type) for card in cards_to_create])
         return lesson
+    
+    def _build_card(self, card_data, index):
+        """
+        Подготовить объект ExerciseCard из данных ИИ (без урока и order_index)
+        
+        Returns:
+            ExerciseCard или None, если карточку нужно пропустить
+        """
+        if not isinstance(card_data, dict):
+            logger.warning(f'Карточка {index} не является словарём: {type(card_data)}')
+            return None
+        
+        card_type = card_data.get('cardType', 'repeat')
+        cleaned_data = clean_card_data(card_data)
+        question_text = cleaned_data.get('question_text', '') or ''
+        prompt_text = cleaned_data.get('prompt_text', '') or ''
+        correct_answer = cleaned_data.get('correct_answer', '') or ''
+        has_content = (question_text and question_text.strip()) or (prompt_text and prompt_text.strip()) or (correct_answer and correct_answer.strip())
+        
+        if not has_content:
+            logger.warning(f'Карточка {index} (тип: {card_type}) не имеет контента, пропускаем')
+            return None
+        
+        if not question_text or not question_text.strip():
+            question_text = prompt_text or correct_answer or 'Exercise'
+            cleaned_data['question_text'] = question_text
+        
+        extra_data = card_data.get('extraData') or {}
+        extra_data = prepare_spelling_card(card_data, extra_data)
+        extra_data = prepare_repeat_card(card_data, extra_data, question_text)
+        
+        return ExerciseCard(
+            card_type=card_type,
+            question_text=cleaned_data['question_text'],
+            prompt_text=cleaned_data['prompt_text'],
+            correct_answer=cleaned_data['correct_answer'],
+            options=card_data.get('options'),
+            extra_data=extra_data if extra_data else None,
+            icon_name=card_data.get('iconName'),
+            translation_text=cleaned_data['translation_text'],
+            hint_text=cleaned_data['hint_text'],
+            topic=card_data.get('topic'),
+            is_repetition_card=card_data.get('isReview', False)
+        )
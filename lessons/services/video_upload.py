@@ -0,0 +1,263 @@
+"""
+Возобновляемая загрузка видео по частям
+
+Протокол: init (имя, размер, необязательный SHA-256) → запись диапазонов байт
+в любом порядке (повтор диапазона безопасен) → finalize с проверкой
+контрольной суммы. Файл загрузки создаётся сразу нужного размера, поэтому
+нехватка места обнаруживается при init, а не на последнем гигабайте.
+После finalize файл перемещается в WATCHED_VIDEO_DIRECTORY, дубликаты по
+SHA-256 не создают новых VideoFile, а новое видео ставится в очередь обработки.
+"""
+import os
+import uuid
+import hashlib
+import logging
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from lessons.models import VideoFile, VideoUpload
+from lessons.services.job_queue import enqueue_video
+from lessons.services.video_watcher import VideoFileHandler
+
+logger = logging.getLogger(__name__)
+
+COPY_BLOCK_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    """Ошибка загрузки с HTTP-статусом для ответа клиенту"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def get_upload_directory():
+    # По умолчанию — скрытая папка внутри WATCHED_VIDEO_DIRECTORY: тот же диск,
+    # поэтому finalize перемещает файл без копирования
+    directory = getattr(settings, 'VIDEO_UPLOAD_DIRECTORY', None) or os.path.join(
+        settings.WATCHED_VIDEO_DIRECTORY, '.uploads'
+    )
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def part_path(upload):
+    return os.path.join(get_upload_directory(), f'{upload.upload_id}.part')
+
+
+def clean_file_name(file_name):
+    """Имя файла без каталогов; допускаются только видеоформаты"""
+    name = os.path.basename((file_name or '').replace('\\', '/')).strip()
+    if not name or name in ('.', '..'):
+        raise UploadError('Не указано имя файла')
+    if os.path.splitext(name)[1].lower() not in VideoFileHandler.VIDEO_EXTENSIONS:
+        raise UploadError(f'Неподдерживаемый формат файла: {name}')
+    return name
+
+
+def reserve_video_path(directory, file_name):
+    """
+    Занять свободное имя в папке атомарно (O_EXCL), без перебора os.path.exists
+
+    Если имя занято, к нему добавляется короткий случайный суффикс.
+
+    Returns:
+        str: Путь к созданному пустому файлу
+    """
+    name, ext = os.path.splitext(file_name)
+    candidates = (file_name, f'{name}_{uuid.uuid4().hex[:8]}{ext}')
+    for candidate in candidates:
+        path = os.path.join(directory, candidate)
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return path
+        except FileExistsError:
+            continue
+    raise UploadError(f'Не удалось подобрать имя для файла {file_name}', status=409)
+
+
+def find_duplicate(content_hash):
+    if not content_hash:
+        return None
+    return VideoFile.objects.filter(content_hash=content_hash).order_by('id').first()
+
+
+def _preallocate(path, size):
+    with open(path, 'wb') as f:
+        if hasattr(os, 'posix_fallocate'):
+            os.posix_fallocate(f.fileno(), 0, size)
+        else:
+            f.truncate(size)
+
+
+def create_upload(file_name, total_size, sha256=None):
+    """
+    Начать загрузку
+
+    Returns:
+        tuple: (VideoUpload или None, VideoFile-дубликат или None).
+        Если заявленный SHA-256 уже есть в БД, загружать файл не нужно.
+    """
+    file_name = clean_file_name(file_name)
+    try:
+        total_size = int(total_size)
+    except (TypeError, ValueError):
+        raise UploadError('Некорректный размер файла')
+    if total_size <= 0:
+        raise UploadError('Пустой файл')
+    sha256 = (sha256 or '').lower() or None
+
+    duplicate = find_duplicate(sha256)
+    if duplicate:
+        logger.info(f'Загрузка {file_name} не нужна: видео уже есть (VideoFile {duplicate.id})')
+        return None, duplicate
+
+    upload = VideoUpload.objects.create(file_name=file_name, total_size=total_size, sha256=sha256)
+    try:
+        _preallocate(part_path(upload), total_size)
+    except OSError as e:
+        upload.delete()
+        raise UploadError(f'Недостаточно места для файла {file_name}: {e}', status=507)
+    logger.info(f'Начата загрузка {upload.upload_id}: {file_name} ({total_size} байт)')
+    return upload, None
+
+
+def merge_range(ranges, start, end):
+    """Добавить [start, end) к отсортированным непересекающимся диапазонам"""
+    merged = []
+    for range_start, range_end in sorted(ranges + [[start, end]]):
+        if merged and range_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], range_end)
+        else:
+            merged.append([range_start, range_end])
+    return merged
+
+
+def write_range(upload, start, stream, length):
+    """
+    Записать диапазон байт из потока запроса
+
+    Записанное до обрыва соединения тоже учитывается, поэтому клиент
+    продолжает с первого отсутствующего байта.
+
+    Returns:
+        VideoUpload: Загрузка с обновлёнными диапазонами
+    """
+    if upload.status != 'uploading':
+        raise UploadError('Загрузка уже завершена', status=409)
+    if start < 0 or length <= 0 or start + length > upload.total_size:
+        raise UploadError('Диапазон выходит за размер файла', status=416)
+
+    written = 0
+    try:
+        with open(part_path(upload), 'r+b') as f:
+            f.seek(start)
+            while written < length:
+                block = stream.read(min(COPY_BLOCK_SIZE, length - written))
+                if not block:
+                    break
+                f.write(block)
+                written += len(block)
+    except FileNotFoundError:
+        raise UploadError('Файл загрузки не найден, начните загрузку заново', status=410)
+    finally:
+        if written:
+            _record_range(upload, start, start + written)
+    if written < length:
+        raise UploadError(f'Получено {written} из {length} байт диапазона')
+    return upload
+
+
+def _record_range(upload, start, end):
+    # Части могут приходить параллельно: диапазоны объединяются под блокировкой строки
+    with transaction.atomic():
+        locked = VideoUpload.objects.select_for_update().get(pk=upload.pk)
+        locked.received_ranges = merge_range(locked.received_ranges, start, end)
+        locked.save(update_fields=['received_ranges', 'updated_at'])
+    upload.received_ranges = locked.received_ranges
+
+
+def _file_sha256(path):
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
+
+def finalize_upload(upload, sha256=None):
+    """
+    Завершить загрузку: проверить полноту и SHA-256, переместить файл в папку
+    с видео, создать VideoFile (или найти дубликат) и поставить видео в очередь
+
+    Строка загрузки блокируется на всё время finalize: повторный (двойной клик,
+    ретрай клиента) запрос ждёт первый и возвращает уже готовый результат.
+
+    Returns:
+        tuple: (VideoFile, created, VideoProcessingJob или None)
+    """
+    with transaction.atomic():
+        upload = VideoUpload.objects.select_for_update().select_related('video').get(pk=upload.pk)
+        if upload.status == 'done':
+            return upload.video, False, None
+        if not upload.is_complete:
+            raise UploadError(
+                f'Файл загружен не полностью: {upload.received_bytes} из {upload.total_size} байт',
+                status=409,
+            )
+
+        path = part_path(upload)
+        try:
+            content_hash = _file_sha256(path)
+        except FileNotFoundError:
+            raise UploadError('Файл загрузки не найден, начните загрузку заново', status=410)
+        expected = (sha256 or upload.sha256 or '').lower()
+        if expected and expected != content_hash:
+            # Диапазоны сбрасываются: клиент загружает файл заново в тот же файл.
+            # Ошибка возвращается после фиксации транзакции, чтобы сброс не откатился
+            upload.received_ranges = []
+            upload.save(update_fields=['received_ranges', 'updated_at'])
+        else:
+            return _store_upload(upload, path, content_hash)
+    raise UploadError('Контрольная сумма не совпадает, загрузите файл заново', status=422)
+
+
+def _store_upload(upload, path, content_hash):
+    """Переместить проверенный файл к видео (или удалить дубликат) и отметить загрузку завершённой"""
+    video_file = find_duplicate(content_hash)
+    created = video_file is None
+    if created:
+        target_path = reserve_video_path(settings.WATCHED_VIDEO_DIRECTORY, upload.file_name)
+        try:
+            os.replace(path, target_path)
+        except OSError:
+            # Пустой файл-заглушка не должен остаться в папке с видео
+            os.remove(target_path)
+            raise
+        video_file = _register_upload(target_path, upload.total_size, content_hash)
+    else:
+        os.remove(path)
+        logger.info(f'Загрузка {upload.upload_id} совпадает с VideoFile {video_file.id}, дубликат удалён')
+
+    upload.status = 'done'
+    upload.video = video_file
+    upload.save(update_fields=['status', 'video', 'updated_at'])
+
+    job = None
+    if created:
+        job, _ = enqueue_video(video_file)
+    return video_file, created, job
+
+
+def _register_upload(file_path, file_size, content_hash):
+    """VideoFile для загруженного файла (watcher мог успеть зарегистрировать его раньше)"""
+    file_path = os.path.normpath(file_path)
+    try:
+        with transaction.atomic():
+            return VideoFile.objects.create(
+                file_path=file_path,
+                file_name=os.path.basename(file_path),
+                file_size=file_size,
+                content_hash=content_hash,
+                status='pending',
+            )
+    except IntegrityError:
+        VideoFile.objects.filter(file_path=file_path).update(content_hash=content_hash)
+        return VideoFile.objects.get(file_path=file_path)
@@ -2,12 +2,20 @@
 Сервис для мониторинга папки с видеофайлами
 """
 import os
+import time
 import logging
+import threading
+from datetime import datetime
 from pathlib import Path
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Count, Max
+from django.utils import timezone
 from lessons.models import VideoFile
+from lessons.services.file_settler import FileSettler
+from lessons.services.video_index import VideoDirectoryIndex
 
 logger = logging.getLogger(__name__)
 
@@ -18,72 +26,128 @@ class VideoFileHandler(FileSystemEventHandler):
     # Поддерживаемые форматы видео
     VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mov', '.mkv', '.flv', '.wmv', '.webm', '.m4v'}
     
+    def __init__(self, settle_seconds=None, batch_window=None):
+        """
+        Args:
+            settle_seconds: Сколько секунд размер и mtime файла не должны меняться,
+                чтобы файл считался дописанным
+            batch_window: Как часто проверять файлы и регистрировать дописанные одной вставкой
+        """
+        super().__init__()
+        if settle_seconds is None:
+            settle_seconds = getattr(settings, 'VIDEO_WATCH_SETTLE_SECONDS', 5)
+        self.batch_window = batch_window or getattr(settings, 'VIDEO_WATCH_BATCH_WINDOW', 2)
+        self.settler = FileSettler(settle_seconds)
+        self._stop_event = threading.Event()
+        self._thread = None
+    
+    def is_video(self, path):
+        return Path(path).suffix.lower() in self.VIDEO_EXTENSIONS
+    
     def on_created(self, event):
         """Обработка события создания файла"""
+        if not event.is_directory and self.is_video(event.src_path):
+            logger.info(f'Обнаружен новый видеофайл: {event.src_path}')
+            self.settler.track(event.src_path)
+    
+    def on_modified(self, event):
+        """Файл дописывается: таймер ожидания окончания записи начинается заново"""
+        if not event.is_directory and self.is_video(event.src_path):
+            self.settler.track(event.src_path)
+    
+    def on_moved(self, event):
+        """Переименование (например, .part → .mp4 после загрузки по SFTP)"""
         if event.is_directory:
             return
+        self.settler.forget(event.src_path)
+        if self.is_video(event.dest_path):
+            logger.info(f'Обнаружен перемещённый видеофайл: {event.dest_path}')
+            self.settler.track(event.dest_path)
+    
+    def on_deleted(self, event):
+        if not event.is_directory:
+            self.settler.forget(event.src_path)
+    
+    def start(self):
+        """Запуск фоновой регистрации дописанных файлов"""
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='video-file-handler', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+    
+    def _run(self):
+        try:
+            while not self._stop_event.wait(self.batch_window):
+                close_old_connections()
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.error(f'Ошибка регистрации видеофайлов: {str(e)}', exc_info=True)
+        finally:
+            # У потока своё подключение к БД — закрываем его
+            connection.close()
+    
+    def flush(self, now=None):
+        """
+        Зарегистрировать файлы, запись которых завершилась
         
-        file_path = event.src_path
-        file_ext = Path(file_path).suffix.lower()
+        Все файлы, дописанные за окно, регистрируются одним запросом проверки
+        и одной вставкой.
         
-        if file_ext in self.VIDEO_EXTENSIONS:
-            logger.info(f'Обнаружен новый видеофайл: {file_path}')
-            self._process_video_file(file_path)
+        Returns:
+            int: Сколько файлов зарегистрировано
+        """
+        settled = {
+            os.path.normpath(path): (size, ctime)
+            for path, size, ctime in self.settler.pop_settled(now)
+        }
+        if not settled:
+            return 0
+        known_paths = set(
+            VideoFile.objects.filter(file_path__in=list(settled)).values_list('file_path', flat=True)
+        )
+        for path in known_paths:
+            logger.info(f'Видеофайл {path} уже существует в БД, пропускаем')
+        return self.register_files(
+            (path, size, ctime) for path, (size, ctime) in settled.items() if path not in known_paths
+        )
     
-    def _process_video_file(self, file_path):
+    @staticmethod
+    def build_video_file(file_path, file_size, file_ctime):
+        """Несохранённый VideoFile для файла на диске"""
+        video_file = VideoFile(
+            file_path=os.path.normpath(file_path),
+            file_name=os.path.basename(file_path),
+            file_size=file_size,
+            status='pending'
+        )
+        # Используем дату создания файла на диске, а не текущую дату
+        video_file.created_at = timezone.make_aware(datetime.fromtimestamp(file_ctime))
+        return video_file
+    
+    def register_files(self, files):
         """
-        Обработка нового видеофайла
+        Зарегистрировать видеофайлы одной вставкой
         
         Args:
-            file_path: Путь к видеофайлу
+            files: Последовательность (путь, размер, ctime)
+        
+        Returns:
+            int: Сколько записей передано на вставку
         """
-        try:
-            # Проверяем, существует ли файл (иногда событие срабатывает до полной записи)
-            if not os.path.exists(file_path):
-                logger.warning(f'Файл {file_path} ещё не существует, пропускаем')
-                return
-            
-            # Проверяем размер файла (должен быть больше 0)
-            file_size = os.path.getsize(file_path)
-            if file_size == 0:
-                logger.warning(f'Файл {file_path} пустой, пропускаем')
-                return
-            
-            # Проверяем, не обрабатывается ли уже этот файл
-            file_path_normalized = os.path.normpath(file_path)
-            existing_video = VideoFile.objects.filter(file_path=file_path_normalized).first()
-            
-            if existing_video:
-                logger.info(f'Видеофайл {file_path} уже существует в БД, пропускаем')
-                return
-            
-            # Создаём запись в БД (без немедленной обработки)
-            # Используем дату создания файла на диске, а не текущую дату
-            from django.utils import timezone
-            from datetime import datetime
-            
-            file_name = os.path.basename(file_path)
-            # Получаем дату создания файла на диске
-            file_creation_time = os.path.getctime(file_path)
-            file_creation_datetime = timezone.make_aware(
-                datetime.fromtimestamp(file_creation_time)
-            )
-            
-            # Создаём объект без сохранения, чтобы установить created_at
-            video_file = VideoFile(
-                file_path=file_path_normalized,
-                file_name=file_name,
-                file_size=file_size,
-                status='pending'
-            )
-            # Устанавливаем дату создания файла вручную
-            video_file.created_at = file_creation_datetime
-            video_file.save()
-            
-            logger.info(f'Создана запись VideoFile {video_file.id} для {file_path}')
-            
-        except Exception as e:
-            logger.error(f'Ошибка обработки видеофайла {file_path}: {str(e)}', exc_info=True)
+        video_files = [self.build_video_file(*item) for item in files]
+        if not video_files:
+            return 0
+        # ignore_conflicts: файл мог параллельно зарегистрировать другой процесс
+        VideoFile.objects.bulk_create(video_files, ignore_conflicts=True)
+        for video_file in video_files:
+            logger.info(f'Зарегистрирован видеофайл {video_file.file_path}')
+        return len(video_files)
 
 
 class VideoWatcher:
@@ -113,6 +177,7 @@ class VideoWatcher:
         # Рекурсивный обход подпапок с видео
         self.observer.schedule(self.handler, self.directory, recursive=True)
         self.observer.start()
+        self.handler.start()
         
         logger.info(f'Запущен мониторинг папки: {self.directory}')
     
@@ -121,30 +186,74 @@ class VideoWatcher:
         if self.observer:
             self.observer.stop()
             self.observer.join()
+            self.handler.stop()
             logger.info('Мониторинг остановлен')
     
     def process_existing_files(self):
         """
-        Обработка уже существующих файлов в папке
-        (для первоначальной загрузки)
-        """
-        logger.info(f'Обработка существующих файлов в {self.directory}')
+        Регистрация уже существующих файлов в папке
         
-        video_extensions = VideoFileHandler.VIDEO_EXTENSIONS
+        Дерево обходится инкрементально (VideoDirectoryIndex): если ни папки,
+        ни таблица VideoFile не изменились с прошлого обхода, сверка с БД
+        пропускается и вызов стоит один запрос. Иначе известные пути читаются
+        одним запросом, а новые файлы вставляются одним bulk_create.
         
-        for root, _, files in os.walk(self.directory):
-            for file_name in files:
-                file_path = os.path.join(root, file_name)
-                file_ext = Path(file_path).suffix.lower()
-                if file_ext in video_extensions:
-                    file_path_normalized = os.path.normpath(file_path)
-
-                    # Проверяем, не зарегистрирован ли уже файл
-                    existing_video = VideoFile.objects.filter(
-                        file_path=file_path_normalized
-                    ).first()
-
-                    if not existing_video:
-                        logger.info(f'Регистрация существующего файла: {file_path}')
-                        self.handler._process_video_file(file_path)
-
+        Как и в FileSettler, регистрируются только дописанные файлы: mtime
+        не менялся дольше settle_seconds. Файлы, которые ещё копируются,
+        откладываются до следующего вызова.
+        
+        Returns:
+            int: Сколько файлов зарегистрировано
+        """
+        index = VideoDirectoryIndex(self.directory, VideoFileHandler.VIDEO_EXTENSIONS).load()
+        tree_changed = index.scan()
+        db_state = self._db_state()
+        if not tree_changed and db_state == index.db_state:
+            return 0
+        
+        logger.info(f'Обработка существующих файлов в {self.directory}')
+        known_paths = set(VideoFile.objects.values_list('file_path', flat=True))
+        new_files = []
+        unsettled = 0
+        now = time.time()
+        for item in index.files():
+            path = os.path.normpath(item.path)
+            if not item.size or path in known_paths:
+                continue
+            # mtime папки не меняется, пока файл дописывается, поэтому данные индекса
+            # могут быть устаревшими — новый файл проверяется отдельным stat
+            settled = self._settled_file(path, now)
+            if settled:
+                new_files.append((path, *settled))
+            else:
+                unsettled += 1
+        registered = self.handler.register_files(new_files)
+        if registered:
+            logger.info(f'Зарегистрировано существующих файлов: {registered}')
+            db_state = self._db_state()
+        if unsettled:
+            logger.info(f'Файлов ещё копируется, отложено: {unsettled}')
+            # Без сохранённого состояния БД следующий вызов снова сверит файлы
+            db_state = None
+        index.db_state = db_state
+        try:
+            index.save()
+        except OSError as e:
+            logger.warning(f'Не удалось сохранить индекс видео {index.path}: {e}')
+        return registered
+    
+    def _settled_file(self, path, now):
+        """(размер, ctime) файла, если он не пуст и не менялся settle_seconds, иначе None"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if not stat.st_size or now - stat.st_mtime < self.handler.settler.settle_seconds:
+            return None
+        return stat.st_size, stat.st_ctime
+    
+    @staticmethod
+    def _db_state():
+        """Отпечаток таблицы VideoFile: удаление или добавление записей меняет его"""
+        state = VideoFile.objects.aggregate(count=Count('id'), last_id=Max('id'))
+        return (state['count'], state['last_id'])
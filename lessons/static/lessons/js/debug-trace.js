@@ -0,0 +1,10 @@
+// Отладочная трассировка: события отправляются на сервер, только если включён DEBUG_TRACE_ENABLED
+const debugTrace = (location, message, data = {}) => {
+    if (!window.DEBUG_TRACE_ENABLED) return;
+    fetch('/api/debug/trace/', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ location, message, data }),
+        keepalive: true,
+    }).catch(() => {});
+};
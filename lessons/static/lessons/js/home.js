@@ -362,7 +362,7 @@ const handleProcessAll = async () => {
             return;
         }
         
-        // Обработка запущена, статус будет обновляться через checkProcessingStatus
+        // Обработка запущена, статус будет обновляться через waitProcessingEvents
         // Не ждем завершения, продолжаем отслеживать статус
         button.disabled = false;
         
@@ -397,9 +397,10 @@ const updateUserStats = async () => {
     }
 };
 
-// Отслеживание статуса обработки видео
-let processingStatusInterval = null;
-let lastLogCount = 0;
+// Отслеживание статуса обработки видео (long-poll: сервер отвечает только при изменениях)
+let processingEventsActive = false;
+let processingEventsCursor = null;
+let processingEventsState = '';
 
 const updateLogsDisplay = (logs) => {
     const logsContainer = document.getElementById('processing-logs');
@@ -410,11 +411,8 @@ const updateLogsDisplay = (logs) => {
     if (logs && logs.length > 0) {
         logsContainer.style.display = 'block';
         
-        // Показываем только новые логи
-        const newLogs = logs.slice(lastLogCount);
-        lastLogCount = logs.length;
-        
-        newLogs.forEach(log => {
+        // Сервер присылает только логи после курсора
+        logs.forEach(log => {
             const logLine = document.createElement('div');
             logLine.style.marginBottom = '4px';
             logLine.style.padding = '2px 0';
@@ -446,69 +444,74 @@ const updateLogsDisplay = (logs) => {
     }
 };
 
-const checkProcessingStatus = async () => {
-    try {
-        const response = await fetch('/api/videos/processing_status/');
-        if (!response.ok) return;
-        
-        const data = await response.json();
-        const statusEl = document.getElementById('status');
+const applyProcessingStatus = (data) => {
+    const statusEl = document.getElementById('status');
+    
+    if (data.is_processing && statusEl) {
+        let statusText = '';
+        if (data.current_video) {
+            const msg = data.current_video.processing_message || '';
+            statusText = `Идет обработка видео ${data.current_video.index}/${data.current_video.total}: ${data.current_video.file_name}`;
+            if (msg) {
+                statusText += ` - ${msg}`;
+            }
+        } else if (data.processing > 0) {
+            statusText = `Идет обработка... (обработано: ${data.done}/${data.total_videos})`;
+        } else if (data.pending > 0) {
+            statusText = `Ожидание обработки... (в очереди: ${data.pending})`;
+        }
         
-        // Обновляем логи
-        if (data.logs) {
-            updateLogsDisplay(data.logs);
+        if (statusText) {
+            statusEl.textContent = statusText;
+            statusEl.style.color = '#667eea';
+            statusEl.style.fontWeight = '600';
         }
         
-        if (data.is_processing && statusEl) {
-            let statusText = '';
-            if (data.current_video) {
-                const msg = data.current_video.processing_message || '';
-                statusText = `Идет обработка видео ${data.current_video.index}/${data.current_video.total}: ${data.current_video.file_name}`;
-                if (msg) {
-                    statusText += ` - ${msg}`;
-                }
-            } else if (data.processing > 0) {
-                statusText = `Идет обработка... (обработано: ${data.done}/${data.total_videos})`;
-            } else if (data.pending > 0) {
-                statusText = `Ожидание обработки... (в очереди: ${data.pending})`;
-            }
-            
-            if (statusText) {
-                statusEl.textContent = statusText;
-                statusEl.style.color = '#667eea';
-                statusEl.style.fontWeight = '600';
+        // Обновляем список уроков, если появились новые
+        if (data.done > 0) {
+            loadLessons();
+        }
+    } else if (statusEl && !statusEl.textContent.includes('Ошибка') && !statusEl.textContent.includes('успешно')) {
+        // Если обработка завершена и нет сообщения об ошибке/успехе, очищаем статус
+        if (data.done === data.total_videos && data.total_videos > 0) {
+            statusEl.textContent = '';
+        }
+    }
+};
+
+const waitProcessingEvents = async () => {
+    while (processingEventsActive) {
+        try {
+            const params = new URLSearchParams({ state: processingEventsState });
+            if (processingEventsCursor !== null) {
+                params.set('cursor', processingEventsCursor);
             }
+            const response = await fetch(`/api/videos/events/?${params}`);
+            // 204 — за время ожидания ничего не изменилось
+            if (response.status === 204) continue;
+            if (!response.ok) throw new Error(`HTTP ${response.status}`);
             
-            // Обновляем список уроков, если появились новые
-            if (data.done > 0) {
-                loadLessons();
-            }
-        } else if (statusEl && !statusEl.textContent.includes('Ошибка') && !statusEl.textContent.includes('успешно')) {
-            // Если обработка завершена и нет сообщения об ошибке/успехе, очищаем статус
-            if (data.done === data.total_videos && data.total_videos > 0) {
-                statusEl.textContent = '';
-            }
+            const data = await response.json();
+            processingEventsCursor = data.cursor;
+            processingEventsState = data.state;
+            updateLogsDisplay(data.logs);
+            applyProcessingStatus(data.status);
+        } catch (error) {
+            console.error('Ошибка получения событий обработки:', error);
+            await new Promise(resolve => setTimeout(resolve, 3000));
         }
-    } catch (error) {
-        console.error('Ошибка проверки статуса обработки:', error);
     }
 };
 
 const startProcessingStatusCheck = () => {
-    // Проверяем статус каждые 3 секунды
-    if (processingStatusInterval) {
-        clearInterval(processingStatusInterval);
-    }
-    processingStatusInterval = setInterval(checkProcessingStatus, 3000);
-    // Проверяем сразу
-    checkProcessingStatus();
+    // Одно ожидающее соединение на страницу
+    if (processingEventsActive) return;
+    processingEventsActive = true;
+    waitProcessingEvents();
 };
 
 const stopProcessingStatusCheck = () => {
-    if (processingStatusInterval) {
-        clearInterval(processingStatusInterval);
-        processingStatusInterval = null;
-    }
+    processingEventsActive = false;
 };
 
 const initHomePage = () => {
@@ -546,7 +549,6 @@ const initHomePage = () => {
             const logsContent = document.getElementById('logs-content');
             if (logsContent) {
                 logsContent.innerHTML = '';
-                lastLogCount = 0;
             }
         });
     }
@@ -596,7 +598,7 @@ const handleRecreateAllLessons = async () => {
             return;
         }
         
-        // Пересоздание запущено, статус будет обновляться через checkProcessingStatus
+        // Пересоздание запущено, статус будет обновляться через waitProcessingEvents
         // Не ждем завершения, продолжаем отслеживать статус
         button.disabled = false;
         
@@ -0,0 +1,93 @@
+import os
+import time
+import shutil
+import tempfile
+from unittest import mock
+from django.test import TestCase
+from lessons.services.ai_client import AIClient
+from lessons.services.ai_response_cache import AIResponseCache
+
+
+def api_result(content, finish_reason='stop'):
+    return {'choices': [{'message': {'content': content}, 'finish_reason': finish_reason}]}
+
+
+class AIResponseCacheTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = AIResponseCache(self.directory, max_entries=3, max_age_seconds=3600)
+        self.messages = [
+            {'role': 'system', 'content': 'system'},
+            {'role': 'user', 'content': 'user'},
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_key_depends_on_all_parameters(self):
+        key = self.cache.make_key('model', self.messages, 4000, 0.7)
+        self.assertEqual(key, self.cache.make_key('model', list(self.messages), 4000, 0.7))
+        self.assertNotEqual(key, self.cache.make_key('other', self.messages, 4000, 0.7))
+        self.assertNotEqual(key, self.cache.make_key('model', self.messages, 6000, 0.7))
+        self.assertNotEqual(key, self.cache.make_key('model', self.messages, 4000, 0.2))
+        self.assertNotEqual(key, self.cache.make_key('model', self.messages[:1], 4000, 0.7))
+
+    def test_put_and_get(self):
+        self.assertIsNone(self.cache.get('ab' * 32))
+        self.cache.put('ab' * 32, api_result('{}'))
+        self.assertEqual(self.cache.get('ab' * 32), api_result('{}'))
+
+    def test_expired_entry_is_removed(self):
+        key = 'cd' * 32
+        self.cache.put(key, api_result('{}'))
+        old = time.time() - 7200
+        os.utime(self.cache.path_for(key), (old, old))
+        self.assertIsNone(self.cache.get(key))
+        self.assertFalse(os.path.exists(self.cache.path_for(key)))
+
+    def test_oldest_entries_evicted_over_limit(self):
+        keys = [f'{i:02d}' * 32 for i in range(5)]
+        for index, key in enumerate(keys):
+            self.cache.put(key, api_result(str(index)))
+            mtime = time.time() - 100 + index
+            os.utime(self.cache.path_for(key), (mtime, mtime))
+        self.cache.prune()
+        self.assertEqual([self.cache.get(key) is not None for key in keys], [False, False, True, True, True])
+
+    def test_prune_runs_every_n_writes(self):
+        cache = AIResponseCache(self.directory, max_entries=3, max_age_seconds=3600, prune_every=3)
+        with mock.patch.object(cache, 'prune') as prune:
+            for index in range(7):
+                cache.put(f'{index:02d}' * 32, api_result(str(index)))
+        # Первая запись и затем каждая третья
+        self.assertEqual(prune.call_count, 3)
+
+
+class AIClientCacheTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.client = AIClient('key', 'model', 'https://api.test', use_cache=False)
+        self.client.cache = AIResponseCache(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _response(self, content):
+        response = mock.Mock()
+        response.json.return_value = api_result(content)
+        return response
+
+    @mock.patch('lessons.services.ai_client.post_with_retry')
+    def test_repeated_call_served_from_cache(self, post):
+        post.return_value = self._response('{"cards": [{"cardType": "single_choice"}]}')
+        first = self.client.generate_cards('system', 'user')
+        second = self.client.generate_cards('system', 'user')
+        self.assertEqual(first, second)
+        self.assertEqual(post.call_count, 1)
+
+    @mock.patch('lessons.services.ai_client.post_with_retry')
+    def test_bypass_flag_skips_cache(self, post):
+        post.return_value = self._response('{"topics": []}')
+        self.client.analyze_transcript('system', 'user')
+        self.client.analyze_transcript('system', 'user', bypass_cache=True)
+        self.assertEqual(post.call_count, 2)
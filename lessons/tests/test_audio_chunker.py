@@ -0,0 +1,74 @@
+import numpy as np
+from django.test import TestCase
+from lessons.services.audio_chunker import StreamChunker, pcm_to_float32, split_on_silence, stitch_segments
+
+
+class SplitOnSilenceTest(TestCase):
+    def _speech(self, seconds, sample_rate=1000):
+        return np.full(int(seconds * sample_rate), 0.5, dtype=np.float32)
+
+    def _silence(self, seconds, sample_rate=1000):
+        return np.zeros(int(seconds * sample_rate), dtype=np.float32)
+
+    def test_short_audio_is_single_chunk(self):
+        samples = self._speech(5)
+        self.assertEqual(split_on_silence(samples, 1000, max_chunk_seconds=10), [(0, 5000)])
+
+    def test_cuts_at_silence(self):
+        samples = np.concatenate([self._speech(8), self._silence(1), self._speech(8)])
+        chunks = split_on_silence(samples, 1000, max_chunk_seconds=10, search_seconds=4, frame_seconds=0.1)
+        self.assertEqual(len(chunks), 2)
+        cut = chunks[0][1]
+        self.assertGreaterEqual(cut, 8000)
+        self.assertLessEqual(cut, 9000)
+        self.assertEqual(chunks[1], (cut, len(samples)))
+
+    def test_hard_cut_with_overlap_without_silence(self):
+        samples = self._speech(25)
+        chunks = split_on_silence(samples, 1000, max_chunk_seconds=10, overlap_seconds=1, frame_seconds=0.1)
+        self.assertEqual(chunks[0], (0, 10000))
+        self.assertEqual(chunks[1][0], 9000)
+        self.assertEqual(chunks[-1][1], 25000)
+        for (_, end), (next_start, _) in zip(chunks, chunks[1:]):
+            self.assertLessEqual(next_start, end)
+
+    def test_stream_feed_matches_whole_audio(self):
+        samples = np.concatenate([self._speech(8), self._silence(1), self._speech(12), self._silence(1), self._speech(5)])
+        kwargs = dict(max_chunk_seconds=10, search_seconds=4, frame_seconds=0.1)
+        chunker = StreamChunker(1000, **kwargs)
+        chunks = []
+        for start in range(0, len(samples), 700):
+            chunks.extend(chunker.feed(samples[start:start + 700]))
+        chunks.extend(chunker.finish())
+        streamed = [(offset, offset + len(chunk)) for offset, chunk in chunks]
+        self.assertEqual(streamed, split_on_silence(samples, 1000, **kwargs))
+
+    def test_pcm_to_float32(self):
+        samples = pcm_to_float32(b'\x00\x40\x00\xc0')
+        self.assertEqual(samples.dtype, np.float32)
+        self.assertEqual(list(samples), [0.5, -0.5])
+        self.assertEqual(list(pcm_to_float32(bytearray(b'\x00\x40\x00\xc0'))), [0.5, -0.5])
+
+
+class StitchSegmentsTest(TestCase):
+    def test_offsets_are_applied(self):
+        text, segments = stitch_segments([
+            {'offset': 0, 'segments': [{'start': 0.0, 'end': 2.0, 'text': ' Hello'}]},
+            {'offset': 10, 'segments': [{'start': 0.5, 'end': 1.5, 'text': ' world'}]},
+        ])
+        self.assertEqual(text, 'Hello world')
+        self.assertEqual(segments[1], {'start': 10.5, 'end': 11.5, 'text': 'world'})
+
+    def test_overlap_is_deduplicated(self):
+        text, segments = stitch_segments([
+            {'offset': 0, 'segments': [
+                {'start': 0.0, 'end': 5.0, 'text': ' It is sunny today'},
+                {'start': 5.0, 'end': 10.0, 'text': ' Let us go outside'},
+            ]},
+            {'offset': 9, 'segments': [
+                {'start': 0.0, 'end': 0.9, 'text': ' outside'},
+                {'start': 0.5, 'end': 3.0, 'text': ' go outside and play'},
+            ]},
+        ])
+        self.assertEqual(text, 'It is sunny today Let us go outside and play')
+        self.assertEqual(segments[-1]['start'], 10.0)
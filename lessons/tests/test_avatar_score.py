@@ -0,0 +1,115 @@
+import io
+import json
+from django.contrib.admin.sites import AdminSite
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, Sum
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from lessons.admin import ExerciseCardAdmin
+from lessons.models import CardAttempt, ExerciseCard, Lesson, UserAvatar, UserProgress, VideoFile
+from lessons.services.video_processor import VideoProcessor
+
+
+class AvatarScoreTests(TestCase):
+    def setUp(self):
+        video = VideoFile.objects.create(file_path='/videos/a.mp4', file_name='a.mp4')
+        self.lesson = Lesson.objects.create(video=video, title='Урок', transcript_text='текст')
+        self.cards = [
+            ExerciseCard.objects.create(lesson=self.lesson, card_type='repeat', question_text='q', prompt_text='p')
+            for _ in range(3)
+        ]
+        self.attempt_id = self.client.post(f'/api/lessons/{self.lesson.id}/start/').json()['attempt_id']
+        self.user_progress = UserProgress.objects.get()
+
+    def _answer(self, card, is_correct):
+        return self.client.post('/api/cards/answer/', data=json.dumps({
+            'attempt_id': self.attempt_id, 'card_id': card.id, 'answer': 'a', 'is_correct': is_correct,
+        }), content_type='application/json').json()
+
+    def _avatar(self):
+        return UserAvatar.objects.get(user_progress=self.user_progress)
+
+    def test_running_totals_match_full_rescan(self):
+        self._answer(self.cards[0], True)                    # 5
+        self._answer(self.cards[1], False)                   # 0
+        self._answer(self.cards[1], True)                    # 3
+        data = self._answer(self.cards[2], True)             # 5
+
+        avatar = self._avatar()
+        self.assertEqual((avatar.score_points, avatar.scored_cards), (13, 3))
+        self.assertAlmostEqual(avatar.total_score, 13 / 3)
+        self.assertAlmostEqual(data['avatar_score'], 13 / 3)
+        self.assertAlmostEqual(avatar.update_score(), 13 / 3)
+
+        # Неправильный ответ убирает карточку из среднего
+        self._answer(self.cards[0], False)
+        avatar = self._avatar()
+        self.assertEqual((avatar.score_points, avatar.scored_cards), (8, 2))
+        self.assertAlmostEqual(avatar.total_score, 4.0)
+
+    def test_score_drops_to_zero_without_scored_cards(self):
+        self._answer(self.cards[0], True)
+        self._answer(self.cards[0], False)
+
+        avatar = self._avatar()
+        self.assertEqual((avatar.score_points, avatar.scored_cards, avatar.total_score), (0, 0, 0.0))
+
+    def test_answer_does_not_rescan_history(self):
+        self._answer(self.cards[0], True)
+
+        with CaptureQueriesContext(connection) as queries:
+            self._answer(self.cards[1], True)
+
+        self.assertFalse([q['sql'] for q in queries if 'SUM(' in q['sql'].upper()])
+        self.assertEqual(self._avatar().scored_cards, 2)
+
+    def test_rebuild_command_backfills_totals(self):
+        self._answer(self.cards[0], True)
+        self._answer(self.cards[1], True)
+        UserAvatar.objects.update(score_points=0, scored_cards=0, total_score=0.0)
+        other = UserAvatar.objects.create(user_progress=UserProgress.objects.create(session_key='other'), total_score=4)
+
+        out = io.StringIO()
+        call_command('rebuild_avatar_scores', '--batch-size', '1', stdout=out)
+
+        avatar = self._avatar()
+        self.assertEqual((avatar.score_points, avatar.scored_cards, avatar.total_score), (10, 2, 5.0))
+        other.refresh_from_db()
+        self.assertEqual(other.total_score, 0.0)
+        self.assertIn('2', out.getvalue())
+
+    def _assert_matches_rescan(self):
+        avatar = self._avatar()
+        totals = CardAttempt.objects.exclude(card_status=0).aggregate(points=Sum('card_status'), cards=Count('id'))
+        points, cards = totals['points'] or 0, totals['cards']
+        self.assertEqual((avatar.score_points, avatar.scored_cards), (points, cards))
+        self.assertAlmostEqual(avatar.total_score, points / cards if cards else 0.0)
+        return avatar
+
+    def test_deleting_cards_and_lessons_rebuilds_totals(self):
+        other_video = VideoFile.objects.create(file_path='/videos/b.mp4', file_name='b.mp4')
+        other_lesson = Lesson.objects.create(video=other_video, title='Другой', transcript_text='текст')
+        other_card = ExerciseCard.objects.create(
+            lesson=other_lesson, card_type='repeat', question_text='q', prompt_text='p'
+        )
+        self._answer(self.cards[0], True)                    # 5
+        self._answer(self.cards[1], False)
+        self._answer(self.cards[1], True)                    # 3
+        self.attempt_id = self.client.post(f'/api/lessons/{other_lesson.id}/start/').json()['attempt_id']
+        self._answer(other_card, False)
+        self._answer(other_card, True)                       # 3
+
+        admin = ExerciseCardAdmin(ExerciseCard, AdminSite())
+        admin.delete_model(RequestFactory().post('/admin/'), self.cards[0])
+        self.assertEqual(self._assert_matches_rescan().scored_cards, 2)
+
+        # Пересоздание урока удаляет старый урок вместе с ответами
+        processor = VideoProcessor.__new__(VideoProcessor)
+        processor._create_lesson_from_ai_response(
+            VideoFile.objects.get(id=self.lesson.video_id), 'текст',
+            {'lessonTitle': 'Новый', 'cards': [{'cardType': 'repeat', 'questionText': 'q', 'promptText': 'p'}]},
+            force_recreate=True,
+        )
+        avatar = self._assert_matches_rescan()
+        self.assertEqual((avatar.score_points, avatar.scored_cards, avatar.total_score), (3, 1, 3.0))
@@ -0,0 +1,103 @@
+import json
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from lessons.models import (
+    CardAttempt, ExerciseCard, Lesson, LessonAttempt, UserAvatar, UserLessonProgress, UserProgress, VideoFile
+)
+
+
+class SubmitCardAnswerTests(TestCase):
+    def setUp(self):
+        video = VideoFile.objects.create(file_path='/videos/a.mp4', file_name='a.mp4')
+        self.lesson = Lesson.objects.create(video=video, title='Урок', transcript_text='текст')
+        self.cards = [
+            ExerciseCard.objects.create(
+                lesson=self.lesson, card_type='repeat', question_text='q', prompt_text='p',
+                hint_text='подсказка', translation_text='перевод', order_index=i,
+            )
+            for i in range(2)
+        ]
+        self.attempt_id = self.client.post(f'/api/lessons/{self.lesson.id}/start/').json()['attempt_id']
+        self.user_progress = UserProgress.objects.get()
+
+    def _answer(self, card, is_correct, attempt_id=None):
+        return self.client.post('/api/cards/answer/', data=json.dumps({
+            'attempt_id': attempt_id or self.attempt_id, 'card_id': card.id, 'answer': 'a', 'is_correct': is_correct,
+        }), content_type='application/json')
+
+    def test_status_experience_and_hint_follow_attempts(self):
+        first = self._answer(self.cards[0], False).json()
+        second = self._answer(self.cards[0], False).json()
+        third = self._answer(self.cards[0], True).json()
+
+        self.assertEqual((first['card_status'], first['show_hint']), (0, False))
+        self.assertEqual((second['show_hint'], second['hint_text']), ('подсказка', 'подсказка'))
+        self.assertEqual((third['card_status'], third['status_color'], third['experience_gained']), (3, 'yellow', 5))
+        self.assertEqual((third['translation_text'], third['attempts_count']), ('перевод', 3))
+
+        # Пересдача жёлтой карточки делает её зелёной
+        fourth = self._answer(self.cards[0], True).json()
+        self.assertEqual((fourth['card_status'], fourth['experience_gained']), (5, 15))
+
+        card_attempt = CardAttempt.objects.get()
+        self.assertEqual((card_attempt.attempts_count, card_attempt.hint_shown), (4, True))
+        self.assertEqual(LessonAttempt.objects.get().correct_cards, 1)
+        progress = UserProgress.objects.get()
+        self.assertEqual((progress.total_experience, fourth['total_experience']), (20, 20))
+        self.assertEqual((progress.correct_answers_count, progress.incorrect_answers_count), (2, 2))
+
+    def test_level_and_counters_are_written_once(self):
+        UserProgress.objects.update(total_experience=190)
+        UserAvatar.objects.create(user_progress=self.user_progress)
+
+        data = self._answer(self.cards[0], True).json()
+
+        progress = UserProgress.objects.get()
+        self.assertEqual((progress.total_experience, progress.current_level), (210, 2))
+        self.assertEqual((data['total_experience'], data['current_level']), (210, 2))
+        self.assertEqual((progress.total_cards_completed, progress.correct_answers_count), (1, 1))
+        self.assertEqual(data['avatar_score'], 5.0)
+
+    def test_repeated_submit_updates_single_card_attempt(self):
+        self._answer(self.cards[0], True)
+        data = self._answer(self.cards[0], True).json()
+
+        self.assertEqual(CardAttempt.objects.count(), 1)
+        self.assertEqual(data['attempts_count'], 2)
+        self.assertEqual(LessonAttempt.objects.get().correct_cards, 1)
+        rollup = UserLessonProgress.objects.get()
+        self.assertEqual((rollup.cards_completed, rollup.card_states[str(self.cards[0].id)]), (1, [3, 2]))
+        avatar = UserAvatar.objects.get()
+        self.assertEqual((avatar.score_points, avatar.scored_cards, data['avatar_score']), (3, 1, 3.0))
+
+    def test_avatar_score_uses_committed_counters(self):
+        self._answer(self.cards[0], True)
+        # Счётчики, изменённые другим запросом до этого ответа
+        UserAvatar.objects.update(score_points=8, scored_cards=2, total_score=4.0)
+
+        data = self._answer(self.cards[1], True).json()
+
+        avatar = UserAvatar.objects.get()
+        self.assertEqual((avatar.score_points, avatar.scored_cards), (13, 3))
+        self.assertAlmostEqual(data['avatar_score'], 13 / 3)
+        self.assertAlmostEqual(avatar.total_score, 13 / 3)
+
+    def test_answer_runs_fixed_number_of_statements(self):
+        self._answer(self.cards[0], False)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self._answer(self.cards[0], True)
+
+        self.assertEqual(response.status_code, 200)
+        statements = [q['sql'] for q in queries if not q['sql'].upper().startswith(('SAVEPOINT', 'RELEASE'))]
+        # Блокировка попытки, карточка с прошлым ответом, ответ, счётчик попытки,
+        # прогресс пользователя, чтение и запись сводки по уроку, чтение и запись персонажа
+        self.assertEqual(len(statements), 9, statements)
+        self.assertFalse([sql for sql in statements if 'SUM(' in sql.upper()])
+
+    def test_missing_attempt_or_card_returns_404(self):
+        self.assertEqual(self._answer(self.cards[0], True, attempt_id=10 ** 6).status_code, 404)
+        missing_card = ExerciseCard(id=10 ** 6)
+        self.assertEqual(self._answer(missing_card, True).status_code, 404)
+        self.assertFalse(CardAttempt.objects.exists())
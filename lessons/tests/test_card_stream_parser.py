@@ -0,0 +1,83 @@
+import json
+import shutil
+import tempfile
+from unittest import mock
+from django.test import TestCase
+from lessons.services.ai_client import AIClient
+from lessons.services.ai_response_cache import AIResponseCache
+from lessons.services.card_stream_parser import CardStreamParser
+
+RESPONSE = json.dumps({
+    'topic': 'animals',
+    'cards': [
+        {'cardType': 'single_choice', 'questionText': 'Cat {or} dog?', 'options': ['cat', 'dog']},
+        {'cardType': 'spelling', 'questionText': 'Say "hello"', 'extraData': {'words': ['a', 'b']}},
+    ],
+})
+
+
+class CardStreamParserTest(TestCase):
+    def test_cards_emitted_as_objects_close(self):
+        parser = CardStreamParser()
+        emitted = []
+        for index in range(0, len(RESPONSE), 7):
+            emitted.append(parser.feed(RESPONSE[index:index + 7]))
+        cards = [card for batch in emitted for card in batch]
+        self.assertEqual(cards, json.loads(RESPONSE)['cards'])
+        # Первая карточка отдаётся до конца ответа
+        first_batch = next(i for i, batch in enumerate(emitted) if batch)
+        self.assertLess(first_batch, len(emitted) - 1)
+
+    def test_truncated_tail_is_dropped(self):
+        parser = CardStreamParser()
+        parser.feed('```json\n' + RESPONSE[:RESPONSE.index('Say') + 5])
+        self.assertEqual(len(parser.cards), 1)
+        self.assertEqual(parser.cards[0]['cardType'], 'single_choice')
+
+    def test_trailing_comma_inside_card(self):
+        parser = CardStreamParser()
+        parser.feed('{"cards": [{"cardType": "repeat", "questionText": "Hi",}]}')
+        self.assertEqual(parser.cards, [{'cardType': 'repeat', 'questionText': 'Hi'}])
+
+
+class GenerateCardsStreamTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.client = AIClient('key', 'model', 'https://api.test', use_cache=False)
+        self.client.cache = AIResponseCache(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _sse_response(self, content, finish_reason='stop'):
+        lines = [': OPENROUTER PROCESSING', '']
+        for index in range(0, len(content), 10):
+            event = {'choices': [{'delta': {'content': content[index:index + 10]}, 'finish_reason': None}]}
+            lines += [f'data: {json.dumps(event)}', '']
+        lines += [f'data: {json.dumps({"choices": [{"delta": {}, "finish_reason": finish_reason}]})}', '', 'data: [DONE]']
+        response = mock.MagicMock()
+        response.encoding = 'utf-8'
+        response.iter_lines.return_value = iter(lines)
+        response.__enter__.return_value = response
+        return response
+
+    @mock.patch('lessons.services.ai_client.post_with_retry')
+    def test_cards_handed_over_while_streaming_and_cached(self, post):
+        post.return_value = self._sse_response(RESPONSE)
+        received = []
+        cards = self.client.generate_cards_stream('system', 'user', on_card=received.append)
+        self.assertEqual(cards, json.loads(RESPONSE)['cards'])
+        self.assertEqual(received, cards)
+        self.assertTrue(post.call_args.kwargs['stream'])
+        self.assertTrue(post.call_args.kwargs['json']['stream'])
+
+        replayed = []
+        self.assertEqual(self.client.generate_cards_stream('system', 'user', on_card=replayed.append), cards)
+        self.assertEqual(replayed, cards)
+        self.assertEqual(post.call_count, 1)
+
+    @mock.patch('lessons.services.ai_client.post_with_retry')
+    def test_truncated_stream_keeps_complete_cards(self, post):
+        post.return_value = self._sse_response(RESPONSE[:RESPONSE.index('Say')], finish_reason='length')
+        cards = self.client.generate_cards_stream('system', 'user')
+        self.assertEqual(len(cards), 1)
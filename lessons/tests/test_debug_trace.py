@@ -0,0 +1,82 @@
+import os
+import json
+import shutil
+import tempfile
+from django.test import SimpleTestCase, override_settings
+from lessons.services import debug_trace
+from lessons.services.debug_trace import TraceWriter
+
+
+class DebugTraceTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'trace', 'debug.log')
+        self.writer = TraceWriter(path=self.path, flush_interval=60)
+        self._previous = TraceWriter._instance
+        TraceWriter._instance = self.writer
+
+    def tearDown(self):
+        self.writer.stop()
+        TraceWriter._instance = self._previous
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _events(self):
+        self.writer.flush()
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    @override_settings(DEBUG_TRACE_ENABLED=False)
+    def test_disabled_writes_nothing(self):
+        debug_trace.trace('событие', location='test', value=1)
+        with debug_trace.span('этап') as span:
+            span.event('внутри')
+
+        self.assertIs(debug_trace.span('этап'), debug_trace._NULL_SPAN)
+        self.assertEqual(self._events(), [])
+
+    @override_settings(DEBUG_TRACE_ENABLED=True, DEBUG_TRACE_SAMPLE_RATE=1.0)
+    def test_events_and_spans_are_written_as_json_lines(self):
+        debug_trace.trace('событие', location='test', value=1)
+        with debug_trace.span('этап', location='test', video_id=5) as span:
+            span.event('внутри', step=2)
+        with self.assertRaises(ValueError):
+            with debug_trace.span('ошибка', location='test'):
+                raise ValueError('сломалось')
+
+        events = self._events()
+        self.assertEqual(
+            [(event['kind'], event['message']) for event in events],
+            [('event', 'событие'), ('start', 'этап'), ('event', 'внутри'), ('end', 'этап'),
+             ('start', 'ошибка'), ('end', 'ошибка')],
+        )
+        self.assertEqual(events[0]['data'], {'value': 1})
+        self.assertEqual(events[1]['data'], {'video_id': 5})
+        self.assertEqual(events[1]['span'], events[3]['span'])
+        self.assertIn('duration_ms', events[3])
+        self.assertNotIn('error', events[3])
+        self.assertEqual(events[5]['error'], 'ValueError: сломалось')
+
+    @override_settings(DEBUG_TRACE_ENABLED=True, DEBUG_TRACE_SAMPLE_RATE=0.0)
+    def test_sampled_out_events_are_dropped(self):
+        debug_trace.trace('событие')
+        with debug_trace.span('этап') as span:
+            span.event('внутри')
+
+        self.assertEqual(self._events(), [])
+
+    @override_settings(DEBUG_TRACE_ENABLED=True)
+    def test_browser_events_are_ingested(self):
+        response = self.client.post(
+            '/api/debug/trace/',
+            data=json.dumps({'location': 'lesson-grid.js', 'message': 'клик', 'data': {'id': 3}}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.post('/api/debug/trace/', data='{', content_type='application/json').status_code, 400)
+
+        events = self._events()
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]['source'], 'browser')
+        self.assertEqual(events[0]['data'], {'id': 3})
@@ -0,0 +1,66 @@
+from unittest import mock
+import requests
+from django.test import TestCase, override_settings
+from lessons.services import http_session
+from lessons.services.http_session import parse_retry_after, post_with_retry
+
+
+def make_response(status_code, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    response._content = b'{}'
+    return response
+
+
+@override_settings(AI_HTTP_MAX_RETRIES=3, AI_HTTP_BACKOFF_BASE=1.0, AI_HTTP_BACKOFF_MAX=30.0)
+class PostWithRetryTest(TestCase):
+    def setUp(self):
+        self.session = mock.Mock()
+        patcher = mock.patch.object(http_session, 'get_session', return_value=self.session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        sleep_patcher = mock.patch.object(http_session.time, 'sleep')
+        self.sleep = sleep_patcher.start()
+        self.addCleanup(sleep_patcher.stop)
+
+    def test_retries_transient_status_then_succeeds(self):
+        self.session.post.side_effect = [make_response(502), make_response(200)]
+        response = post_with_retry('https://api.test', json={}, timeout=10, deadline=100)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.session.post.call_count, 2)
+        self.assertEqual(self.sleep.call_count, 1)
+
+    def test_honors_retry_after(self):
+        self.session.post.side_effect = [make_response(429, {'Retry-After': '7'}), make_response(200)]
+        post_with_retry('https://api.test', json={}, timeout=10, deadline=100)
+        self.sleep.assert_called_once_with(7.0)
+
+    def test_client_error_is_not_retried(self):
+        self.session.post.return_value = make_response(400)
+        with self.assertRaises(requests.exceptions.HTTPError):
+            post_with_retry('https://api.test', json={}, timeout=10, deadline=100)
+        self.assertEqual(self.session.post.call_count, 1)
+
+    def test_connection_errors_exhaust_retries(self):
+        self.session.post.side_effect = requests.exceptions.ConnectionError('reset')
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            post_with_retry('https://api.test', json={}, timeout=10, deadline=1000)
+        self.assertEqual(self.session.post.call_count, 4)
+
+    def test_retry_after_beyond_deadline_stops(self):
+        self.session.post.return_value = make_response(503, {'Retry-After': '120'})
+        with self.assertRaises(requests.exceptions.HTTPError):
+            post_with_retry('https://api.test', json={}, timeout=10, deadline=60)
+        self.assertEqual(self.session.post.call_count, 1)
+        self.sleep.assert_not_called()
+
+
+class ParseRetryAfterTest(TestCase):
+    def test_seconds_and_invalid(self):
+        self.assertEqual(parse_retry_after('3'), 3.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after('soon'))
+
+    def test_http_date_in_past(self):
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0.0)
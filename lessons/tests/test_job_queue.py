@@ -0,0 +1,112 @@
+from datetime import timedelta
+from django.test import TestCase, Client
+from django.utils import timezone
+from lessons.models import VideoFile, VideoProcessingJob
+from lessons.services.job_queue import (
+    enqueue_video, claim_next_job, finish_job, requeue_stale_jobs
+)
+
+
+class JobQueueTest(TestCase):
+    def setUp(self):
+        self.video = VideoFile.objects.create(
+            file_path="/test/video.mp4",
+            file_name="test_video.mp4"
+        )
+
+    def test_enqueue_creates_single_active_job(self):
+        job, created = enqueue_video(self.video)
+        self.assertTrue(created)
+        self.assertEqual(job.status, 'queued')
+        same_job, created = enqueue_video(self.video)
+        self.assertFalse(created)
+        self.assertEqual(same_job.id, job.id)
+        self.assertEqual(VideoProcessingJob.objects.count(), 1)
+
+    def test_enqueue_upgrades_queued_job_to_force_recreate(self):
+        job, _ = enqueue_video(self.video)
+        enqueue_video(self.video, force_recreate=True)
+        job.refresh_from_db()
+        self.assertTrue(job.force_recreate)
+
+    def test_force_recreate_on_running_job_runs_after_it(self):
+        enqueue_video(self.video)
+        job = claim_next_job('worker-1')
+        same_job, created = enqueue_video(self.video, force_recreate=True)
+        self.assertFalse(created)
+        self.assertEqual(same_job.id, job.id)
+        self.assertTrue(same_job.recreate_requested)
+        self.assertEqual(VideoProcessingJob.objects.count(), 1)
+
+        self.assertTrue(finish_job(job, 'worker-1'))
+        follow_up = VideoProcessingJob.objects.get(status='queued')
+        self.assertNotEqual(follow_up.id, job.id)
+        self.assertTrue(follow_up.force_recreate)
+
+    def test_requeued_job_keeps_requested_recreate(self):
+        enqueue_video(self.video)
+        job = claim_next_job('worker-1')
+        enqueue_video(self.video, force_recreate=True)
+        VideoProcessingJob.objects.filter(id=job.id).update(
+            heartbeat_at=timezone.now() - timedelta(minutes=10)
+        )
+        requeue_stale_jobs(stale_timeout=60, max_attempts=3)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'queued')
+        self.assertTrue(job.force_recreate)
+        self.assertFalse(job.recreate_requested)
+
+    def test_claim_marks_job_running(self):
+        enqueue_video(self.video)
+        job = claim_next_job('worker-1')
+        self.assertIsNotNone(job)
+        self.assertEqual(job.status, 'running')
+        self.assertEqual(job.claimed_by, 'worker-1')
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNotNone(job.heartbeat_at)
+        self.assertIsNone(claim_next_job('worker-2'))
+
+    def test_finish_only_by_owner(self):
+        enqueue_video(self.video)
+        job = claim_next_job('worker-1')
+        self.assertFalse(finish_job(job, 'worker-2'))
+        self.assertTrue(finish_job(job, 'worker-1'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        self.assertIsNotNone(job.finished_at)
+
+    def test_requeue_stale_jobs(self):
+        enqueue_video(self.video)
+        job = claim_next_job('worker-1')
+        VideoFile.objects.filter(id=self.video.id).update(status='processing')
+        VideoProcessingJob.objects.filter(id=job.id).update(
+            heartbeat_at=timezone.now() - timedelta(minutes=10)
+        )
+        requeued, failed = requeue_stale_jobs(stale_timeout=60, max_attempts=3)
+        self.assertEqual((requeued, failed), (1, 0))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'queued')
+        self.assertIsNone(job.claimed_by)
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.status, 'pending')
+
+    def test_requeue_stale_jobs_fails_after_max_attempts(self):
+        enqueue_video(self.video)
+        job = claim_next_job('worker-1')
+        VideoProcessingJob.objects.filter(id=job.id).update(
+            heartbeat_at=timezone.now() - timedelta(minutes=10)
+        )
+        requeued, failed = requeue_stale_jobs(stale_timeout=60, max_attempts=1)
+        self.assertEqual((requeued, failed), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'error')
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.status, 'error')
+
+    def test_process_view_only_enqueues(self):
+        response = Client().post(f'/api/videos/{self.video.id}/process/')
+        self.assertEqual(response.status_code, 202)
+        data = response.json()
+        job = VideoProcessingJob.objects.get(id=data['job_id'])
+        self.assertEqual(job.video_id, self.video.id)
+        self.assertEqual(job.status, 'queued')
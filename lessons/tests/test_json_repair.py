@@ -0,0 +1,77 @@
+import json
+from django.test import TestCase
+from lessons.services.json_repair import loads_tolerant, repair_json
+
+
+class RepairJsonTest(TestCase):
+    def _repair(self, content):
+        result = repair_json(content)
+        return json.loads(result.text), result.repairs
+
+    def test_valid_json_has_no_repairs(self):
+        data, repairs = self._repair('{"a": [1, -2.5e3, true, null], "b": {"c": "\\u00e9"}}')
+        self.assertEqual(data, {'a': [1, -2500.0, True, None], 'b': {'c': 'é'}})
+        self.assertEqual(repairs, [])
+
+    def test_fence_comments_and_trailing_commas(self):
+        data, repairs = self._repair('```json\n{"a": "x", // comment\n "b": [1, 2,], /* c */}\n```')
+        self.assertEqual(data, {'a': 'x', 'b': [1, 2]})
+        self.assertEqual(repairs, ['fence', 'comment', 'trailing_comma'])
+
+    def test_comment_markers_inside_strings_are_kept(self):
+        data, repairs = self._repair('{"imageUrl": "https://example.com/a.png", "b": "/* x */"}')
+        self.assertEqual(data, {'imageUrl': 'https://example.com/a.png', 'b': '/* x */'})
+        self.assertEqual(repairs, [])
+
+    def test_missing_comma_and_invalid_escape(self):
+        data, repairs = self._repair('[{"q": "it\\\'s"}\n{"q": "b"}]')
+        self.assertEqual(data, [{'q': "it's"}, {'q': 'b'}])
+        self.assertIn('missing_comma', repairs)
+        self.assertIn('invalid_escape', repairs)
+
+    def test_newlines_inside_strings(self):
+        data, repairs = self._repair('{"a": "line one\nline two", "b": "open\n  "c": 1}')
+        self.assertEqual(data, {'a': 'line one\nline two', 'b': 'open', 'c': 1})
+        self.assertIn('control_character', repairs)
+        self.assertIn('unterminated_string', repairs)
+
+    def test_truncated_card_is_dropped_whole(self):
+        data, repairs = self._repair(
+            '{"lessonTitle": "T", "topics": [{"topic": "w", "cards": ['
+            '{"questionText": "A", "options": ["x", "y"]}, '
+            '{"questionText": "B", "options": ["x"], "hintText": "unfini'
+        )
+        self.assertEqual(data, {'lessonTitle': 'T', 'topics': [
+            {'topic': 'w', 'cards': [{'questionText': 'A', 'options': ['x', 'y']}]}
+        ]})
+        self.assertEqual(repairs, ['truncated'])
+
+    def test_truncated_inside_nested_array_drops_open_card(self):
+        data, repairs = self._repair('{"cards": [{"q": "A"}, {"q": "B", "options": ["x", "y')
+        self.assertEqual(data, {'cards': [{'q': 'A'}]})
+        self.assertEqual(repairs, ['truncated'])
+
+        data, _ = self._repair('{"topics": [{"topic": "w", "cards": [{"q": "A"}, {"q": "B", "options": ["x"')
+        self.assertEqual(data, {'topics': [{'topic': 'w', 'cards': [{'q': 'A'}]}]})
+
+    def test_truncated_scalar_arrays_keep_complete_items(self):
+        data, _ = self._repair('{"a": [1, 2, [3, 4')
+        self.assertEqual(data, {'a': [1, 2, [3]]})
+
+    def test_non_json_constants_are_not_copied_from_valid_containers(self):
+        data, repairs = self._repair('{"a": [{"b": 1}, {"c": NaN}]}')
+        self.assertEqual(data, {'a': [{'b': 1}, {'c': None}]})
+        self.assertIn('unexpected_character', repairs)
+
+    def test_truncated_object_without_arrays(self):
+        data, _ = self._repair('{"a": {"b": 1, "c": tr')
+        self.assertEqual(data, {'a': {'b': 1}})
+
+
+class LoadsTolerantTest(TestCase):
+    def test_valid_json_parsed_directly(self):
+        self.assertEqual(loads_tolerant('{"a": 1}'), ({'a': 1}, []))
+
+    def test_unrecoverable_raises(self):
+        with self.assertRaises(json.JSONDecodeError):
+            loads_tolerant('no json here')
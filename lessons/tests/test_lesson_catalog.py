@@ -0,0 +1,81 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from lessons.models import CardAttempt, ExerciseCard, Lesson, LessonAttempt, UserProgress, VideoFile
+from lessons.services.lesson_progress import record_attempt_finished, record_card_answer
+from lessons.services.lesson_summary import refresh_summary
+
+
+class LessonCatalogTests(TestCase):
+    def setUp(self):
+        session = self.client.session
+        session.save()
+        self.user_progress = UserProgress.objects.create(session_key=session.session_key)
+        self.lessons = []
+        for i in range(3):
+            video = VideoFile.objects.create(file_path=f'/videos/{i}.mp4', file_name=f'{i}.mp4')
+            self.lessons.append(Lesson.objects.create(video=video, title=f'Урок {i}', transcript_text='текст'))
+
+    def _add_cards(self, lesson, topics):
+        cards = [
+            ExerciseCard.objects.create(
+                lesson=lesson, card_type='repeat', question_text='q', prompt_text='p', topic=topic, order_index=i
+            )
+            for i, topic in enumerate(topics)
+        ]
+        refresh_summary(lesson.id)
+        return cards
+
+    def _answer(self, attempt, card, status):
+        card_attempt = CardAttempt.objects.create(
+            lesson_attempt=attempt, card=card, is_correct=status > 0, card_status=status
+        )
+        record_card_answer(attempt, card, card_attempt)
+
+    def _catalog(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/lessons/')
+        self.assertEqual(response.status_code, 200)
+        return {lesson['id']: lesson for lesson in response.json()['lessons']}, len(queries)
+
+    def test_counts_and_progress_are_aggregated(self):
+        first, second, _ = self.lessons
+        cards = self._add_cards(first, ['weather', 'weather', 'colors', None, ''])
+        self._add_cards(second, ['actions'])
+        # Статус карточки — по последнему ответу на неё, звёзды — лучший результат
+        old = LessonAttempt.objects.create(user_progress=self.user_progress, lesson=first, stars=3)
+        self._answer(old, cards[2], 5)
+        record_attempt_finished(old)
+        latest = LessonAttempt.objects.create(user_progress=self.user_progress, lesson=first, stars=1)
+        for card, status in [(cards[0], 5), (cards[1], 3), (cards[3], 5), (cards[2], 0)]:
+            self._answer(latest, card, status)
+
+        lessons, _ = self._catalog()
+
+        data = lessons[first.id]
+        self.assertEqual((data['cards_count'], data['topics_count']), (5, 3))
+        self.assertEqual(data['progress'], {
+            'topics_completed': 2, 'topics_total': 3,
+            'cards_completed': 3, 'cards_total': 5, 'completion_percent': 60,
+        })
+        self.assertEqual((data['user_completed'], data['stars']), (False, 3))
+        self.assertEqual(data['video_file'], '0.mp4')
+        self.assertEqual(lessons[second.id]['progress']['cards_completed'], 0)
+        self.assertEqual(lessons[self.lessons[2].id]['topics_count'], 0)
+
+    def test_query_count_does_not_depend_on_cards(self):
+        attempts = [
+            LessonAttempt.objects.create(user_progress=self.user_progress, lesson=lesson) for lesson in self.lessons
+        ]
+        for lesson, attempt in zip(self.lessons, attempts):
+            self._answer(attempt, self._add_cards(lesson, ['weather'])[0], 5)
+        _, small = self._catalog()
+
+        for lesson, attempt in zip(self.lessons, attempts):
+            for card in self._add_cards(lesson, ['colors'] * 20):
+                self._answer(attempt, card, 5)
+        lessons, large = self._catalog()
+
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, 4)
+        self.assertTrue(all(lesson['user_completed'] for lesson in lessons.values()))
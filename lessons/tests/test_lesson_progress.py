@@ -0,0 +1,113 @@
+import json
+from types import SimpleNamespace
+from django.contrib.admin.sites import AdminSite
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from lessons.models import (
+    CardAttempt, ExerciseCard, Lesson, LessonAttempt, UserLessonProgress, UserProgress, VideoFile
+)
+from lessons.admin import ExerciseCardAdmin
+from lessons.services.lesson_progress import get_lesson_progress
+
+
+class UserLessonProgressTests(TestCase):
+    def setUp(self):
+        video = VideoFile.objects.create(file_path='/videos/a.mp4', file_name='a.mp4')
+        self.lesson = Lesson.objects.create(video=video, title='Урок', transcript_text='текст')
+        self.cards = [
+            ExerciseCard.objects.create(
+                lesson=self.lesson, card_type='repeat', question_text='q', prompt_text='p', topic=topic, order_index=i
+            )
+            for i, topic in enumerate(['weather', 'weather', None])
+        ]
+        self.attempt_id = self.client.post(f'/api/lessons/{self.lesson.id}/start/').json()['attempt_id']
+        self.user_progress = UserProgress.objects.get()
+
+    def _answer(self, card, is_correct):
+        return self.client.post('/api/cards/answer/', data=json.dumps({
+            'attempt_id': self.attempt_id, 'card_id': card.id, 'answer': 'a', 'is_correct': is_correct,
+        }), content_type='application/json').json()
+
+    def _progress(self):
+        return UserLessonProgress.objects.get(user_progress=self.user_progress, lesson=self.lesson)
+
+    def test_answers_update_rollup_incrementally(self):
+        self._answer(self.cards[0], True)
+        self._answer(self.cards[2], False)
+        self._answer(self.cards[2], True)
+
+        progress = self._progress()
+        self.assertEqual(progress.cards_completed, 2)
+        self.assertEqual(progress.topic_completed, {'weather': 1, 'general': 1})
+        self.assertEqual(progress.card_states, {str(self.cards[0].id): [5, 1], str(self.cards[2].id): [3, 2]})
+        self.assertEqual((progress.last_attempt_id, progress.last_status), (self.attempt_id, 'in_progress'))
+
+        # Неправильный ответ снимает карточку с пройденных
+        self._answer(self.cards[0], False)
+        progress = self._progress()
+        self.assertEqual((progress.cards_completed, progress.topic_completed), (1, {'general': 1}))
+
+    def test_completion_keeps_best_stars(self):
+        for card in self.cards:
+            self._answer(card, True)
+        self.client.post(f'/api/attempts/{self.attempt_id}/complete/')
+        self.assertEqual((self._progress().best_stars, self._progress().last_status), (3, 'completed'))
+
+        self.attempt_id = self.client.post(f'/api/lessons/{self.lesson.id}/start/').json()['attempt_id']
+        self._answer(self.cards[0], False)
+        self.client.post(f'/api/attempts/{self.attempt_id}/complete/')
+
+        progress = self._progress()
+        self.assertEqual(progress.best_stars, 3)
+        self.assertEqual(progress.last_attempt_id, self.attempt_id)
+        self.assertEqual(progress.cards_completed, 2)
+
+    def test_reads_do_not_scan_attempt_history(self):
+        self._answer(self.cards[0], True)
+        self._answer(self.cards[1], False)
+
+        with CaptureQueriesContext(connection) as queries:
+            statuses = self.client.get(f'/api/lessons/{self.lesson.id}/card_statuses/').json()['card_statuses']
+            self.client.get('/api/lessons/')
+
+        self.assertFalse([q['sql'] for q in queries if 'lessons_cardattempt' in q['sql']])
+        self.assertEqual(statuses[str(self.cards[0].id)], {'status': 5, 'color': 'green', 'attempts_count': 1})
+        self.assertEqual(statuses[str(self.cards[1].id)]['color'], 'red')
+
+    def test_rollup_is_rebuilt_from_history(self):
+        attempt = LessonAttempt.objects.get(id=self.attempt_id)
+        CardAttempt.objects.create(lesson_attempt=attempt, card=self.cards[1], is_correct=True, card_status=5)
+
+        progress = get_lesson_progress(self.user_progress.id, self.lesson.id)
+
+        self.assertEqual((progress.cards_completed, progress.topic_completed), (1, {'weather': 1}))
+        self.assertEqual(self._progress().pk, progress.pk)
+
+    def test_completing_lesson_without_cards(self):
+        ExerciseCard.objects.all().delete()
+        attempt_id = self.client.post(f'/api/lessons/{self.lesson.id}/start/').json()['attempt_id']
+
+        response = self.client.post(f'/api/attempts/{attempt_id}/complete/')
+
+        self.assertEqual(response.status_code, 200)
+        attempt = LessonAttempt.objects.get(id=attempt_id)
+        self.assertEqual((attempt.status, attempt.stars, attempt.score), ('completed', 0, None))
+        self.assertEqual(LessonAttempt(total_cards=0).calculate_stars(), 0)
+
+    def test_admin_card_changes_rebuild_rollup(self):
+        for card in self.cards:
+            self._answer(card, True)
+        admin = ExerciseCardAdmin(ExerciseCard, AdminSite())
+        request = RequestFactory().post('/admin/')
+
+        card = self.cards[0]
+        card.topic = 'colors'
+        admin.save_model(request, card, form=SimpleNamespace(changed_data=['topic']), change=True)
+        self.assertEqual(self._progress().topic_completed, {'colors': 1, 'weather': 1, 'general': 1})
+
+        admin.delete_model(request, card)
+        admin.delete_queryset(request, ExerciseCard.objects.filter(id=self.cards[2].id))
+        progress = self._progress()
+        self.assertEqual((progress.cards_completed, progress.topic_completed), (1, {'weather': 1}))
+        self.assertEqual(list(progress.card_states), [str(self.cards[1].id)])
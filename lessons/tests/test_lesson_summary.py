@@ -0,0 +1,90 @@
+from django.contrib.admin.sites import AdminSite
+from django.test import RequestFactory, TestCase
+from lessons.admin import ExerciseCardAdmin
+from lessons.models import CardAttempt, ExerciseCard, Lesson, LessonAttempt, LessonSummary, UserProgress, VideoFile
+from lessons.services.lesson_summary import refresh_summary, summarize_cards
+from lessons.services.video_processor import VideoProcessor
+
+
+def _card(card_type, topic=None):
+    return {'cardType': card_type, 'questionText': 'question', 'promptText': 'prompt', 'topic': topic}
+
+
+class LessonSummaryTests(TestCase):
+    def setUp(self):
+        self.video = VideoFile.objects.create(file_path='/videos/a.mp4', file_name='a.mp4')
+        # Сервисы обработки не нужны: создание урока из ответа ИИ их не использует
+        self.processor = VideoProcessor.__new__(VideoProcessor)
+
+    def _create_lesson(self, lesson_data, force_recreate=False):
+        return self.processor._create_lesson_from_ai_response(
+            self.video, 'transcript', {'lessonTitle': 'Урок', **lesson_data}, force_recreate
+        )
+
+    def test_summarize_cards(self):
+        summary = summarize_cards([('weather', 'repeat'), (None, 'choose'), ('weather', 'choose'), ('', 'repeat')])
+
+        self.assertEqual(summary, {
+            'topics': ['weather', 'general'],
+            'topic_counts': {'weather': 2, 'general': 2},
+            'card_types': {'repeat': 2, 'choose': 2},
+            'cards_total': 4,
+        })
+
+    def test_lesson_creation_writes_summary(self):
+        lesson = self._create_lesson({'topics': [
+            {'topic': 'colors', 'cards': [_card('choose'), _card('repeat')]},
+            {'topic': 'animals', 'cards': [_card('choose')]},
+        ]})
+
+        summary = LessonSummary.objects.get(lesson=lesson)
+        self.assertEqual(summary.topics, ['colors', 'animals'])
+        self.assertEqual(summary.topic_counts, {'colors': 2, 'animals': 1})
+        self.assertEqual(summary.card_types, {'choose': 2, 'repeat': 1})
+        self.assertEqual(summary.cards_total, 3)
+
+    def test_failed_creation_rolls_back_lesson(self):
+        with self.assertRaises(ValueError):
+            self._create_lesson({'cards': [{'cardType': 'repeat'}]})
+
+        self.assertFalse(Lesson.objects.exists())
+        self.assertFalse(LessonSummary.objects.exists())
+
+    def test_admin_edits_refresh_summary(self):
+        lesson = self._create_lesson({'cards': [_card('repeat', 'weather'), _card('choose', 'weather')]})
+        card = lesson.cards.order_by('order_index').first()
+        admin = ExerciseCardAdmin(ExerciseCard, AdminSite())
+        request = RequestFactory().post('/admin/')
+
+        card.topic = 'colors'
+        admin.save_model(request, card, form=None, change=False)
+        self.assertEqual(LessonSummary.objects.get(lesson=lesson).topic_counts, {'colors': 1, 'weather': 1})
+
+        admin.delete_queryset(request, ExerciseCard.objects.filter(id=card.id))
+        summary = LessonSummary.objects.get(lesson=lesson)
+        self.assertEqual((summary.topics, summary.cards_total), (['weather'], 1))
+
+    def test_topic_pages_read_summary(self):
+        lesson = self._create_lesson({'cards': [_card('repeat', 'weather'), _card('choose', 'colors')]})
+        session = self.client.session
+        session.save()
+        user_progress = UserProgress.objects.create(session_key=session.session_key)
+        attempt = LessonAttempt.objects.create(user_progress=user_progress, lesson=lesson)
+        card = lesson.cards.get(topic='weather')
+        CardAttempt.objects.create(lesson_attempt=attempt, card=card, is_correct=True, card_status=5)
+
+        topics = self.client.get(f'/api/lessons/{lesson.id}/topics/').json()['topics']
+        self.assertEqual([(topic['topic'], topic['cards_count']) for topic in topics], [('weather', 1), ('colors', 1)])
+
+        response = self.client.get(f'/lesson/{lesson.id}/')
+        completed = {topic['topic']: topic['cards_completed'] for topic in response.context['topics']}
+        self.assertEqual(completed, {'weather': 1, 'colors': 0})
+
+    def test_missing_summary_is_rebuilt(self):
+        lesson = self._create_lesson({'cards': [_card('repeat')]})
+        LessonSummary.objects.filter(lesson=lesson).delete()
+
+        topics = self.client.get(f'/api/lessons/{lesson.id}/topics/').json()['topics']
+
+        self.assertEqual(topics[0]['cards_count'], 1)
+        self.assertEqual(refresh_summary(lesson.id).topics, ['general'])
@@ -0,0 +1,98 @@
+import io
+import os
+import queue
+import shutil
+import logging
+import tempfile
+import threading
+from django.test import SimpleTestCase
+from lessons.services.log_handler import (
+    AsyncLogListener, BatchStreamHandler, DeferredQueueHandler, InterfaceLogHandler
+)
+from lessons.services.log_storage import LogStorage
+
+
+class LogStorageTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'logs.sqlite3')
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_logs_are_shared_between_instances(self):
+        # Два экземпляра с одним файлом — как веб-процесс и воркер обработки
+        web, worker = LogStorage(path=self.path), LogStorage(path=self.path)
+
+        worker.add_log('INFO', 'из воркера', source='worker')
+        web.add_log('INFO', 'из веба')
+
+        logs, cursor = web.get_logs_since(0)
+        self.assertEqual([log['message'] for log in logs], ['из воркера', 'из веба'])
+        self.assertEqual([log['seq'] for log in logs], [1, 2])
+        self.assertEqual(cursor, 2)
+        self.assertEqual(web.get_logs_since(cursor), ([], 2))
+
+    def test_retention_and_clear_keep_sequence(self):
+        storage = LogStorage(max_logs=10, path=self.path)
+        for i in range(25):
+            storage.add_log('INFO', f'строка {i}')
+
+        logs = storage.get_logs(limit=100)
+        self.assertLessEqual(len(logs), 11)
+        self.assertEqual(logs[-1]['message'], 'строка 24')
+
+        storage.clear()
+        self.assertEqual(storage.get_logs_since(25), ([], 25))
+        storage.add_log('INFO', 'после очистки')
+        self.assertEqual(storage.get_logs_since(25)[0][0]['seq'], 26)
+
+    def test_wait_notices_other_process(self):
+        web, worker = LogStorage(path=self.path), LogStorage(path=self.path)
+        web.poll_interval = 0.02
+        threading.Timer(0.05, worker.add_log, args=('INFO', 'готово')).start()
+
+        self.assertTrue(web.wait_for_logs(0, timeout=5))
+        self.assertFalse(web.wait_for_logs(1, timeout=0.05))
+
+    def test_memory_storage_without_path(self):
+        storage = LogStorage(path='')
+        storage.add_log('ERROR', 'в памяти')
+
+        self.assertEqual(storage.get_logs_since()[0][0]['message'], 'в памяти')
+
+
+class AsyncLoggingTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.storage = LogStorage(path=os.path.join(self.root, 'logs.sqlite3'))
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_queue_handler_writes_batches_in_background(self):
+        handler = InterfaceLogHandler()
+        handler.log_storage = self.storage
+        stream = io.StringIO()
+        console = BatchStreamHandler(stream)
+        console.setLevel(logging.INFO)
+        log_queue = queue.SimpleQueue()
+        listener = AsyncLogListener(log_queue, [handler, console])
+        logger = logging.getLogger('lessons.tests.async_logging')
+        logger.propagate = False
+        logger.handlers = [DeferredQueueHandler(log_queue)]
+        logger.setLevel(logging.DEBUG)
+
+        for i in range(50):
+            logger.info('строка %s', i)
+        logger.debug('отладка')
+        # Пока слушатель не запущен, вызывающий поток ничего не записал
+        self.assertEqual(self.storage.get_logs_since(0), ([], 0))
+        listener.start()
+        listener.stop()
+
+        logs = self.storage.get_logs(limit=100)
+        self.assertEqual(len(logs), 51)
+        self.assertEqual(logs[0]['message'], 'строка 0')
+        self.assertEqual(logs[0]['source'], 'lessons.tests.async_logging')
+        self.assertEqual(stream.getvalue().count('\n'), 50)
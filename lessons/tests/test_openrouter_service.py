@@ -0,0 +1,54 @@
+import time
+import threading
+from unittest import mock
+from django.test import TestCase, override_settings
+from lessons.services.openrouter_service import OpenRouterService
+
+
+@override_settings(OPENROUTER_API_KEY='test-key')
+class TwoStageTopicConcurrencyTest(TestCase):
+    def setUp(self):
+        self.service = OpenRouterService()
+        self.topics = [
+            {'topic': f'topic_{i}', 'topicName': f'Topic {i}', 'cardPlan': {'single_choice': 1}}
+            for i in range(6)
+        ]
+        self.analysis = {'lessonTitle': 'Lesson', 'topics': self.topics}
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def _fake_generate(self, topic_info, transcript_text, on_card=None):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        # Первые темы отвечают дольше, чтобы порядок завершения отличался от порядка тем
+        time.sleep(0.05 * (6 - int(topic_info['topic'].split('_')[1])) / 6)
+        with self.lock:
+            self.active -= 1
+        if topic_info['topic'] == 'topic_3':
+            raise ValueError('bad response')
+        return [{'type': 'single_choice', 'question': topic_info['topic']}]
+
+    def _run(self):
+        with mock.patch.object(self.service, '_analyze_transcript', return_value=self.analysis), \
+                mock.patch.object(self.service, '_generate_cards_for_topic', side_effect=self._fake_generate):
+            return self.service.analyze_lesson_two_stage('transcript')
+
+    @override_settings(OPENROUTER_TOPIC_CONCURRENCY=3)
+    def test_results_keep_topic_order_and_respect_cap(self):
+        lesson_data = self._run()
+        self.assertEqual(
+            [topic['topic'] for topic in lesson_data['topics']],
+            ['topic_0', 'topic_1', 'topic_2', 'topic_4', 'topic_5'],
+        )
+        self.assertEqual([card['topic'] for card in lesson_data['cards']],
+                         ['topic_0', 'topic_1', 'topic_2', 'topic_4', 'topic_5'])
+        self.assertGreater(self.max_active, 1)
+        self.assertLessEqual(self.max_active, 3)
+
+    @override_settings(OPENROUTER_TOPIC_CONCURRENCY=1)
+    def test_sequential_when_cap_is_one(self):
+        lesson_data = self._run()
+        self.assertEqual(len(lesson_data['topics']), 5)
+        self.assertEqual(self.max_active, 1)
@@ -0,0 +1,34 @@
+import shutil
+import tempfile
+from django.test import TestCase
+from lessons.services.transcript_store import TranscriptStore
+
+
+class TranscriptStoreTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = TranscriptStore(self.directory)
+        self.options = {'language': None, 'task': 'transcribe'}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_key_depends_on_model_and_options(self):
+        key = self.store.make_key('abc', 'base', self.options)
+        self.assertEqual(key, self.store.make_key('abc', 'base', dict(self.options)))
+        self.assertNotEqual(key, self.store.make_key('abc', 'small', self.options))
+        self.assertNotEqual(key, self.store.make_key('abc', 'base', {'language': 'en', 'task': 'transcribe'}))
+
+    def test_put_and_get(self):
+        key = self.store.make_key('abc', 'base', self.options)
+        self.assertIsNone(self.store.get(key))
+        saved = self.store.put(key, 'abc', 'base', self.options, 'Hello world', segments=[
+            {'start': 0.0, 'end': 1.5, 'text': 'Hello world', 'tokens': [1, 2]}
+        ])
+        record = self.store.get(key)
+        self.assertEqual(record['text'], 'Hello world')
+        self.assertEqual(record['segments'], [{'start': 0.0, 'end': 1.5, 'text': 'Hello world'}])
+        self.assertEqual(record['path'], saved['path'])
+        self.assertTrue(TranscriptStore.matches(record, 'base', self.options))
+        self.assertFalse(TranscriptStore.matches(record, 'small', self.options))
+
@@ -0,0 +1,19 @@
+from unittest import mock
+from django.test import TestCase
+from lessons.services.transcription_pool import resolve_pool_size
+
+
+class ResolvePoolSizeTest(TestCase):
+    @mock.patch('os.cpu_count', return_value=8)
+    def test_pool_disabled(self, _):
+        self.assertEqual(resolve_pool_size(0, 0), (0, 0))
+
+    @mock.patch('os.cpu_count', return_value=8)
+    def test_auto_workers_from_cpu_count(self, _):
+        self.assertEqual(resolve_pool_size(-1, 0), (2, 4))
+        self.assertEqual(resolve_pool_size(-1, 2), (4, 2))
+
+    @mock.patch('os.cpu_count', return_value=8)
+    def test_auto_threads_from_workers(self, _):
+        self.assertEqual(resolve_pool_size(4, 0), (4, 2))
+        self.assertEqual(resolve_pool_size(16, 0), (16, 1))
@@ -0,0 +1,100 @@
+import os
+import tempfile
+from datetime import timedelta
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from lessons.models import VideoFile
+from lessons.services.video_lease import (
+    claim_video, expire_stale_leases, release_video, renew_lease, update_leased
+)
+from lessons.services.video_processor import VideoProcessor, VideoTask
+
+
+class VideoLeaseTests(TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.mp4')
+        os.close(handle)
+        self.video = VideoFile.objects.create(file_path=self.path, file_name='video.mp4')
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def test_only_one_owner_claims_video(self):
+        self.assertTrue(claim_video(self.video.id, 'worker-1'))
+        self.assertFalse(claim_video(self.video.id, 'worker-2'))
+
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.status, 'processing')
+        self.assertEqual(self.video.lease_owner, 'worker-1')
+        self.assertGreater(self.video.lease_expires_at, timezone.now())
+
+    def test_expired_lease_can_be_claimed(self):
+        claim_video(self.video.id, 'worker-1')
+        VideoFile.objects.filter(id=self.video.id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertTrue(claim_video(self.video.id, 'worker-2'))
+        # Старый владелец больше не может менять видео
+        self.assertFalse(renew_lease(self.video.id, 'worker-1'))
+        self.assertFalse(update_leased(self.video.id, 'worker-1', processing_message='x'))
+
+    def test_done_video_claimed_only_with_force_recreate(self):
+        VideoFile.objects.filter(id=self.video.id).update(status='done')
+
+        self.assertFalse(claim_video(self.video.id, 'worker-1'))
+        self.assertTrue(claim_video(self.video.id, 'worker-1', force_recreate=True))
+
+    def test_renew_and_release(self):
+        claim_video(self.video.id, 'worker-1')
+        VideoFile.objects.filter(id=self.video.id).update(lease_expires_at=timezone.now())
+
+        self.assertTrue(renew_lease(self.video.id, 'worker-1'))
+        self.assertTrue(release_video(self.video.id, 'worker-1', status='done'))
+
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.status, 'done')
+        self.assertIsNone(self.video.lease_owner)
+        self.assertIsNone(self.video.lease_expires_at)
+
+    def test_expire_stale_leases(self):
+        missing = VideoFile.objects.create(file_path='/missing/video.mp4', file_name='missing.mp4')
+        for video in (self.video, missing):
+            claim_video(video.id, 'worker-1')
+        VideoFile.objects.update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        live = VideoFile.objects.create(file_path=self.path + '.live', file_name='live.mp4')
+        claim_video(live.id, 'worker-2')
+
+        self.assertEqual(expire_stale_leases(), (1, 1))
+
+        statuses = dict(VideoFile.objects.values_list('id', 'status'))
+        self.assertEqual(statuses, {self.video.id: 'pending', missing.id: 'error', live.id: 'processing'})
+        self.assertIsNone(VideoFile.objects.get(id=self.video.id).lease_owner)
+
+    def test_legacy_processing_rows_need_cutoff(self):
+        VideoFile.objects.filter(id=self.video.id).update(status='processing')
+
+        self.assertEqual(expire_stale_leases(), (0, 0))
+        self.assertEqual(expire_stale_leases(legacy_cutoff=timezone.now() + timedelta(seconds=1)), (1, 0))
+
+    def test_reset_stuck_videos_command(self):
+        claim_video(self.video.id, 'worker-1')
+        VideoFile.objects.filter(id=self.video.id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+
+        call_command('reset_stuck_videos', dry_run=True, stdout=open(os.devnull, 'w'))
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.status, 'processing')
+
+        call_command('reset_stuck_videos', stdout=open(os.devnull, 'w'))
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.status, 'pending')
+
+    def test_processor_skips_video_leased_by_other_worker(self):
+        claim_video(self.video.id, 'worker-1')
+        processor = VideoProcessor.__new__(VideoProcessor)
+
+        task = VideoTask(self.video, owner='worker-2')
+
+        self.assertFalse(processor.start_task(task))
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.lease_owner, 'worker-1')
@@ -0,0 +1,90 @@
+import time
+import threading
+from types import SimpleNamespace
+from django.test import SimpleTestCase
+from lessons.services.video_pipeline import VideoPipeline
+
+
+class FakeProcessor:
+    """Этапы с задержкой; записывает интервалы выполнения"""
+
+    def __init__(self, delay=0.05, fail_on=None):
+        self.delay = delay
+        self.fail_on = fail_on or set()
+        self.intervals = []
+        self.failed = []
+        self.lock = threading.Lock()
+
+    def _stage(self, name, task):
+        started = time.monotonic()
+        time.sleep(self.delay)
+        if (name, task.name) in self.fail_on:
+            raise ValueError(f'{name} failed')
+        with self.lock:
+            self.intervals.append((name, task.name, started, time.monotonic()))
+
+    def extract_stage(self, task):
+        self._stage('extract', task)
+
+    def transcribe_stage(self, task):
+        self._stage('transcribe', task)
+
+    def generate_stage(self, task):
+        self._stage('generate', task)
+
+    def persist_stage(self, task):
+        self._stage('persist', task)
+
+    def fail_task(self, task, error):
+        self.failed.append((task.name, str(error)))
+
+
+def _task(name):
+    return SimpleNamespace(name=name, video_file=SimpleNamespace(id=name))
+
+
+class VideoPipelineTests(SimpleTestCase):
+    def _run(self, processor, names, concurrency=None):
+        finished = []
+        pipeline = VideoPipeline(
+            processor,
+            lambda task, error: finished.append((task.name, error)),
+            queue_size=1,
+            concurrency=concurrency,
+        )
+        pipeline.start()
+        for name in names:
+            pipeline.submit(_task(name))
+        pipeline.close()
+        return finished
+
+    def test_all_tasks_pass_all_stages(self):
+        processor = FakeProcessor(delay=0.01)
+
+        finished = self._run(processor, ['a', 'b', 'c'])
+
+        self.assertEqual(sorted(name for name, _ in finished), ['a', 'b', 'c'])
+        self.assertTrue(all(error is None for _, error in finished))
+        self.assertEqual(len(processor.intervals), 12)
+
+    def test_transcription_of_next_video_overlaps_generation(self):
+        processor = FakeProcessor(delay=0.05)
+
+        self._run(processor, ['a', 'b'], concurrency={'generate': 1})
+
+        intervals = {(stage, name): (start, end) for stage, name, start, end in processor.intervals}
+        generate_a = intervals[('generate', 'a')]
+        transcribe_b = intervals[('transcribe', 'b')]
+        self.assertLess(transcribe_b[0], generate_a[1])
+        self.assertLess(generate_a[0], transcribe_b[1])
+
+    def test_failed_stage_skips_rest_and_reports_error(self):
+        processor = FakeProcessor(delay=0.01, fail_on={('transcribe', 'b')})
+
+        finished = dict(self._run(processor, ['a', 'b', 'c']))
+
+        self.assertIsNone(finished['a'])
+        self.assertIsInstance(finished['b'], ValueError)
+        self.assertIsNone(finished['c'])
+        self.assertEqual(processor.failed, [('b', 'transcribe failed')])
+        self.assertNotIn(('generate', 'b'), {(stage, name) for stage, name, _, _ in processor.intervals})
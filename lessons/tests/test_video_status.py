@@ -0,0 +1,107 @@
+import threading
+from django.test import TestCase, override_settings
+from lessons.models import VideoFile
+from lessons.services.log_storage import LogStorage
+from lessons.views_video_status import get_status_snapshot, reset_status_snapshot
+
+
+class ProcessingStatusTests(TestCase):
+    def setUp(self):
+        reset_status_snapshot()
+        statuses = ['done', 'done', 'processing', 'pending', 'error', 'processing']
+        self.videos = [
+            VideoFile.objects.create(file_path=f'/videos/{i}.mp4', file_name=f'{i}.mp4', status=status)
+            for i, status in enumerate(statuses)
+        ]
+
+    def tearDown(self):
+        reset_status_snapshot()
+
+    @override_settings(VIDEO_STATUS_CACHE_SECONDS=0)
+    def test_counts_and_position_in_constant_queries(self):
+        # Агрегат по статусам, текущее видео, позиция — независимо от размера таблицы
+        with self.assertNumQueries(3):
+            data = self.client.get('/api/videos/processing_status/').json()
+
+        self.assertEqual(
+            (data['total_videos'], data['pending'], data['processing'], data['done'], data['error']),
+            (6, 1, 2, 2, 1),
+        )
+        self.assertEqual(data['progress_percent'], 33)
+        self.assertTrue(data['is_processing'])
+        self.assertEqual(data['current_video']['id'], self.videos[2].id)
+        self.assertEqual(data['current_video']['index'], 3)
+        self.assertIn('logs', data)
+
+    @override_settings(VIDEO_STATUS_CACHE_SECONDS=60)
+    def test_snapshot_is_cached(self):
+        get_status_snapshot()
+
+        VideoFile.objects.filter(status='processing').update(status='done')
+        with self.assertNumQueries(0):
+            snapshot = get_status_snapshot()
+
+        self.assertEqual(snapshot['processing'], 2)
+        reset_status_snapshot()
+        self.assertEqual(get_status_snapshot()['processing'], 0)
+
+
+@override_settings(VIDEO_STATUS_CACHE_SECONDS=0)
+class ProcessingEventsTests(TestCase):
+    def setUp(self):
+        reset_status_snapshot()
+        self.video = VideoFile.objects.create(file_path='/videos/a.mp4', file_name='a.mp4')
+        self.storage = LogStorage.get_instance()
+
+    def tearDown(self):
+        reset_status_snapshot()
+
+    def _events(self, **params):
+        return self.client.get('/api/videos/events/', {'timeout': 0, 'video_id': self.video.id, **params})
+
+    def test_idle_poll_returns_no_content(self):
+        first = self._events().json()
+
+        response = self._events(cursor=first['cursor'], state=first['state'])
+
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response.content, b'')
+
+    def test_returns_only_new_logs_and_status_transitions(self):
+        first = self._events().json()
+        self.assertEqual(first['video']['status'], 'pending')
+
+        self.storage.add_log('INFO', 'новая строка')
+        data = self._events(cursor=first['cursor'], state=first['state']).json()
+        self.assertEqual([log['message'] for log in data['logs']], ['новая строка'])
+        self.assertEqual(data['state'], first['state'])
+
+        VideoFile.objects.filter(id=self.video.id).update(status='processing', processing_status='transcribing')
+        data = self._events(cursor=data['cursor'], state=data['state']).json()
+        self.assertEqual(data['logs'], [])
+        self.assertEqual(data['video']['processing_status'], 'transcribing')
+        self.assertEqual(data['status']['processing'], 1)
+
+    def test_status_only_poll_ignores_new_logs(self):
+        first = self._events(logs=0).json()
+        self.assertEqual((first['logs'], first['video']['status']), ([], 'pending'))
+
+        self.storage.add_log('INFO', 'лог другого видео')
+        self.assertEqual(self._events(logs=0, state=first['state']).status_code, 204)
+
+        # Изменения других видео не будят подписчика одного видео
+        VideoFile.objects.create(file_path='/videos/b.mp4', file_name='b.mp4', status='processing')
+        self.assertEqual(self._events(logs=0, state=first['state']).status_code, 204)
+
+        VideoFile.objects.filter(id=self.video.id).update(status='processing')
+        data = self._events(logs=0, state=first['state']).json()
+        self.assertEqual((data['logs'], data['video']['status'], data['status']), ([], 'processing', None))
+
+    def test_wait_wakes_up_on_new_log(self):
+        cursor = self.storage.get_logs_since()[1]
+        threading.Timer(0.05, self.storage.add_log, args=('INFO', 'проснулись')).start()
+
+        self.assertTrue(self.storage.wait_for_logs(cursor, timeout=5))
+        logs, new_cursor = self.storage.get_logs_since(cursor)
+        self.assertEqual([log['message'] for log in logs], ['проснулись'])
+        self.assertEqual(new_cursor, logs[-1]['seq'])
@@ -0,0 +1,156 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+from unittest import mock
+from django.test import TestCase
+from lessons.models import VideoFile, VideoProcessingJob, VideoUpload
+from lessons.services.video_upload import merge_range, reserve_video_path
+
+
+class MergeRangeTests(TestCase):
+    def test_merges_adjacent_and_overlapping_ranges(self):
+        ranges = merge_range([], 10, 20)
+        ranges = merge_range(ranges, 0, 5)
+        ranges = merge_range(ranges, 5, 12)
+        ranges = merge_range(ranges, 30, 40)
+
+        self.assertEqual(ranges, [[0, 20], [30, 40]])
+
+
+class ResumableUploadTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.settings_override = self.settings(WATCHED_VIDEO_DIRECTORY=self.root, VIDEO_UPLOAD_DIRECTORY=None)
+        self.settings_override.enable()
+        self.content = os.urandom(1000)
+        self.sha256 = hashlib.sha256(self.content).hexdigest()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _init(self, **data):
+        payload = {'file_name': 'lesson.mp4', 'total_size': len(self.content), **data}
+        return self.client.post('/api/videos/uploads/', json.dumps(payload), content_type='application/json')
+
+    def _put(self, upload_id, start, end):
+        return self.client.put(
+            f'/api/videos/uploads/{upload_id}/',
+            self.content[start:end],
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end - 1}/{len(self.content)}',
+        )
+
+    def _finalize(self, upload_id, **data):
+        return self.client.post(
+            f'/api/videos/uploads/{upload_id}/finalize/', json.dumps(data), content_type='application/json'
+        )
+
+    def test_out_of_order_chunks_are_assembled_and_enqueued(self):
+        upload_id = self._init().json()['upload_id']
+        self.assertEqual(os.path.getsize(os.path.join(self.root, '.uploads', f'{upload_id}.part')), 1000)
+
+        self._put(upload_id, 600, 1000)
+        # Повтор уже полученного диапазона безопасен
+        self._put(upload_id, 600, 1000)
+        status = self.client.get(f'/api/videos/uploads/{upload_id}/').json()
+        self.assertEqual(status['received_ranges'], [[600, 1000]])
+        self._put(upload_id, 0, 600)
+
+        response = self._finalize(upload_id, sha256=self.sha256)
+
+        data = response.json()
+        self.assertEqual(data['status'], 'uploaded')
+        video = VideoFile.objects.get(id=data['video_id'])
+        self.assertEqual(video.content_hash, self.sha256)
+        self.assertEqual(video.file_path, os.path.join(self.root, 'lesson.mp4'))
+        with open(video.file_path, 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertTrue(VideoProcessingJob.objects.filter(video=video, status='queued').exists())
+        self.assertEqual(VideoUpload.objects.get(upload_id=upload_id).status, 'done')
+
+    def test_repeated_finalize_returns_existing_result(self):
+        upload_id = self._init().json()['upload_id']
+        self._put(upload_id, 0, 1000)
+
+        first = self._finalize(upload_id).json()
+        second = self._finalize(upload_id)
+
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual((second.json()['status'], second.json()['video_id']), ('exists', first['video_id']))
+        self.assertEqual(VideoFile.objects.count(), 1)
+        self.assertEqual(VideoProcessingJob.objects.count(), 1)
+
+    def test_failed_move_removes_reserved_placeholder(self):
+        upload_id = self._init().json()['upload_id']
+        self._put(upload_id, 0, 1000)
+
+        with mock.patch('lessons.services.video_upload.os.replace', side_effect=OSError('disk error')):
+            response = self._finalize(upload_id)
+
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'lesson.mp4')))
+        self.assertEqual(VideoUpload.objects.get(upload_id=upload_id).status, 'uploading')
+        # Файл загрузки остался на месте — finalize можно повторить
+        self.assertEqual(self._finalize(upload_id).json()['status'], 'uploaded')
+
+    def test_finalize_requires_all_ranges(self):
+        upload_id = self._init().json()['upload_id']
+        self._put(upload_id, 0, 500)
+
+        response = self._finalize(upload_id)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(VideoFile.objects.exists())
+
+    def test_checksum_mismatch_resets_upload(self):
+        upload_id = self._init().json()['upload_id']
+        self._put(upload_id, 0, 1000)
+
+        response = self._finalize(upload_id, sha256='0' * 64)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(VideoUpload.objects.get(upload_id=upload_id).received_ranges, [])
+
+    def test_duplicate_content_reuses_existing_video(self):
+        existing = VideoFile.objects.create(
+            file_path=os.path.join(self.root, 'old.mp4'), file_name='old.mp4', content_hash=self.sha256
+        )
+
+        # Заявленный SHA-256 известен — загружать не нужно
+        data = self._init(sha256=self.sha256).json()
+        self.assertEqual((data['status'], data['video_id']), ('exists', existing.id))
+
+        # Без заявленного SHA-256 дубликат находится при finalize
+        upload_id = self._init().json()['upload_id']
+        self._put(upload_id, 0, 1000)
+        data = self._finalize(upload_id).json()
+
+        self.assertEqual((data['status'], data['video_id']), ('exists', existing.id))
+        self.assertEqual(VideoFile.objects.count(), 1)
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'lesson.mp4')))
+
+    def test_rejects_range_outside_file(self):
+        upload_id = self._init().json()['upload_id']
+
+        response = self.client.put(
+            f'/api/videos/uploads/{upload_id}/',
+            b'x',
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE='bytes 1000-1000/1000',
+        )
+
+        self.assertEqual(response.status_code, 416)
+
+    def test_rejects_non_video_names(self):
+        self.assertEqual(self._init(file_name='../../etc/passwd').status_code, 400)
+
+    def test_reserve_video_path_does_not_overwrite(self):
+        first = reserve_video_path(self.root, 'lesson.mp4')
+        second = reserve_video_path(self.root, 'lesson.mp4')
+
+        self.assertEqual(first, os.path.join(self.root, 'lesson.mp4'))
+        self.assertNotEqual(first, second)
+        self.assertTrue(os.path.basename(second).startswith('lesson_'))
@@ -0,0 +1,231 @@
+import os
+import shutil
+import tempfile
+from types import SimpleNamespace
+from django.test import TestCase
+from lessons.models import VideoFile
+from lessons.services.file_settler import FileSettler
+from lessons.services.video_index import VideoDirectoryIndex
+from lessons.services.video_watcher import VideoFileHandler, VideoWatcher
+
+
+class ProcessExistingFilesTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.directory = os.path.join(self.root, 'videos')
+        os.makedirs(os.path.join(self.directory, 'week1'))
+        self.index_path = os.path.join(self.root, 'index.json')
+        self.settings_override = self.settings(VIDEO_INDEX_PATH=self.index_path)
+        self.settings_override.enable()
+        # Папки только что созданы — делаем их «старыми», чтобы индекс им доверял
+        self._age(self.directory, os.path.join(self.directory, 'week1'))
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _age(self, *paths):
+        # Каждое изменение — новый mtime в прошлом
+        self.mtime = getattr(self, 'mtime', 1_000_000_000) + 60
+        for path in paths:
+            os.utime(path, (self.mtime, self.mtime))
+
+    def _write(self, relative, data=b'video', settled=True):
+        path = os.path.join(self.directory, relative)
+        with open(path, 'wb') as f:
+            f.write(data)
+        # Дописанный файл давно не менялся; только что записанный ещё «копируется»
+        self._age(*([path] if settled else []), os.path.dirname(path))
+        return os.path.normpath(path)
+
+    def test_registers_new_videos_recursively(self):
+        first = self._write('a.mp4')
+        second = self._write(os.path.join('week1', 'b.MKV'))
+        self._write('notes.txt')
+
+        registered = VideoWatcher(self.directory).process_existing_files()
+
+        self.assertEqual(registered, 2)
+        self.assertEqual(
+            set(VideoFile.objects.values_list('file_path', flat=True)),
+            {first, second},
+        )
+        self.assertEqual(VideoFile.objects.get(file_path=first).file_size, 5)
+
+    def test_unchanged_tree_costs_one_query(self):
+        self._write('a.mp4')
+        VideoWatcher(self.directory).process_existing_files()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(VideoWatcher(self.directory).process_existing_files(), 0)
+
+    def test_skips_already_known_files_in_one_query(self):
+        path = self._write('a.mp4')
+        VideoFile.objects.create(file_path=path, file_name='a.mp4', status='done')
+        self._write('b.mp4')
+
+        # aggregate, values_list, bulk_create, aggregate после вставки
+        with self.assertNumQueries(4):
+            registered = VideoWatcher(self.directory).process_existing_files()
+
+        self.assertEqual(registered, 1)
+        self.assertEqual(VideoFile.objects.count(), 2)
+
+    def test_new_file_in_subdirectory_is_picked_up(self):
+        self._write('a.mp4')
+        VideoWatcher(self.directory).process_existing_files()
+
+        path = self._write(os.path.join('week1', 'b.mp4'))
+        registered = VideoWatcher(self.directory).process_existing_files()
+
+        self.assertEqual(registered, 1)
+        self.assertTrue(VideoFile.objects.filter(file_path=path).exists())
+
+    def test_empty_file_is_registered_once_written(self):
+        path = self._write('a.mp4', b'')
+        self.assertEqual(VideoWatcher(self.directory).process_existing_files(), 0)
+
+        with open(path, 'wb') as f:
+            f.write(b'content')
+        self._age(path)
+        registered = VideoWatcher(self.directory).process_existing_files()
+
+        self.assertEqual(registered, 1)
+        self.assertEqual(VideoFile.objects.get(file_path=path).file_size, 7)
+
+    def test_file_still_being_copied_waits_for_settle(self):
+        path = self._write('a.mp4', settled=False)
+
+        self.assertEqual(VideoWatcher(self.directory).process_existing_files(), 0)
+        self.assertFalse(VideoFile.objects.exists())
+
+        # Дерево и таблица не изменились, но отложенный файл проверяется снова
+        self._age(path)
+        self.assertEqual(VideoWatcher(self.directory).process_existing_files(), 1)
+
+    def test_deleted_row_is_registered_again(self):
+        path = self._write('a.mp4')
+        VideoWatcher(self.directory).process_existing_files()
+        VideoFile.objects.filter(file_path=path).delete()
+
+        self.assertEqual(VideoWatcher(self.directory).process_existing_files(), 1)
+
+    def test_index_for_other_directory_is_ignored(self):
+        self._write('a.mp4')
+        other = VideoDirectoryIndex(self.root, VideoFileHandler.VIDEO_EXTENSIONS, self.index_path)
+        other.scan()
+        other.save()
+
+        index = VideoDirectoryIndex(self.directory, VideoFileHandler.VIDEO_EXTENSIONS).load()
+
+        self.assertEqual(index.dirs, {})
+
+
+def _event(src_path, dest_path=None, is_directory=False):
+    return SimpleNamespace(src_path=src_path, dest_path=dest_path, is_directory=is_directory)
+
+
+class FileSettlerTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'a.mp4')
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _write(self, data, mode='wb'):
+        with open(self.path, mode) as f:
+            f.write(data)
+
+    def test_file_settles_after_size_stops_changing(self):
+        settler = FileSettler(settle_seconds=5)
+        self._write(b'part')
+        settler.track(self.path, now=0)
+
+        self.assertEqual(settler.pop_settled(now=1), [])
+        self._write(b'-more', 'ab')
+        self.assertEqual(settler.pop_settled(now=4), [])
+        self.assertEqual(settler.pop_settled(now=8), [])
+
+        settled = settler.pop_settled(now=9)
+
+        self.assertEqual([(path, size) for path, size, _ in settled], [(self.path, 9)])
+        self.assertEqual(len(settler), 0)
+
+    def test_empty_file_never_settles(self):
+        settler = FileSettler(settle_seconds=1)
+        self._write(b'')
+        settler.track(self.path, now=0)
+        settler.pop_settled(now=0)
+
+        self.assertEqual(settler.pop_settled(now=100), [])
+        self.assertEqual(len(settler), 1)
+
+    def test_deleted_file_is_dropped(self):
+        settler = FileSettler(settle_seconds=1)
+        settler.track(self.path, now=0)
+
+        self.assertEqual(settler.pop_settled(now=10), [])
+        self.assertEqual(len(settler), 0)
+
+
+class VideoFileHandlerTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.handler = VideoFileHandler(settle_seconds=5, batch_window=1)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _write(self, name, data=b'video'):
+        path = os.path.join(self.root, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def _settle(self):
+        self.handler.flush(now=0)
+        return self.handler.flush(now=10)
+
+    def test_burst_of_files_is_registered_in_one_insert(self):
+        for index in range(5):
+            self.handler.on_created(_event(self._write(f'{index}.mp4')))
+        self.handler.on_created(_event(self._write('notes.txt')))
+
+        self.assertEqual(self.handler.flush(now=0), 0)
+        with self.assertNumQueries(2):
+            registered = self.handler.flush(now=10)
+
+        self.assertEqual(registered, 5)
+        self.assertEqual(VideoFile.objects.count(), 5)
+
+    def test_file_being_written_is_not_registered(self):
+        path = self._write('a.mp4', b'part')
+        self.handler.on_created(_event(path))
+        self.handler.flush(now=0)
+
+        with open(path, 'ab') as f:
+            f.write(b'-rest')
+        self.handler.on_modified(_event(path))
+        self.assertEqual(self.handler.flush(now=6), 0)
+        self.assertEqual(self.handler.flush(now=12), 1)
+
+        self.assertEqual(VideoFile.objects.get().file_size, 9)
+
+    def test_moved_file_is_tracked_under_new_name(self):
+        partial = self._write('a.mp4.part')
+        self.handler.on_created(_event(partial))
+        path = os.path.join(self.root, 'a.mp4')
+        os.rename(partial, path)
+        self.handler.on_moved(_event(partial, path))
+
+        self.assertEqual(self._settle(), 1)
+        self.assertEqual(VideoFile.objects.get().file_path, os.path.normpath(path))
+
+    def test_known_file_is_skipped(self):
+        path = self._write('a.mp4')
+        VideoFile.objects.create(file_path=os.path.normpath(path), file_name='a.mp4')
+        self.handler.on_created(_event(path))
+
+        self.assertEqual(self._settle(), 0)
+        self.assertEqual(VideoFile.objects.count(), 1)
@@ -0,0 +1,31 @@
+"""
+Приём событий отладочной трассировки из браузера
+Размер: ~30 строк
+"""
+import json
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from lessons.services import debug_trace
+
+
+@csrf_exempt
+@require_http_methods(['POST'])
+def ingest_trace(request):
+    """Записать событие из debugTrace() (без трассировки — сразу 204)"""
+    if not debug_trace.enabled():
+        return HttpResponse(status=204)
+    try:
+        event = json.loads(request.body)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return HttpResponse(status=400)
+    if not isinstance(event, dict):
+        return HttpResponse(status=400)
+    data = event.get('data')
+    debug_trace.record(
+        str(event.get('message', '')),
+        location=str(event.get('location', '')),
+        data=data if isinstance(data, dict) else {},
+        source='browser',
+    )
+    return HttpResponse(status=204)
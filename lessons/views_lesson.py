@@ -8,14 +8,17 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from lessons.models import Lesson, LessonAttempt, CardAttempt, UserProgress, UserAvatar, ExerciseCard
+from lessons.services.lesson_progress import card_status_map, get_lesson_progress
+from lessons.services.lesson_summary import get_summary
 
 logger = logging.getLogger(__name__)
 
 
 def view_lesson_topics(request, lesson_id):
     """Страница просмотра тем урока"""
-    # Оптимизация: используем prefetch_related для карточек
-    lesson = get_object_or_404(Lesson.objects.prefetch_related('cards'), id=lesson_id)
+    # Темы и число карточек берутся из сводки урока, карточки не читаются
+    lesson = get_object_or_404(Lesson.objects.select_related('summary'), id=lesson_id)
+    summary = get_summary(lesson)
     
     # Получаем прогресс пользователя
     session_key = request.session.session_key
@@ -24,21 +27,13 @@ def view_lesson_topics(request, lesson_id):
         session_key = request.session.session_key
     
     user_progress = None
-    lesson_attempt = None
-    card_statuses = {}
+    completed = {}
     
     try:
         user_progress = UserProgress.objects.get(session_key=session_key)
-        # Оптимизация: используем select_related и prefetch_related
-        lesson_attempt = LessonAttempt.objects.filter(
-            user_progress=user_progress,
-            lesson=lesson
-        ).select_related('user_progress').prefetch_related('card_attempts__card').order_by('-started_at').first()
-        
-        if lesson_attempt:
-            # Оптимизация: используем предзагруженные card_attempts
-            for ca in lesson_attempt.card_attempts.all():
-                card_statuses[ca.card.id] = ca.card_status
+        lesson_progress = get_lesson_progress(user_progress.id, lesson.id)
+        if lesson_progress:
+            completed = lesson_progress.topic_completed
     except UserProgress.DoesNotExist:
         pass
     
@@ -57,21 +52,14 @@ def view_lesson_topics(request, lesson_id):
         'review': 'Повторение'
     }
     
-    for card in lesson.cards.all().order_by('order_index'):
-        topic = card.topic or 'general'
-        if topic not in topics_data:
-            topics_data[topic] = {
-                'topic': topic,
-                'topic_name': topic_names.get(topic, topic),
-                'cards_count': 0,
-                'cards_completed': 0,
-                'completion_percent': 0
-            }
-        topics_data[topic]['cards_count'] += 1
-        
-        # Проверяем, пройдена ли карточка
-        if card.id in card_statuses and card_statuses[card.id] > 0:
-            topics_data[topic]['cards_completed'] += 1
+    for topic in summary.topics:
+        topics_data[topic] = {
+            'topic': topic,
+            'topic_name': topic_names.get(topic, topic),
+            'cards_count': summary.topic_counts[topic],
+            'cards_completed': completed.get(topic, 0),
+            'completion_percent': 0
+        }
     
     # Вычисляем процент выполнения для каждой темы
     for topic_data in topics_data.values():
@@ -125,20 +113,8 @@ def view_lesson(request, lesson_id, topic=None):
     
     try:
         user_progress = UserProgress.objects.get(session_key=session_key)
-        # Оптимизация: используем select_related и prefetch_related
-        lesson_attempt = LessonAttempt.objects.filter(
-            user_progress=user_progress,
-            lesson=lesson
-        ).select_related('user_progress').prefetch_related('card_attempts__card').order_by('-started_at').first()
-        
-        if lesson_attempt:
-            # Оптимизация: используем предзагруженные card_attempts
-            for ca in lesson_attempt.card_attempts.all():
-                card_statuses[ca.card.id] = {
-                    'status': ca.card_status,
-                    'color': ca.get_status_color(),
-                    'attempts_count': ca.attempts_count
-                }
+        # Статусы карточек — из сводного прогресса, история попыток не читается
+        card_statuses = card_status_map(get_lesson_progress(user_progress.id, lesson.id))
         
         # Оптимизация: используем select_related для аватара
         try:
@@ -243,8 +219,7 @@ def view_lesson(request, lesson_id, topic=None):
 def get_card_statuses(request, lesson_id):
     """Получить статусы всех карточек урока"""
     try:
-        # Оптимизация: используем prefetch_related
-        lesson = Lesson.objects.prefetch_related('cards').get(id=lesson_id)
+        lesson = Lesson.objects.only('id').get(id=lesson_id)
         session_key = request.session.session_key
         
         if not session_key:
@@ -254,22 +229,7 @@ def get_card_statuses(request, lesson_id):
         if not user_progress:
             return JsonResponse({'card_statuses': {}})
         
-        # Оптимизация: используем select_related и prefetch_related
-        lesson_attempt = LessonAttempt.objects.filter(
-            user_progress=user_progress,
-            lesson=lesson
-        ).select_related('user_progress').prefetch_related('card_attempts__card').order_by('-started_at').first()
-        
-        card_statuses = {}
-        if lesson_attempt:
-            # Оптимизация: используем предзагруженные card_attempts
-            for ca in lesson_attempt.card_attempts.all():
-                card_statuses[ca.card.id] = {
-                    'status': ca.card_status,
-                    'color': ca.get_status_color(),
-                    'attempts_count': ca.attempts_count
-                }
-        
+        card_statuses = card_status_map(get_lesson_progress(user_progress.id, lesson.id))
         return JsonResponse({'card_statuses': card_statuses})
     except Exception as e:
         logger.error(f'Ошибка получения статусов карточек: {str(e)}', exc_info=True)
@@ -8,7 +8,9 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.utils import timezone
-from lessons.models import UserProgress, LessonAttempt, CardAttempt, Lesson, ExerciseCard, UserAvatar
+from lessons.models import UserProgress, LessonAttempt, Lesson, ExerciseCard
+from lessons.services.card_answer import submit_answer
+from lessons.services.lesson_progress import record_attempt_finished
 
 logger = logging.getLogger(__name__)
 
@@ -92,90 +94,7 @@ def submit_card_answer(request):
         user_answer = data.get('answer', '')
         is_correct = data.get('is_correct', False)
         
-        lesson_attempt = LessonAttempt.objects.get(id=attempt_id)
-        card = ExerciseCard.objects.get(id=card_id)
-        
-        existing_attempt = CardAttempt.objects.filter(
-            lesson_attempt=lesson_attempt,
-            card=card
-        ).first()
-        
-        if existing_attempt:
-            previous_status = existing_attempt.card_status
-            existing_attempt.attempts_count += 1
-            existing_attempt.user_answer = user_answer
-            existing_attempt.is_correct = is_correct
-            card_attempt = existing_attempt
-        else:
-            previous_status = 0
-            card_attempt = CardAttempt.objects.create(
-                lesson_attempt=lesson_attempt,
-                card=card,
-                user_answer=user_answer,
-                is_correct=is_correct,
-                attempts_count=1
-            )
-        
-        # Устанавливаем статус карточки: 0=красный, 3=желтый, 5=зеленый
-        # Логика пересдачи: если карточка была желтой (3) и пересдана правильно - становится зеленой (5)
-        if is_correct:
-            if card_attempt.attempts_count == 1:
-                # Первая попытка - идеально
-                card_attempt.card_status = 5  # Зеленый - идеально с первой попытки
-                experience = 20
-            elif previous_status == 3:
-                # Пересдача желтой карточки - если правильно, становится зеленой
-                card_attempt.card_status = 5  # Зеленый - пересдано до идеального
-                experience = 15  # Меньше опыта за пересдачу, но все равно хорошо
-            else:
-                # Правильно, но не с первой попытки и не пересдача желтой
-                card_attempt.card_status = 3  # Желтый - с ошибками
-                experience = 10 if card_attempt.attempts_count == 2 else 5
-            
-            card_attempt.experience_gained = experience
-            card_attempt.save()
-            
-            if not existing_attempt or not existing_attempt.is_correct:
-                lesson_attempt.correct_cards += 1
-                lesson_attempt.save()
-            
-            user_progress = lesson_attempt.user_progress
-            user_progress.add_experience(experience)
-            user_progress.correct_answers_count += 1
-            user_progress.total_cards_completed += 1
-            user_progress.save()
-        else:
-            card_attempt.card_status = 0  # Красный - неправильно
-            card_attempt.save()
-            
-            user_progress = lesson_attempt.user_progress
-            user_progress.incorrect_answers_count += 1
-            user_progress.save()
-            
-            if card_attempt.attempts_count >= 2 and not card_attempt.hint_shown:
-                card_attempt.hint_shown = True
-                card_attempt.save()
-        
-        # Обновляем средний балл персонажа
-        user_progress = lesson_attempt.user_progress
-        avatar, created = UserAvatar.objects.get_or_create(user_progress=user_progress)
-        avatar.update_score()
-        
-        show_hint = card_attempt.hint_shown and card.hint_text
-        
-        response_data = {
-            'is_correct': is_correct,
-            'attempts_count': card_attempt.attempts_count,
-            'card_status': card_attempt.card_status,
-            'status_color': card_attempt.get_status_color(),
-            'experience_gained': card_attempt.experience_gained if is_correct else 0,
-            'show_hint': show_hint,
-            'hint_text': card.hint_text if show_hint else None,
-            'translation_text': card.translation_text if is_correct else None,
-            'total_experience': user_progress.total_experience,
-            'current_level': user_progress.current_level,
-            'avatar_score': avatar.total_score
-        }
+        response_data = submit_answer(attempt_id, card_id, user_answer, is_correct)
         
         return JsonResponse(response_data)
         
@@ -196,6 +115,8 @@ def complete_lesson_attempt(request, attempt_id):
         lesson_attempt.status = 'completed'
         lesson_attempt.completed_at = timezone.now()
         lesson_attempt.calculate_score()
+        lesson_attempt.update_stars()
+        record_attempt_finished(lesson_attempt)
         
         user_progress = lesson_attempt.user_progress
         if lesson_attempt.score and lesson_attempt.score >= 70:
@@ -1,42 +1,32 @@
 """
 Views для панели учителя
 """
-import json
 import os
+import hashlib
 import logging
 from django.shortcuts import render
 from django.http import JsonResponse
 from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
-from django.utils import timezone
 from lessons.models import VideoFile, Lesson
+from lessons.services import debug_trace
+from lessons.services.video_upload import reserve_video_path
 
 logger = logging.getLogger(__name__)
 
 
 def teacher_panel(request):
     """Панель учителя для загрузки и управления видео"""
-    # #region agent log
-    watched_dir = settings.WATCHED_VIDEO_DIRECTORY
-    watched_dir_exists = os.path.exists(watched_dir)
-    log_path = os.path.join(settings.BASE_DIR, '.cursor', 'debug.log')
-    os.makedirs(os.path.dirname(log_path), exist_ok=True)
-    with open(log_path, 'a', encoding='utf-8') as f:
-        f.write(json.dumps({
-            'location': 'views_teacher.py:20',
-            'message': 'teacher_panel called',
-            'data': {
-                'WATCHED_VIDEO_DIRECTORY': watched_dir,
-                'directory_exists': watched_dir_exists,
-                'directory_abs': os.path.abspath(watched_dir) if watched_dir else None
-            },
-            'timestamp': int(timezone.now().timestamp() * 1000),
-            'sessionId': 'debug-session',
-            'runId': 'run1',
-            'hypothesisId': 'A'
-        }, ensure_ascii=False) + '\n')
-    # #endregion
+    if debug_trace.enabled():
+        watched_dir = settings.WATCHED_VIDEO_DIRECTORY
+        debug_trace.trace(
+            'teacher_panel called',
+            location='views_teacher.teacher_panel',
+            watched_video_directory=watched_dir,
+            directory_exists=os.path.exists(watched_dir),
+            directory_abs=os.path.abspath(watched_dir) if watched_dir else None,
+        )
     
     videos = VideoFile.objects.all().order_by('-created_at')
     lessons = Lesson.objects.all().order_by('-created_at')
@@ -58,25 +48,13 @@ def teacher_panel(request):
 @require_http_methods(['POST'])
 def upload_video(request):
     """Endpoint для загрузки видеофайлов"""
-    # #region agent log
     watched_dir = settings.WATCHED_VIDEO_DIRECTORY
-    log_path = os.path.join(settings.BASE_DIR, '.cursor', 'debug.log')
-    os.makedirs(os.path.dirname(log_path), exist_ok=True)
-    with open(log_path, 'a', encoding='utf-8') as f:
-        f.write(json.dumps({
-            'location': 'views_teacher.py:45',
-            'message': 'upload_video called',
-            'data': {
-                'WATCHED_VIDEO_DIRECTORY': watched_dir,
-                'directory_exists': os.path.exists(watched_dir),
-                'files_count': len(request.FILES) if hasattr(request, 'FILES') else 0
-            },
-            'timestamp': int(timezone.now().timestamp() * 1000),
-            'sessionId': 'debug-session',
-            'runId': 'run1',
-            'hypothesisId': 'B'
-        }, ensure_ascii=False) + '\n')
-    # #endregion
+    debug_trace.trace(
+        'upload_video called',
+        location='views_teacher.upload_video',
+        watched_video_directory=watched_dir,
+        files_count=len(request.FILES),
+    )
     
     try:
         if 'videos' not in request.FILES:
@@ -89,58 +67,26 @@ def upload_video(request):
         os.makedirs(watched_dir, exist_ok=True)
         
         for video_file in request.FILES.getlist('videos'):
-            # #region agent log
-            log_path = os.path.join(settings.BASE_DIR, '.cursor', 'debug.log')
-            with open(log_path, 'a', encoding='utf-8') as f:
-                f.write(json.dumps({
-                    'location': 'views_teacher.py:65',
-                    'message': 'Processing uploaded file',
-                    'data': {
-                        'filename': video_file.name,
-                        'size': video_file.size,
-                        'target_directory': watched_dir
-                    },
-                    'timestamp': int(timezone.now().timestamp() * 1000),
-                    'sessionId': 'debug-session',
-                    'runId': 'run1',
-                    'hypothesisId': 'C'
-                }, ensure_ascii=False) + '\n')
-            # #endregion
-            
-            # Сохраняем файл в WATCHED_VIDEO_DIRECTORY
-            file_path = os.path.join(watched_dir, video_file.name)
+            debug_trace.trace(
+                'Processing uploaded file',
+                location='views_teacher.upload_video',
+                filename=video_file.name,
+                size=video_file.size,
+                target_directory=watched_dir,
+            )
             
-            # Если файл уже существует, добавляем номер
-            counter = 1
-            original_path = file_path
-            while os.path.exists(file_path):
-                name, ext = os.path.splitext(video_file.name)
-                file_path = os.path.join(watched_dir, f'{name}_{counter}{ext}')
-                counter += 1
+            # Сохраняем файл в WATCHED_VIDEO_DIRECTORY (если имя занято — с суффиксом)
+            file_path = reserve_video_path(watched_dir, video_file.name)
             
-            # Сохраняем файл
+            # Сохраняем файл, попутно считая SHA-256 для поиска дубликатов
+            content_hash = hashlib.sha256()
             with open(file_path, 'wb+') as destination:
                 for chunk in video_file.chunks():
                     destination.write(chunk)
+                    content_hash.update(chunk)
             
-            # #region agent log
             file_size = os.path.getsize(file_path)
-            log_path = os.path.join(settings.BASE_DIR, '.cursor', 'debug.log')
-            with open(log_path, 'a', encoding='utf-8') as f:
-                f.write(json.dumps({
-                    'location': 'views_teacher.py:90',
-                    'message': 'File saved',
-                    'data': {
-                        'file_path': file_path,
-                        'file_size': file_size,
-                        'file_exists': os.path.exists(file_path)
-                    },
-                    'timestamp': int(timezone.now().timestamp() * 1000),
-                    'sessionId': 'debug-session',
-                    'runId': 'run1',
-                    'hypothesisId': 'D'
-                }, ensure_ascii=False) + '\n')
-            # #endregion
+            debug_trace.trace('File saved', location='views_teacher.upload_video', file_path=file_path, file_size=file_size)
             
             # Нормализуем путь для БД
             file_path_normalized = os.path.normpath(file_path)
@@ -160,26 +106,17 @@ def upload_video(request):
                 file_path=file_path_normalized,
                 file_name=os.path.basename(file_path),
                 file_size=file_size,
+                content_hash=content_hash.hexdigest(),
                 status='pending'
             )
             
-            # #region agent log
-            log_path = os.path.join(settings.BASE_DIR, '.cursor', 'debug.log')
-            with open(log_path, 'a', encoding='utf-8') as f:
-                f.write(json.dumps({
-                    'location': 'views_teacher.py:115',
-                    'message': 'VideoFile created',
-                    'data': {
-                        'video_id': video_record.id,
-                        'file_path': video_record.file_path,
-                        'file_name': video_record.file_name
-                    },
-                    'timestamp': int(timezone.now().timestamp() * 1000),
-                    'sessionId': 'debug-session',
-                    'runId': 'run1',
-                    'hypothesisId': 'E'
-                }, ensure_ascii=False) + '\n')
-            # #endregion
+            debug_trace.trace(
+                'VideoFile created',
+                location='views_teacher.upload_video',
+                video_id=video_record.id,
+                file_path=video_record.file_path,
+                file_name=video_record.file_name,
+            )
             
             uploaded_files.append({
                 'id': video_record.id,
@@ -194,22 +131,12 @@ def upload_video(request):
         })
         
     except Exception as e:
-        # #region agent log
-        log_path = os.path.join(settings.BASE_DIR, '.cursor', 'debug.log')
-        with open(log_path, 'a', encoding='utf-8') as f:
-            f.write(json.dumps({
-                'location': 'views_teacher.py:135',
-                'message': 'upload_video error',
-                'data': {
-                    'error': str(e),
-                    'error_type': type(e).__name__
-                },
-                'timestamp': int(timezone.now().timestamp() * 1000),
-                'sessionId': 'debug-session',
-                'runId': 'run1',
-                'hypothesisId': 'F'
-            }, ensure_ascii=False) + '\n')
-        # #endregion
+        debug_trace.trace(
+            'upload_video error',
+            location='views_teacher.upload_video',
+            error=str(e),
+            error_type=type(e).__name__,
+        )
         logger.error(f'Ошибка загрузки видео: {str(e)}', exc_info=True)
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
@@ -5,7 +5,9 @@ Views для UI в стиле Uchi.ru
 import json
 import logging
 from django.shortcuts import render, get_object_or_404
-from lessons.models import Lesson, UserProgress, UserAvatar, LessonAttempt, CardAttempt
+from lessons.models import Lesson, UserProgress, UserAvatar
+from lessons.services.lesson_progress import get_lesson_progress
+from lessons.services.lesson_summary import get_summary
 from lessons.views_progress import _get_or_create_user_progress
 
 logger = logging.getLogger(__name__)
@@ -44,7 +46,9 @@ def lesson_topics_uchi(request, lesson_id):
     """Страница тем урока в стиле Uchi.ru"""
     logger.info(f'=== lesson_topics_uchi called for lesson_id={lesson_id} ===')
     
-    lesson = get_object_or_404(Lesson.objects.prefetch_related('cards'), id=lesson_id)
+    # Темы и число карточек берутся из сводки урока, карточки не читаются
+    lesson = get_object_or_404(Lesson.objects.select_related('summary'), id=lesson_id)
+    summary = get_summary(lesson)
     logger.info(f'Lesson found: id={lesson.id}, title={lesson.title}')
     
     # Получаем прогресс пользователя
@@ -55,21 +59,15 @@ def lesson_topics_uchi(request, lesson_id):
     
     user_progress = None
     avatar_data = None
-    card_statuses = {}
+    completed = {}
     
     try:
         user_progress = UserProgress.objects.get(session_key=session_key)
         logger.info(f'User progress found: session_key={session_key}')
-        lesson_attempt = LessonAttempt.objects.filter(
-            user_progress=user_progress,
-            lesson=lesson
-        ).select_related('user_progress').prefetch_related('card_attempts__card').order_by('-started_at').first()
-        
-        if lesson_attempt:
-            logger.info(f'Lesson attempt found: id={lesson_attempt.id}')
-            for ca in lesson_attempt.card_attempts.all():
-                card_statuses[ca.card.id] = ca.card_status
-            logger.info(f'Card statuses loaded: {len(card_statuses)} cards')
+        lesson_progress = get_lesson_progress(user_progress.id, lesson.id)
+        if lesson_progress:
+            logger.info(f'Lesson progress found: {lesson_progress.cards_completed} cards completed')
+            completed = lesson_progress.topic_completed
         
         try:
             avatar = UserAvatar.objects.get(user_progress=user_progress)
@@ -84,9 +82,8 @@ def lesson_topics_uchi(request, lesson_id):
         logger.info('User progress not found, using defaults')
         avatar_data = {'name': 'Ученик', 'emoji': '🦊', 'score': 0.0}
     
-    # Группируем карточки по темам
-    cards = list(lesson.cards.all().order_by('order_index'))
-    logger.info(f'Total cards in lesson: {len(cards)}')
+    # Темы урока из сводки, пройденные карточки — из сводного прогресса пользователя
+    logger.info(f'Total cards in lesson: {summary.cards_total}')
     
     topics_data = {}
     topic_names = {
@@ -102,22 +99,14 @@ def lesson_topics_uchi(request, lesson_id):
         'review': 'Повторение'
     }
     
-    for card in cards:
-        topic = card.topic or 'general'
-        logger.debug(f'Card {card.id}: topic={topic}')
-        if topic not in topics_data:
-            topics_data[topic] = {
-                'topic': topic,
-                'topic_name': topic_names.get(topic, topic),
-                'cards_count': 0,
-                'cards_completed': 0,
-                'completion_percent': 0
-            }
-        topics_data[topic]['cards_count'] += 1
-        
-        # Проверяем, пройдена ли карточка
-        if card.id in card_statuses and card_statuses[card.id] > 0:
-            topics_data[topic]['cards_completed'] += 1
+    for topic in summary.topics:
+        topics_data[topic] = {
+            'topic': topic,
+            'topic_name': topic_names.get(topic, topic),
+            'cards_count': summary.topic_counts[topic],
+            'cards_completed': completed.get(topic, 0),
+            'completion_percent': 0
+        }
     
     logger.info(f'Topics found: {len(topics_data)} topics')
     for topic, data in topics_data.items():
@@ -0,0 +1,114 @@
+"""
+Views для возобновляемой загрузки видео по частям
+
+POST /api/videos/uploads/                          — начать загрузку
+GET  /api/videos/uploads/<upload_id>/              — какие диапазоны уже получены
+PUT  /api/videos/uploads/<upload_id>/              — записать диапазон (заголовок Content-Range)
+POST /api/videos/uploads/<upload_id>/finalize/     — проверить SHA-256 и поставить в очередь
+"""
+import re
+import json
+import logging
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from lessons.models import VideoUpload
+from lessons.services.video_upload import UploadError, create_upload, finalize_upload, write_range
+
+logger = logging.getLogger(__name__)
+
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+def _read_json(request):
+    try:
+        return json.loads(request.body or b'{}')
+    except ValueError:
+        raise UploadError('Некорректный JSON')
+
+
+def _upload_data(upload):
+    return {
+        'upload_id': str(upload.upload_id),
+        'file_name': upload.file_name,
+        'total_size': upload.total_size,
+        'received_bytes': upload.received_bytes,
+        'received_ranges': upload.received_ranges,
+        'status': upload.status,
+        'video_id': upload.video_id,
+    }
+
+
+def _error(e):
+    return JsonResponse({'success': False, 'error': str(e)}, status=e.status)
+
+
+@csrf_exempt
+@require_http_methods(['POST'])
+def init_upload(request):
+    """Начать загрузку: {file_name, total_size, sha256?}"""
+    try:
+        data = _read_json(request)
+        upload, duplicate = create_upload(data.get('file_name'), data.get('total_size'), data.get('sha256'))
+    except UploadError as e:
+        return _error(e)
+    if duplicate:
+        return JsonResponse({'success': True, 'status': 'exists', 'video_id': duplicate.id})
+    return JsonResponse({
+        'success': True,
+        'chunk_size': getattr(settings, 'VIDEO_UPLOAD_CHUNK_MB', 8) * 1024 * 1024,
+        **_upload_data(upload),
+    })
+
+
+@csrf_exempt
+@require_http_methods(['GET', 'PUT'])
+def upload_chunk(request, upload_id):
+    """GET — состояние загрузки, PUT — запись диапазона байт из тела запроса"""
+    upload = VideoUpload.objects.filter(upload_id=upload_id).first()
+    if upload is None:
+        return JsonResponse({'success': False, 'error': 'Загрузка не найдена'}, status=404)
+    if request.method == 'GET':
+        return JsonResponse({'success': True, **_upload_data(upload)})
+
+    match = CONTENT_RANGE.match(request.headers.get('Content-Range', ''))
+    if not match:
+        return JsonResponse({'success': False, 'error': 'Нужен заголовок Content-Range: bytes start-end/total'}, status=400)
+    start, end, total = (int(value) for value in match.groups())
+    if total != upload.total_size or end < start:
+        return JsonResponse({'success': False, 'error': 'Некорректный Content-Range'}, status=416)
+    length = end - start + 1
+    max_chunk = getattr(settings, 'VIDEO_UPLOAD_MAX_CHUNK_MB', 64) * 1024 * 1024
+    if length > max_chunk:
+        return JsonResponse({'success': False, 'error': 'Слишком большой диапазон'}, status=413)
+    try:
+        # Тело читается из потока запроса блоками, без request.body в памяти
+        write_range(upload, start, request, length)
+    except UploadError as e:
+        return _error(e)
+    return JsonResponse({'success': True, **_upload_data(upload)})
+
+
+@csrf_exempt
+@require_http_methods(['POST'])
+def finalize_upload_view(request, upload_id):
+    """Завершить загрузку: {sha256?}"""
+    upload = VideoUpload.objects.filter(upload_id=upload_id).first()
+    if upload is None:
+        return JsonResponse({'success': False, 'error': 'Загрузка не найдена'}, status=404)
+    try:
+        data = _read_json(request)
+        video_file, created, job = finalize_upload(upload, data.get('sha256'))
+    except UploadError as e:
+        return _error(e)
+    except Exception as e:
+        logger.error(f'Ошибка завершения загрузки {upload_id}: {str(e)}', exc_info=True)
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+    return JsonResponse({
+        'success': True,
+        'status': 'uploaded' if created else 'exists',
+        'video_id': video_file.id,
+        'file_name': video_file.file_name,
+        'job_id': job.id if job else None,
+    })
@@ -6,7 +6,7 @@ Views для обработки видео - основной файл для и
 from lessons.views_video_base import list_videos, get_next_pending_video_info
 from lessons.views_video_processing import ProcessVideoView, ProcessNextPendingVideoView
 from lessons.views_video_batch import ProcessAllVideosView, RecreateAllLessonsView
-from lessons.views_video_status import get_processing_status
+from lessons.views_video_status import get_processing_status, get_processing_events, get_job_status
 
 # Экспортируем все views для использования в urls.py
 __all__ = [
@@ -17,4 +17,6 @@ __all__ = [
     'ProcessAllVideosView',
     'RecreateAllLessonsView',
     'get_processing_status',
+    'get_processing_events',
+    'get_job_status',
 ]
@@ -1,16 +1,93 @@
 """
 Views для получения статуса обработки видео
-Размер: ~60 строк
+Размер: ~250 строк
 """
+import json
+import time
+import hashlib
 import logging
-from django.http import JsonResponse
+import threading
+from django.conf import settings
+from django.db.models import Count, Q
+from django.http import HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
-from lessons.models import VideoFile
+from lessons.models import VideoFile, VideoProcessingJob
 
 logger = logging.getLogger(__name__)
 
 
+# Снимок счётчиков очереди: панель преподавателя опрашивает статус каждые несколько
+# секунд, а счётчики за VIDEO_STATUS_CACHE_SECONDS секунд меняются незначительно
+_snapshot = None
+_snapshot_expires = 0
+_snapshot_lock = threading.Lock()
+
+
+def _build_snapshot():
+    """Счётчики по статусам одним запросом и текущее видео с его позицией"""
+    counts = VideoFile.objects.aggregate(
+        total=Count('id'),
+        pending=Count('id', filter=Q(status='pending')),
+        processing=Count('id', filter=Q(status='processing')),
+        done=Count('id', filter=Q(status='done')),
+        error=Count('id', filter=Q(status='error')),
+    )
+    
+    current_video = (
+        VideoFile.objects.filter(status='processing')
+        .only('id', 'file_name', 'created_at', 'processing_message', 'processing_status')
+        .order_by('created_at', 'id')
+        .first()
+    )
+    current_video_info = None
+    if current_video:
+        # Позиция — число видео, созданных раньше (индекс created_at, id)
+        current_index = VideoFile.objects.filter(
+            Q(created_at__lt=current_video.created_at)
+            | Q(created_at=current_video.created_at, id__lt=current_video.id)
+        ).count() + 1
+        current_video_info = {
+            'id': current_video.id,
+            'file_name': current_video.file_name,
+            'index': current_index,
+            'total': counts['total'],
+            'processing_message': current_video.processing_message,
+            'processing_status': current_video.processing_status
+        }
+    
+    total_videos = counts['total']
+    return {
+        'is_processing': counts['processing'] > 0 or counts['pending'] > 0,
+        'total_videos': total_videos,
+        'pending': counts['pending'],
+        'processing': counts['processing'],
+        'done': counts['done'],
+        'error': counts['error'],
+        'current_video': current_video_info,
+        'progress_percent': int((counts['done'] / total_videos * 100)) if total_videos > 0 else 0,
+    }
+
+
+def get_status_snapshot():
+    """Снимок статуса очереди, кэшированный на VIDEO_STATUS_CACHE_SECONDS секунд"""
+    global _snapshot, _snapshot_expires
+    ttl = getattr(settings, 'VIDEO_STATUS_CACHE_SECONDS', 2)
+    with _snapshot_lock:
+        now = time.monotonic()
+        if _snapshot is None or now >= _snapshot_expires:
+            _snapshot = _build_snapshot()
+            _snapshot_expires = now + ttl
+        return _snapshot
+
+
+def reset_status_snapshot():
+    """Сбросить кэшированный снимок (следующий запрос прочитает БД)"""
+    global _snapshot
+    with _snapshot_lock:
+        _snapshot = None
+
+
 @csrf_exempt
 @require_http_methods(['GET'])
 def get_processing_status(request):
@@ -18,48 +95,10 @@ def get_processing_status(request):
     try:
         from lessons.services.log_storage import LogStorage
         
-        # Оптимизация: используем агрегацию для подсчета
-        total_videos = VideoFile.objects.count()
-        pending_videos = VideoFile.objects.filter(status='pending').count()
-        processing_videos = VideoFile.objects.filter(status='processing').count()
-        done_videos = VideoFile.objects.filter(status='done').count()
-        error_videos = VideoFile.objects.filter(status='error').count()
-        
-        # Оптимизация: используем select_related
-        current_video = VideoFile.objects.filter(status='processing').select_related('lesson').order_by('created_at').first()
-        current_video_info = None
-        if current_video:
-            all_videos_ordered = VideoFile.objects.all().order_by('created_at')
-            video_ids = list(all_videos_ordered.values_list('id', flat=True))
-            try:
-                current_index = video_ids.index(current_video.id) + 1
-            except ValueError:
-                current_index = 0
-            current_video_info = {
-                'id': current_video.id,
-                'file_name': current_video.file_name,
-                'index': current_index,
-                'total': total_videos,
-                'processing_message': current_video.processing_message,
-                'processing_status': current_video.processing_status
-            }
-        
-        is_processing = processing_videos > 0 or pending_videos > 0
-        
         log_storage = LogStorage.get_instance()
         logs = log_storage.get_logs(limit=200)
         
-        return JsonResponse({
-            'is_processing': is_processing,
-            'total_videos': total_videos,
-            'pending': pending_videos,
-            'processing': processing_videos,
-            'done': done_videos,
-            'error': error_videos,
-            'current_video': current_video_info,
-            'progress_percent': int((done_videos / total_videos * 100)) if total_videos > 0 else 0,
-            'logs': logs
-        })
+        return JsonResponse({**get_status_snapshot(), 'logs': logs})
         
     except Exception as e:
         logger.error(f'Ошибка получения статуса обработки: {str(e)}', exc_info=True)
@@ -67,3 +106,122 @@ def get_processing_status(request):
             'error': f'Ошибка: {str(e)}'
         }, status=500)
 
+
+def _video_state(video_id):
+    """Статус одного видео для подписчика на события"""
+    video = VideoFile.objects.filter(id=video_id).select_related('lesson').first()
+    if video is None:
+        return None
+    lesson = getattr(video, 'lesson', None)
+    return {
+        'id': video.id,
+        'status': video.status,
+        'processing_status': video.processing_status,
+        'processing_message': video.processing_message,
+        'error_message': video.error_message,
+        'lesson_id': lesson.id if lesson else None,
+        'lesson_title': lesson.title if lesson else None,
+    }
+
+
+def _state_token(*parts):
+    """Короткий отпечаток состояния: клиент присылает его обратно, пока ничего не изменилось"""
+    payload = json.dumps(parts, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha1(payload).hexdigest()[:16]
+
+
+def _int_param(request, name):
+    try:
+        return int(request.GET[name])
+    except (KeyError, ValueError):
+        return None
+
+
+@csrf_exempt
+@require_http_methods(['GET'])
+def get_processing_events(request):
+    """
+    Long-poll: изменения статуса обработки и новые логи
+    
+    Параметры запроса:
+        cursor: номер последнего полученного лога (без него — последние 200 логов)
+        state: отпечаток состояния из прошлого ответа
+        video_id: дополнительно следить за статусом одного видео
+        timeout: сколько секунд ждать изменений (не больше VIDEO_EVENTS_TIMEOUT)
+        logs: 0 — логи не нужны: ответ только при изменении состояния
+              (вместе с video_id — только при изменении этого видео, status не отдаётся)
+    
+    Отвечает, как только появились новые логи или изменилось состояние;
+    если за timeout ничего не произошло — 204 без тела.
+    """
+    from lessons.services.log_storage import LogStorage
+    
+    cursor = _int_param(request, 'cursor')
+    video_id = _int_param(request, 'video_id')
+    state = request.GET.get('state', '')
+    max_timeout = getattr(settings, 'VIDEO_EVENTS_TIMEOUT', 25)
+    timeout = _int_param(request, 'timeout')
+    timeout = max_timeout if timeout is None else max(0, min(timeout, max_timeout))
+    # Как часто перечитывать статус из БД: логи будят ожидание сразу, а статус меняют воркеры
+    check_interval = getattr(settings, 'VIDEO_EVENTS_CHECK_INTERVAL', 1)
+    # Подписчику без логов (статус одного видео) новые логи других процессов не интересны
+    with_logs = request.GET.get('logs') != '0'
+    # ...как и изменения общей статистики: следим только за своим видео
+    video_only = video_id is not None and not with_logs
+    
+    log_storage = LogStorage.get_instance()
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            logs = []
+            if with_logs:
+                logs, cursor = log_storage.get_logs_since(cursor)
+            status = None if video_only else get_status_snapshot()
+            video = _video_state(video_id) if video_id else None
+            token = _state_token(video) if video_only else _state_token(status, video)
+            if logs or token != state:
+                return JsonResponse({
+                    'cursor': cursor,
+                    'state': token,
+                    'status': status,
+                    'video': video,
+                    'logs': logs,
+                })
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return HttpResponse(status=204)
+            if with_logs:
+                log_storage.wait_for_logs(cursor, timeout=min(remaining, check_interval))
+            else:
+                time.sleep(min(remaining, check_interval))
+    except Exception as e:
+        logger.error(f'Ошибка получения событий обработки: {str(e)}', exc_info=True)
+        return JsonResponse({
+            'error': f'Ошибка: {str(e)}'
+        }, status=500)
+
+
+@csrf_exempt
+@require_http_methods(['GET'])
+def get_job_status(request, job_id):
+    """Получить статус задачи обработки видео"""
+    try:
+        job = VideoProcessingJob.objects.select_related('video').get(id=job_id)
+    except VideoProcessingJob.DoesNotExist:
+        return JsonResponse({'error': 'Задача не найдена'}, status=404)
+
+    return JsonResponse({
+        'job_id': job.id,
+        'status': job.status,
+        'video_id': job.video_id,
+        'video_status': job.video.status,
+        'processing_status': job.video.processing_status,
+        'processing_message': job.video.processing_message,
+        'force_recreate': job.force_recreate,
+        'claimed_by': job.claimed_by,
+        'attempts': job.attempts,
+        'error_message': job.error_message,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    })